@@ -108,6 +108,7 @@ class MainWindow(FluentWindow):
         self.font_view = FontView(self.asset_manager, self.translator, self)
         self.about_view = AboutView(self.translator, self)
         self.settings_view = SettingsView(self.translator, self.settings, self.themeListener, self)
+        self.settings_view.previewCacheChanged.connect(self.gallery_view.set_preview_cache_budget)
 
         # 新增主要頁面
         self.addSubInterface(self.gallery_view, FluentIcon.PHOTO, tr("gallery", "Workshop"))
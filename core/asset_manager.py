@@ -3,10 +3,12 @@
 import os
 import re
 import shutil
+import threading
 from pathlib import Path
 
 from PyQt6.QtGui import QFontDatabase
 
+from core.font_index import FontIndex
 from core.utils import resource_path_str
 
 
@@ -36,6 +38,11 @@ class AssetManager:
         # 應用程式啟動時載入所有已儲存的使用者字體
         self.load_all_user_fonts()
 
+        # 系統字體索引 (家族 / 樣式 → 字體檔)，在背景執行緒中與磁碟同步，讓 PIL 渲染器也能使用系統字體
+        self.font_index = FontIndex(self.base_dir / "font_index.json")
+        self._system_font_keys = (-1, {})  # (字體索引的版本, 鍵值 -> 家族名稱)，索引更新後於下次查詢時重建
+        threading.Thread(target=self.font_index.refresh, daemon=True).start()
+
     # --- Logo 管理 ---
 
     def add_logo(self, source_path: str) -> (bool, str):
@@ -124,6 +131,25 @@ class AssetManager:
             print(f"無法刪除字體: {e}")
             return False
 
+    def resolve_system_font(self, font_key: str, style: str = None, wait: bool = True):
+        """
+        將設定中的系統字體鍵值 (如 'noto_sans_tc') 解析為字體檔。
+        返回 (字體檔路徑, 字型索引, 家族名稱, 樣式名稱)，找不到時返回 None。
+        wait 為 False 時不等待字體索引建立 (GUI 執行緒使用)，索引尚未就緒時直接返回 None。
+        """
+        if not font_key:
+            return None
+        if not wait and not self.font_index.loaded:
+            return None
+        self.font_index.ensure_loaded()
+        generation, keys = self._system_font_keys
+        if generation != self.font_index.generation:
+            generation = self.font_index.generation
+            keys = {self._create_key_from_name(f): f for f in self.font_index.families()}
+            self._system_font_keys = (generation, keys)
+        family = keys.get(font_key, font_key)
+        return self.font_index.lookup(family, style)
+
     def load_all_user_fonts(self):
         """載入使用者字體目錄中的所有字體到應用程式"""
         for font_file in self.user_fonts_dir.glob("*.*"):
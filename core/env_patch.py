@@ -1,4 +1,5 @@
 import os
+import sys
 
 
 def patch_qt_platform():
@@ -17,3 +18,17 @@ def patch_qt_platform():
     if is_wayland and is_kde:
         print("[INFO] KDE + Wayland detected, forcing QT_QPA_PLATFORM=xcb")
         os.environ["QT_QPA_PLATFORM"] = "xcb"
+
+
+def ensure_headless_application():
+    """
+    無視窗模式 (HTTP 服務、渲染 API) 也需要一個 QGuiApplication：
+    QFontDatabase (AssetManager 載入使用者字體時使用) 在沒有應用程式實例時會直接讓行程崩潰。
+    若尚未建立，以 offscreen 平台建立一個；必須在主執行緒中呼叫。
+    """
+    from PyQt6.QtGui import QGuiApplication
+    app = QGuiApplication.instance()
+    if app is None:
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        app = QGuiApplication(sys.argv[:1] or ["stellar-neo"])
+    return app
@@ -1,4 +1,5 @@
 # core/exif_reader_qt.py
+import io
 import os
 import xml.etree.ElementTree as ET
 
@@ -7,6 +8,16 @@ import piexif
 from PIL import Image
 
 
+def _open_source(image_path):
+    """
+    返回可交給 Pillow / exifread 讀取的來源：檔案路徑原樣返回，
+    圖片的完整位元組 (bytes / bytearray / memoryview) 則包裝成新的記憶體檔案，每次呼叫都從頭讀取。
+    """
+    if isinstance(image_path, (bytes, bytearray, memoryview)):
+        return io.BytesIO(image_path)
+    return image_path
+
+
 def _parse_xmp(xmp_str: bytes) -> dict:
     """
     從 XMP 字串中解析元數據，兼容 Adobe 軟體輸出。
@@ -113,7 +124,7 @@ def _read_exif_with_pillow_backend(image_path: str) -> dict:
     """
     display_data = {}
     try:
-        with Image.open(image_path) as img:
+        with Image.open(_open_source(image_path)) as img:
             exif_data = img.getexif()
             if not exif_data:
                 return {}
@@ -218,9 +229,12 @@ def _extract_xmp_from_file(image_path: str) -> bytes | None:
     不依賴任何圖片函式庫，直接從二進位檔案流中搜尋並提取 XMP 數據區塊。
     """
     try:
-        with open(image_path, 'rb') as f:
-            # 讀取檔案的一部份進行搜尋，避免讀取超大檔案
-            chunk = f.read(200 * 1024)  # 讀取前 200KB
+        if isinstance(image_path, (bytes, bytearray, memoryview)):
+            chunk = bytes(image_path[:200 * 1024])
+        else:
+            with open(image_path, 'rb') as f:
+                # 讀取檔案的一部份進行搜尋，避免讀取超大檔案
+                chunk = f.read(200 * 1024)  # 讀取前 200KB
         start_tag = b"<x:xmpmeta"
         end_tag = b"</x:xmpmeta>"
         start = chunk.find(start_tag)
@@ -233,6 +247,18 @@ def _extract_xmp_from_file(image_path: str) -> bytes | None:
     return None
 
 
+def build_exif_bytes(flat_exif_data: dict) -> bytes | None:
+    """將扁平的 EXIF 字典編碼為可寫入輸出檔的 EXIF 位元組；沒有資料或無法編碼時返回 None。"""
+    exif_dict = reconstruct_exif_dict(flat_exif_data)
+    if not exif_dict:
+        return None
+    try:
+        return piexif.dump(exif_dict)
+    except Exception as e:
+        print(f"警告：無法編碼 EXIF: {e}")
+        return None
+
+
 def reconstruct_exif_dict(flat_exif_data: dict) -> dict | None:
     """
     將扁平的、用於顯示的EXIF字典，重建為 piexif.dump() 所需的巢狀字典。
@@ -292,10 +318,11 @@ def reconstruct_exif_dict(flat_exif_data: dict) -> dict | None:
     return {"0th": zeroth_ifd, "Exif": exif_ifd, "GPS": {}, "1st": {}, "thumbnail": None}
 
 
-def get_exif_data(image_path: str) -> dict:
+def get_exif_data(image_path) -> dict:
     """
     綜合讀取 EXIF 和 XMP，採用不含 Pillow 的多引擎策略。
     策略順序: piexif -> XMP -> exifread
+    image_path 可以是檔案路徑，也可以是圖片檔的完整位元組 (直接在記憶體中讀取，不寫入暫存檔)。
     """
     final_data = {}
 
@@ -314,7 +341,8 @@ def get_exif_data(image_path: str) -> dict:
     # 如果核心資訊 (如相機型號) 仍然缺失，才啟用 exifread
     if 'Model' not in final_data:
         try:
-            with open(image_path, 'rb') as f:
+            source = _open_source(image_path)
+            with (open(source, 'rb') if isinstance(source, (str, os.PathLike)) else source) as f:
                 tags = exifread.process_file(f, details=False, stop_tag='JPEGThumbnail')
 
             if 'Image Make' in tags and 'Make' not in final_data:
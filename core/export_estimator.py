@@ -0,0 +1,267 @@
+# core/export_estimator.py
+import io
+import json
+import os
+import shutil
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from PyQt6.QtCore import QObject, QRunnable, pyqtSignal
+
+from core.exif_reader import get_exif_data
+from core.pil_renderer import FRAME_SHADOW_PADDING
+from core.render_plan import RenderPlan
+from core.tiled_renderer import TILED_BAND_ROWS, TILED_RENDER_THRESHOLD, open_large_image
+
+# 匯出遙測檔的格式版本；格式變更時遞增，舊資料會被捨棄
+TELEMETRY_VERSION = 1
+# 移動平均的有效樣本數上限：較新的匯出權重較高，機器或設定改變後模型能跟著更新
+TELEMETRY_WINDOW = 200
+# 遙測樣本少於此數時，改以實際渲染幾張樣本圖片來校準
+MIN_TELEMETRY_SAMPLES = 5
+# 沒有足夠遙測時，實際渲染的樣本圖片數
+SAMPLE_RENDER_COUNT = 3
+# 輸出編碼與佇列等額外開銷相對於「來源 + 輸出緩衝區」的峰值倍數預設值
+DEFAULT_PEAK_RATIO = 1.2
+
+
+def output_size(plan: RenderPlan, img_w: int, img_h: int, renderer: str = 'pil') -> tuple[int, int]:
+    """
+    依渲染計畫計算輸出尺寸 (與 Compositor 的佈局一致)，只需要來源圖片的尺寸。
+    renderer 為實際使用的渲染器：Qt 渲染器不繪製相框陰影，輸出不會向外擴大。
+    """
+    padding_top, padding_sides, padding_bottom = plan.paddings(img_w, img_h)
+    offset = FRAME_SHADOW_PADDING * 2 if plan.frame_shadow and renderer != 'qt' else 0
+    return img_w + padding_sides * 2 + offset, img_h + padding_top + padding_bottom + offset
+
+
+def _renderer_for(renderer: str, img_w: int, img_h: int) -> str:
+    """匯出時實際使用的渲染器：超大圖不論選擇哪個渲染器，都以 PIL 分帶渲染。"""
+    return 'pil-tiled' if img_w * img_h > TILED_RENDER_THRESHOLD else renderer
+
+
+def baseline_peak_bytes(img_w: int, img_h: int, bands: int, out_w: int, out_h: int) -> int:
+    """
+    單張圖片渲染期間必定同時存在的緩衝區：解碼後的來源與 RGBA 輸出。
+    超大圖改用分帶渲染，只有一個水平帶的輸出與記憶體映射的來源。
+    """
+    if img_w * img_h > TILED_RENDER_THRESHOLD:
+        return out_w * TILED_BAND_ROWS * 4 * 2
+    return img_w * img_h * bands + out_w * out_h * 4
+
+
+class ExportTelemetry:
+    """
+    過去匯出的實測數據 (每百萬輸出像素的耗時、每個輸出像素的位元組數、峰值記憶體倍數)，
+    依「渲染器 / 相框樣式 / 輸出格式」分別以移動平均累積，並保存在使用者目錄中。
+    可在多個匯出執行緒中同時記錄。
+    """
+
+    def __init__(self, path: Path = None):
+        self.path = Path(path) if path else Path.home() / ".stellar-neo" / "export_telemetry.json"
+        self._models = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    @staticmethod
+    def key(renderer: str, plan: RenderPlan, output_format: str) -> str:
+        frame_style = plan.frame_style if plan.frame_enabled else 'none'
+        return f"{renderer}/{frame_style}/{output_format.upper()}"
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == TELEMETRY_VERSION:
+                self._models = data.get('models', {})
+        except FileNotFoundError:
+            pass
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"警告：無法讀取匯出遙測 {self.path}: {e}")
+
+    def save(self):
+        with self._lock:
+            data = {'version': TELEMETRY_VERSION, 'models': self._models}
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix('.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"警告：無法儲存匯出遙測 {self.path}: {e}")
+
+    def record(self, key: str, out_pixels: int, seconds: float, output_bytes: int, peak_ratio: float = None):
+        """記錄一張已匯出圖片的實測數據；peak_ratio 為實測峰值相對於 baseline_peak_bytes 的倍數。"""
+        if out_pixels <= 0:
+            return
+        with self._lock:
+            model = self._models.setdefault(key, {'samples': 0, 'peak_samples': 0})
+            model['samples'] += 1
+            weight = 1.0 / min(model['samples'], TELEMETRY_WINDOW)
+            for name, value in (('seconds_per_mpx', seconds / (out_pixels / 1e6)),
+                                ('bytes_per_px', output_bytes / out_pixels)):
+                model[name] = model.get(name, value) + (value - model.get(name, value)) * weight
+            if peak_ratio:
+                model['peak_samples'] += 1
+                weight = 1.0 / min(model['peak_samples'], TELEMETRY_WINDOW)
+                model['peak_ratio'] = model.get('peak_ratio', peak_ratio) + (
+                        peak_ratio - model.get('peak_ratio', peak_ratio)) * weight
+
+    def model(self, key: str):
+        """返回累積的模型；樣本不足時返回 None。"""
+        with self._lock:
+            model = self._models.get(key)
+            if not model or model.get('samples', 0) < MIN_TELEMETRY_SAMPLES:
+                return None
+            return dict(model)
+
+
+@dataclass
+class ExportEstimate:
+    count: int  # 可讀取的圖片數
+    seconds: float  # 預估的總耗時 (已考慮並行)
+    peak_bytes: int  # 預估的匯出期間記憶體峰值
+    output_bytes: int  # 預估的輸出總大小
+    free_bytes: int | None  # 輸出目錄所在磁碟的可用空間；無法取得時為 None
+    calibration: str  # 模型來源：'telemetry' 或 'sample'
+    unreadable: list = field(default_factory=list)  # 無法讀取檔頭的圖片
+
+    @property
+    def fits_disk(self) -> bool:
+        return self.free_bytes is None or self.output_bytes <= self.free_bytes
+
+
+def _read_header(path: str):
+    """只讀取檔頭取得尺寸與色彩通道數，不解碼像素 (超大圖會改用分帶渲染，因此不受 Pillow 的像素上限限制)。"""
+    with open_large_image(path) as img:
+        bands = len(img.getbands())
+        return img.width, img.height, 4 if img.mode not in ('RGB', 'RGBA') else bands
+
+
+def _sample_model(samples, plan: RenderPlan, output_format: str, renderer: str) -> dict:
+    """實際渲染並編碼幾張樣本圖片 (不寫入磁碟) 來校準模型。"""
+    from core.pil_renderer import render_with_pil
+    from core.qt_bridge import encodable_view
+    from core.render_api import render_to_bytes
+    from core.renderer_benchmark import RENDERERS
+
+    seconds_per_mpx, bytes_per_px, peak_ratios = [], [], []
+    save_args = {'compress_level': 6} if output_format == 'PNG' else {'quality': 95}
+    for path, (img_w, img_h, bands) in samples:
+        start = time.perf_counter()
+        out_w, out_h = output_size(plan, img_w, img_h, _renderer_for(renderer, img_w, img_h))
+        if img_w * img_h > TILED_RENDER_THRESHOLD:
+            # 超大圖與匯出時相同，分帶渲染並串流編碼
+            data = render_to_bytes(path, plan, format=output_format)
+            output_bytes, peak = len(data), None
+        else:
+            # 保留渲染結果的引用：Qt 渲染器的 Pillow 影像只是共用 QImage 像素的檢視
+            rendered = RENDERERS[renderer](path, plan) if renderer != 'pil' else None
+            output = encodable_view(rendered) if rendered is not None else render_with_pil(path, get_exif_data(path),
+                                                                                           plan)
+            buffer = io.BytesIO()
+            (output.convert('RGB') if output_format == 'JPEG' else output).save(buffer, format=output_format,
+                                                                               **save_args)
+            out_w, out_h = output.size
+            output_bytes, peak = buffer.tell(), output.info.get('peak_alloc_bytes')
+        elapsed = time.perf_counter() - start
+        seconds_per_mpx.append(elapsed / (out_w * out_h / 1e6))
+        bytes_per_px.append(output_bytes / (out_w * out_h))
+        if peak:
+            peak_ratios.append(peak / baseline_peak_bytes(img_w, img_h, bands, out_w, out_h))
+    return {
+        'seconds_per_mpx': sum(seconds_per_mpx) / len(seconds_per_mpx),
+        'bytes_per_px': sum(bytes_per_px) / len(bytes_per_px),
+        'peak_ratio': sum(peak_ratios) / len(peak_ratios) if peak_ratios else DEFAULT_PEAK_RATIO,
+    }
+
+
+def estimate_export(paths, plan: RenderPlan, output_dir: str = None, output_format: str = 'PNG',
+                    renderer: str = 'pil', workers: int = 1, telemetry: ExportTelemetry = None) -> ExportEstimate:
+    """
+    匯出的試算：只讀取每張圖片的檔頭，依相框設定算出輸出尺寸，
+    再以遙測 (或樣本渲染) 校準的模型估算耗時、記憶體峰值與輸出大小。
+    workers 為匯出時同時處理的圖片數。
+    """
+    output_format = output_format.upper()
+    headers, unreadable = [], []
+    for path in paths:
+        try:
+            headers.append((path, _read_header(path)))
+        except Exception as e:
+            print(f"試算時無法讀取圖片檔頭 {path}: {e}")
+            unreadable.append(path)
+
+    model, calibration = None, 'telemetry'
+    if telemetry is not None:
+        model = telemetry.model(ExportTelemetry.key(renderer, plan, output_format))
+    if model is None and headers:
+        # 依像素數排序後平均取樣，讓樣本涵蓋大小不同的圖片；分帶渲染的超大圖不適合整張渲染來取樣
+        by_size = sorted(headers, key=lambda h: h[1][0] * h[1][1])
+        by_size = [h for h in by_size if h[1][0] * h[1][1] <= TILED_RENDER_THRESHOLD] or by_size[:1]
+        count = min(SAMPLE_RENDER_COUNT, len(by_size))
+        samples = [by_size[(len(by_size) - 1) * i // max(1, count - 1)] for i in range(count)]
+        model, calibration = _sample_model(samples, plan, output_format, renderer), 'sample'
+
+    total_seconds, total_bytes, peaks = 0.0, 0, []
+    for path, (img_w, img_h, bands) in headers:
+        out_w, out_h = output_size(plan, img_w, img_h, _renderer_for(renderer, img_w, img_h))
+        total_seconds += model['seconds_per_mpx'] * out_w * out_h / 1e6
+        total_bytes += int(model['bytes_per_px'] * out_w * out_h)
+        peak_ratio = model.get('peak_ratio', DEFAULT_PEAK_RATIO)
+        peaks.append(baseline_peak_bytes(img_w, img_h, bands, out_w, out_h) * peak_ratio)
+
+    # 最壞情況：最大的幾張圖片剛好同時在渲染
+    workers = max(1, workers)
+    peak_bytes = int(sum(sorted(peaks, reverse=True)[:workers]))
+    free_bytes = None
+    if output_dir:
+        try:
+            free_bytes = shutil.disk_usage(output_dir).free
+        except OSError:
+            pass
+    estimate = ExportEstimate(
+        count=len(headers),
+        seconds=total_seconds / min(workers, max(1, len(headers))),
+        peak_bytes=peak_bytes,
+        output_bytes=total_bytes,
+        free_bytes=free_bytes,
+        calibration=calibration,
+        unreadable=unreadable,
+    )
+    print(f"[匯出試算] {estimate.count} 張，約 {estimate.seconds:.0f} 秒，峰值約 {peak_bytes / 1024 ** 2:.0f} MB，"
+          f"輸出約 {total_bytes / 1024 ** 2:.0f} MB (依據: {calibration})")
+    return estimate
+
+
+class EstimateSignals(QObject):
+    finished = pyqtSignal(object)  # ExportEstimate
+    error = pyqtSignal(str)
+
+
+class ExportEstimateTask(QRunnable):
+    """在執行緒池中執行匯出試算，避免大量檔頭讀取與樣本渲染卡住介面。"""
+
+    def __init__(self, paths, plan: RenderPlan, output_dir: str, renderer: str, workers: int,
+                 telemetry: ExportTelemetry = None, output_format: str = 'PNG'):
+        super().__init__()
+        self.paths = paths
+        self.plan = plan
+        self.output_dir = output_dir
+        self.renderer = renderer
+        self.workers = workers
+        self.telemetry = telemetry
+        self.output_format = output_format
+        self.signals = EstimateSignals()
+
+    def run(self):
+        try:
+            estimate = estimate_export(self.paths, self.plan, self.output_dir, self.output_format,
+                                       self.renderer, self.workers, self.telemetry)
+            self.signals.finished.emit(estimate)
+        except Exception as e:
+            print(f"匯出試算失敗: {e}")
+            self.signals.error.emit(str(e))
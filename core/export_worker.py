@@ -1,13 +1,49 @@
 import os
+import sys
 import threading
+import time
 
 import piexif
 from PIL import Image
-from PIL.ImageQt import fromqimage
-from PyQt6.QtCore import pyqtSignal, QObject, QRunnable, QThreadPool
-from PyQt6.QtGui import QPixmap
+from PyQt6.QtCore import pyqtSignal, QObject, QRunnable, QThread, QThreadPool, QTimer
+from PyQt6.QtGui import QImage, QPixmap
 
 from core.exif_reader import get_exif_data, reconstruct_exif_dict
+from core.export_estimator import baseline_peak_bytes, output_size
+from core.qt_bridge import encodable_view
+from core.render_cache import render_key
+from core.tiled_renderer import needs_tiled_render, open_large_image
+
+
+# 背景導出時工作執行緒的 nice 值 (Linux)，數值越大優先權越低
+BACKGROUND_NICE = 10
+# 背景導出時，介面處理一次設定變更超過這麼多毫秒就視為卡頓，導出的並行數減半
+FRAME_BUDGET_MS = 50
+# 使用者停止操作這麼久 (毫秒) 之後，開始逐步恢復導出的並行數
+IDLE_RAMP_DELAY_MS = 1500
+# 恢復並行數時，每增加一個執行緒的間隔 (毫秒)
+RAMP_STEP_MS = 500
+
+
+def export_thread_count() -> int:
+    """匯出使用的執行緒數：保留兩個核心給介面與系統。"""
+    return max(1, (os.cpu_count() or 1) - 2)
+
+
+def lower_current_thread_priority():
+    """
+    將目前的執行緒降為低優先權。
+    Linux 的一般排程策略不支援 Qt 的執行緒優先權，因此另外調高該執行緒的 nice 值。
+    一般使用者無法再把 nice 值調回來，所以只能在導出專用、用完即結束的執行緒上呼叫。
+    """
+    QThread.currentThread().setPriority(QThread.Priority.LowestPriority)
+    if sys.platform.startswith('linux'):
+        thread_id = threading.get_native_id()
+        try:
+            nice = max(BACKGROUND_NICE, os.getpriority(os.PRIO_PROCESS, thread_id))
+            os.setpriority(os.PRIO_PROCESS, thread_id, nice)
+        except OSError as e:
+            print(f"警告：無法降低導出執行緒的優先權: {e}")
 
 
 class RunnableSignals(QObject):
@@ -25,43 +61,36 @@ class ImageExportTask(QRunnable):
     代表一個獨立的圖片導出任務，將在執行緒池中運行。
     """
 
-    def __init__(self, image_path, output_dir, all_settings, render_function, signals, progress_counter_ref,
-                 progress_lock, total_count):
+    def __init__(self, image_path, output_dir, plan, render_function, signals, progress_counter_ref,
+                 progress_lock, total_count, tiled_render_function=None, telemetry=None, telemetry_key=None,
+                 background=None, render_cache=None, renderer=None):
         super().__init__()
         # --- 任務所需資料 ---
         self.image_path = image_path
         self.output_dir = output_dir
-        self.all_settings = all_settings
+        self.plan = plan  # 編譯好的 RenderPlan，整個批次共用
         self.render_function = render_function
+        # 超大圖改用的分帶渲染函式，會直接把結果寫入輸出路徑
+        self.tiled_render_function = tiled_render_function
         # --- 通訊與進度控制 ---
         self.signals = signals
         self.progress_counter = progress_counter_ref  # [int] 一個包含整數的列表，用作引用傳遞
         self.progress_lock = progress_lock  # threading.Lock 物件
         self.total_count = total_count
+        # 匯出遙測 (ExportTelemetry)：記錄實測耗時與輸出大小，供下次匯出前的試算校準
+        self.telemetry = telemetry
+        self.telemetry_key = telemetry_key
+        # threading.Event：設定後此任務以低優先權執行 (背景導出)
+        self.background = background
+        # 磁碟渲染快取 (RenderCache)：相同來源與設定的輸出直接從快取複製；renderer 為快取鍵的一部分
+        self.render_cache = render_cache
+        self.renderer = renderer
 
     def run(self):
         """QThreadPool 會自動調用此方法。"""
+        if self.background is not None and self.background.is_set():
+            lower_current_thread_priority()
         try:
-            # 調用渲染函式，可能返回 QPixmap 或 PIL Image
-            rendered_output = self.render_function(self.image_path, self.all_settings)
-
-            if not rendered_output:
-                raise RuntimeError(f"渲染失敗 (Rendering failed for) {self.image_path}")
-
-            # 根據返回類型處理圖片
-            pil_image_to_save = None
-            if isinstance(rendered_output, QPixmap):
-                # 來自舊的 QT 渲染器
-                if rendered_output.isNull():
-                    raise RuntimeError("渲染返回了空的 QPixmap")
-                qimage_to_save = rendered_output.toImage()
-                pil_image_to_save = fromqimage(qimage_to_save).convert("RGBA")
-            elif isinstance(rendered_output, Image.Image):
-                # 來自新的 PIL 渲染器
-                pil_image_to_save = rendered_output.convert("RGBA")
-            else:
-                raise TypeError(f"渲染函式返回了不支援的類型: {type(rendered_output)}")
-
             flat_exif = get_exif_data(self.image_path)
             exif_dict_for_writing = reconstruct_exif_dict(flat_exif)
 
@@ -78,7 +107,23 @@ class ImageExportTask(QRunnable):
                 except Exception as exif_error:
                     print(f"警告：無法寫入 EXIF 到 {output_filename}: {exif_error}")
 
-            pil_image_to_save.save(output_path, **save_args)
+            tiled = bool(self.tiled_render_function) and needs_tiled_render(self.image_path)
+            renderer = 'pil-tiled' if tiled else self.renderer
+            cache_key = self._cache_key(flat_exif, renderer)
+            if cache_key and self.render_cache.export_to(cache_key, output_path):
+                print(f"[渲染快取] 命中，直接複製: {output_filename}")
+            else:
+                start = time.perf_counter()
+                rendered = None
+                if tiled:
+                    # 超大圖：分帶渲染並邊渲染邊寫出，不在記憶體中組出整張輸出
+                    self.tiled_render_function(self.image_path, self.plan, output_path, save_args.get('exif'))
+                else:
+                    rendered = self._render_and_save(output_path, save_args)
+                if self.telemetry is not None:
+                    self._record_telemetry(output_path, time.perf_counter() - start, rendered, renderer)
+                if cache_key:
+                    self.render_cache.put_file(cache_key, output_path)
 
             with self.progress_lock:
                 self.progress_counter[0] += 1
@@ -100,6 +145,62 @@ class ImageExportTask(QRunnable):
                 if self.progress_counter[0] == self.total_count:
                     self.signals.finished.emit()
 
+    def _cache_key(self, flat_exif, renderer):
+        """計算此圖片的快取鍵；未啟用快取或無法計算時返回 None (照常渲染)。"""
+        if self.render_cache is None:
+            return None
+        try:
+            return render_key(self.image_path, self.plan, flat_exif, renderer, 'PNG', compress_level=6)
+        except OSError as e:
+            print(f"警告：無法計算渲染快取鍵 {self.image_path}: {e}")
+            return None
+
+    def _render_and_save(self, output_path, save_args):
+        """一般尺寸的圖片：在記憶體中渲染整張輸出後再存檔。"""
+        # 調用渲染函式，可能返回 QImage、QPixmap 或 PIL Image
+        rendered_output = self.render_function(self.image_path, self.plan)
+
+        if rendered_output is None:
+            raise RuntimeError(f"渲染失敗 (Rendering failed for) {self.image_path}")
+
+        # 根據返回類型處理圖片
+        pil_image_to_save = None
+        if isinstance(rendered_output, QPixmap):
+            # 來自舊的 QT 渲染器
+            if rendered_output.isNull():
+                raise RuntimeError("渲染返回了空的 QPixmap")
+            rendered_output = rendered_output.toImage()
+        if isinstance(rendered_output, QImage):
+            # 來自 Qt 渲染器：原地轉為 RGBA 後直接把 QImage 的像素記憶體交給編碼器，不經過任何中間副本
+            if rendered_output.isNull():
+                raise RuntimeError("渲染返回了空的 QImage")
+            pil_image_to_save = encodable_view(rendered_output)
+        elif isinstance(rendered_output, Image.Image):
+            # 來自新的 PIL 渲染器，輸出已是 RGBA 時直接使用，避免再複製一次整張畫布
+            if rendered_output.mode == "RGBA":
+                pil_image_to_save = rendered_output
+            else:
+                pil_image_to_save = rendered_output.convert("RGBA")
+        else:
+            raise TypeError(f"渲染函式返回了不支援的類型: {type(rendered_output)}")
+
+        pil_image_to_save.save(output_path, **save_args)
+        return pil_image_to_save.width, pil_image_to_save.height, pil_image_to_save.info.get('peak_alloc_bytes')
+
+    def _record_telemetry(self, output_path, seconds, rendered, renderer):
+        """
+        rendered 為 (輸出寬, 輸出高, 峰值配置量)；分帶渲染時為 None，輸出尺寸依計畫與實際使用的渲染器推算。
+        """
+        try:
+            with open_large_image(self.image_path) as img:
+                img_w, img_h = img.size
+                bands = len(img.getbands()) if img.mode in ('RGB', 'RGBA') else 4
+            out_w, out_h, peak = rendered or (*output_size(self.plan, img_w, img_h, renderer), None)
+            peak_ratio = peak / baseline_peak_bytes(img_w, img_h, bands, out_w, out_h) if peak else None
+            self.telemetry.record(self.telemetry_key, out_w * out_h, seconds, os.path.getsize(output_path), peak_ratio)
+        except Exception as e:
+            print(f"警告：無法記錄匯出遙測 {self.image_path}: {e}")
+
 
 class ExportManager(QObject):
     """
@@ -107,24 +208,31 @@ class ExportManager(QObject):
     這個物件將運行在主執行緒中，它的啟動是非阻塞的。
     """
 
-    def __init__(self, selected_paths, output_dir, all_settings, render_function, parent=None):
+    def __init__(self, selected_paths, output_dir, plan, render_function, parent=None,
+                 tiled_render_function=None, telemetry=None, telemetry_key=None, pool: QThreadPool = None,
+                 render_cache=None, renderer=None):
         super().__init__(parent)
         self.selected_paths = selected_paths
         self.output_dir = output_dir
-        self.all_settings = all_settings
+        self.plan = plan
         self.render_function = render_function
+        self.tiled_render_function = tiled_render_function
+        self.telemetry = telemetry
+        self.telemetry_key = telemetry_key
+        self.render_cache = render_cache
+        self.renderer = renderer
         self._was_cancelled = False  # <--- 新增旗標
+        self.background = threading.Event()  # 是否已轉為背景導出
 
         self.signals = RunnableSignals()
-        # 使用全域的執行緒池
-        self.pool = QThreadPool.globalInstance()
+        # 預設使用全域的執行緒池；背景導出需要傳入導出專用的執行緒池 (見 lower_current_thread_priority)
+        self.pool = pool or QThreadPool.globalInstance()
         # 使用一個普通的 Python 列表來模擬引用傳遞，並創建一個鎖
         self.progress_counter = [0]
         self.progress_lock = threading.Lock()
 
         # 根據 CPU 核心數設定最大執行緒數，-2 是為了保留核心給 UI 和系統
-        cpu_cores = os.cpu_count() or 1
-        self.pool.setMaxThreadCount(max(1, cpu_cores - 2))
+        self.pool.setMaxThreadCount(export_thread_count())
         print(f"導出任務將使用最多 {self.pool.maxThreadCount()} 個執行緒。")
 
     def start(self):
@@ -139,16 +247,26 @@ class ExportManager(QObject):
             task = ImageExportTask(
                 image_path=path,
                 output_dir=self.output_dir,
-                all_settings=self.all_settings,
+                plan=self.plan,
                 render_function=self.render_function,
                 signals=self.signals,
                 progress_counter_ref=self.progress_counter,  # 傳遞列表
                 progress_lock=self.progress_lock,  # 傳遞鎖
-                total_count=total_count
+                total_count=total_count,
+                tiled_render_function=self.tiled_render_function,
+                telemetry=self.telemetry,
+                telemetry_key=self.telemetry_key,
+                background=self.background,
+                render_cache=self.render_cache,
+                renderer=self.renderer
             )
             # 將任務提交給執行緒池，它會自動安排執行緒來運行 task.run()
             self.pool.start(task)
 
+    def enter_background(self):
+        """轉為背景導出：之後開始的圖片都在低優先權的執行緒中渲染。"""
+        self.background.set()
+
     def cancel(self):
         """取消尚未開始的任務。注意：無法停止已經在運行的任務。"""
         self._was_cancelled = True  # <--- 設置旗標
@@ -158,3 +276,51 @@ class ExportManager(QObject):
     def is_cancelled(self) -> bool:  # <--- 新增方法
         """回報任務是否被使用者手動取消。"""
         return self._was_cancelled
+
+
+class ExportThrottle(QObject):
+    """
+    背景導出的並行數調節器，在主執行緒中使用。
+    介面回報一次更新的耗時超過 FRAME_BUDGET_MS 時，立即將導出執行緒池的並行數減半；
+    使用者停止操作 IDLE_RAMP_DELAY_MS 之後，每 RAMP_STEP_MS 增加一個執行緒，直到恢復全速。
+    並行數降低時，執行中的圖片會先完成，只是暫時不再開始新的圖片。
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.pool = None
+        self.max_threads = 1
+        self.limit = 1
+        self._last_activity = 0.0
+        self._timer = QTimer(self)
+        self._timer.setInterval(RAMP_STEP_MS)
+        self._timer.timeout.connect(self._ramp_up)
+
+    def start(self, pool: QThreadPool, max_threads: int):
+        self.pool = pool
+        self.max_threads = self.limit = max(1, max_threads)
+        self._timer.start()
+
+    def stop(self):
+        self._timer.stop()
+        self.pool = None
+
+    def report_activity(self):
+        """使用者正在操作介面 (延後恢復並行數)。"""
+        self._last_activity = time.monotonic()
+
+    def report_frame(self, elapsed_ms: float):
+        """介面回報一次更新的耗時。"""
+        self.report_activity()
+        if self.pool is not None and elapsed_ms > FRAME_BUDGET_MS and self.limit > 1:
+            self._set_limit(self.limit // 2)
+
+    def _ramp_up(self):
+        idle_ms = (time.monotonic() - self._last_activity) * 1000
+        if self.pool is not None and self.limit < self.max_threads and idle_ms >= IDLE_RAMP_DELAY_MS:
+            self._set_limit(self.limit + 1)
+
+    def _set_limit(self, limit: int):
+        self.limit = limit
+        self.pool.setMaxThreadCount(limit)
+        print(f"[背景導出] 並行數調整為 {limit} / {self.max_threads}")
@@ -0,0 +1,165 @@
+# core/font_index.py
+import json
+import os
+import threading
+from pathlib import Path
+
+from PIL import ImageFont
+
+from core.utils import get_os_type
+
+FONT_EXTENSIONS = ('.ttf', '.otf', '.ttc', '.otc')
+# 索引檔格式版本，格式變更時遞增以強制重建
+INDEX_VERSION = 1
+# 沒有指定樣式時，依序偏好的「一般」樣式名稱
+REGULAR_STYLES = ('regular', 'book', 'normal', 'roman', 'text', 'medium')
+
+
+def system_font_dirs() -> list[Path]:
+    """返回目前作業系統的字體目錄 (只包含實際存在的目錄)。"""
+    home = Path.home()
+    os_type = get_os_type()
+    if os_type == 'windows':
+        dirs = [Path(os.environ.get('WINDIR', 'C:\\Windows')) / 'Fonts']
+        local_app_data = os.environ.get('LOCALAPPDATA')
+        if local_app_data:
+            dirs.append(Path(local_app_data) / 'Microsoft' / 'Windows' / 'Fonts')
+    elif os_type == 'darwin':
+        dirs = [Path('/System/Library/Fonts'), Path('/Library/Fonts'), home / 'Library' / 'Fonts']
+    else:
+        dirs = [Path('/usr/share/fonts'), Path('/usr/local/share/fonts'),
+                home / '.local' / 'share' / 'fonts', home / '.fonts']
+    return [d for d in dirs if d.is_dir()]
+
+
+class FontIndex:
+    """
+    系統字體的持久化索引：字體家族 / 樣式 → 字體檔 (以及 .ttc 內的字型索引)。
+    第一次建立時需要用 FreeType 讀取每個字體檔的名稱，之後結果會寫入 JSON 檔；
+    重新整理時只需走訪目錄並比對每個檔案的修改時間與大小，只有新增或變更的檔案才會重新讀取。
+    查詢為 O(1) 的字典查找，可在任何執行緒呼叫。
+    """
+
+    def __init__(self, cache_path: Path, font_dirs: list[Path] = None):
+        self.cache_path = Path(cache_path)
+        self.font_dirs = font_dirs
+        self._files = {}  # path -> {'mtime', 'size', 'faces': [[family, style, index], ...]}
+        self._families = {}  # family.lower() -> {style.lower(): (path, index, family, style)}
+        self._loaded = False
+        # 每次重建查詢表時遞增，讓依索引內容建立的快取 (例如鍵值對照表) 知道何時需要重建
+        self.generation = 0
+        self._lock = threading.RLock()
+
+    # --- 建立與更新 ---
+
+    def refresh(self):
+        """與磁碟上的字體目錄同步；只有內容有變動時才重寫索引檔。"""
+        with self._lock:
+            if not self._files:
+                self._load_cache()
+            seen, changed = set(), False
+            for font_dir in (self.font_dirs if self.font_dirs is not None else system_font_dirs()):
+                for root, _, files in os.walk(font_dir):
+                    for name in files:
+                        if not name.lower().endswith(FONT_EXTENSIONS):
+                            continue
+                        path = os.path.join(root, name)
+                        try:
+                            stat = os.stat(path)
+                        except OSError:
+                            continue
+                        seen.add(path)
+                        entry = self._files.get(path)
+                        if entry and entry['mtime'] == stat.st_mtime and entry['size'] == stat.st_size:
+                            continue
+                        self._files[path] = {'mtime': stat.st_mtime, 'size': stat.st_size,
+                                             'faces': self._read_faces(path)}
+                        changed = True
+            for path in set(self._files) - seen:
+                del self._files[path]
+                changed = True
+            if changed or not self.cache_path.exists():
+                self._save_cache()
+            self._rebuild_lookup()
+            self._loaded = True
+            print(f"字體索引：{len(self._files)} 個字體檔，{len(self._families)} 個字體家族。")
+
+    @property
+    def loaded(self) -> bool:
+        """索引是否已建立完成；GUI 執行緒可先以此判斷，避免在查詢時等待整個掃描。"""
+        return self._loaded
+
+    def ensure_loaded(self):
+        """第一次查詢時才建立索引 (若背景執行緒正在建立，會等待其完成)。"""
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self.refresh()
+
+    @staticmethod
+    def _read_faces(path: str) -> list[list]:
+        """以 FreeType 讀取字體檔內每個字型的 (家族, 樣式, 字型索引)。"""
+        faces, index = [], 0
+        while True:
+            try:
+                family, style = ImageFont.truetype(path, 12, index=index).getname()
+            except Exception:
+                break
+            if family:
+                faces.append([family, style or '', index])
+            index += 1
+            # 只有字型集合檔 (.ttc/.otc) 會包含多個字型
+            if not path.lower().endswith(('.ttc', '.otc')):
+                break
+        return faces
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == INDEX_VERSION:
+                self._files = data.get('files', {})
+        except (FileNotFoundError, json.JSONDecodeError, AttributeError):
+            self._files = {}
+
+    def _save_cache(self):
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.cache_path.with_suffix('.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': INDEX_VERSION, 'files': self._files}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.cache_path)
+        except Exception as e:
+            print(f"寫入字體索引 {self.cache_path} 時發生錯誤: {e}")
+
+    def _rebuild_lookup(self):
+        families = {}
+        # 依路徑排序，讓同名字型的選擇在每次啟動時都一致
+        for path in sorted(self._files):
+            for family, style, index in self._files[path]['faces']:
+                styles = families.setdefault(family.lower(), {})
+                styles.setdefault(style.lower(), (path, index, family, style))
+        self._families = families
+        self.generation += 1
+
+    # --- 查詢 ---
+
+    def families(self) -> list[str]:
+        self.ensure_loaded()
+        return sorted({next(iter(styles.values()))[2] for styles in self._families.values()})
+
+    def lookup(self, family: str, style: str = None):
+        """
+        返回 (字體檔路徑, 字型索引, 家族名稱, 樣式名稱)；找不到該家族時返回 None。
+        沒有指定樣式或找不到指定樣式時，優先選擇一般樣式。
+        """
+        self.ensure_loaded()
+        styles = self._families.get((family or '').lower())
+        if not styles:
+            return None
+        if style and style.lower() in styles:
+            return styles[style.lower()]
+        for regular in REGULAR_STYLES:
+            if regular in styles:
+                return styles[regular]
+        return styles[min(styles, key=len)]
@@ -0,0 +1,330 @@
+# core/job_queue.py
+import json
+import os
+import random
+import socket
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+from core.render_api import OUTPUT_FORMATS, render_to_bytes
+from core.render_plan import RenderPlan
+
+# 工作目錄結構：
+#   job.json   共用的設定快照與輸出選項 (建立後不再修改)
+#   pending/   等待處理的項目，每個項目一個 JSON 檔
+#   claimed/   已被某個工作者領取的項目；檔案修改時間即租約的最後續約時間
+#   done/      完成的項目狀態 (輸出路徑、工作者、耗時)
+#   failed/    失敗的項目狀態 (錯誤訊息)
+JOB_FILE = 'job.json'
+QUEUE_DIRS = ('pending', 'claimed', 'done', 'failed')
+# 領取的項目超過這麼久 (秒) 沒有續約，就視為工作者已當機，項目回到佇列
+# 需遠大於續約間隔、NAS 的屬性快取時間與主機間的時鐘誤差
+DEFAULT_LEASE_TIMEOUT = 300
+# 佇列暫時沒有項目時的輪詢間隔 (秒)
+DEFAULT_POLL_INTERVAL = 2.0
+# 同一個項目最多被領取的次數；超過時 (例如每次都讓工作者崩潰) 直接標記為失敗
+MAX_ATTEMPTS = 3
+# 領取時從最前面的這麼多個項目中隨機挑選，降低多個工作者同時搶同一個檔案的機率
+CLAIM_WINDOW = 16
+
+
+def _write_json_atomic(path: Path, data: dict):
+    """先寫入同目錄的暫存檔再改名，其他工作者永遠不會讀到寫到一半的檔案。"""
+    tmp_path = path.with_name(f".{path.name}.{socket.gethostname()}-{os.getpid()}-{threading.get_ident()}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path: Path) -> dict:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _portable_path(job_dir: Path, path) -> str:
+    """
+    盡量以相對於工作目錄的路徑儲存，讓以不同掛載點存取同一個 NAS 的主機都能找到檔案。
+    無法表示為相對路徑時 (例如 Windows 上不同磁碟機) 保留絕對路徑。
+    """
+    path = os.path.abspath(path)
+    try:
+        return os.path.relpath(path, job_dir)
+    except ValueError:
+        return path
+
+
+def create_job(job_dir, sources, settings: dict, output_dir=None, format: str = 'PNG', quality: int = 95) -> int:
+    """
+    建立一個匯出工作：寫入設定快照，並為每個來源圖片建立一個待處理項目。
+    settings 為 gallery_settings 格式的設定字典；output_dir 預設為工作目錄下的 output/。
+    返回建立的項目數。
+    """
+    job_dir = Path(job_dir).absolute()
+    output_format = format.upper()
+    output_format = 'JPEG' if output_format == 'JPG' else output_format
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"不支援的輸出格式: {format}")
+    if (job_dir / JOB_FILE).exists():
+        raise ValueError(f"工作目錄已存在工作: {job_dir}")
+    for name in QUEUE_DIRS:
+        (job_dir / name).mkdir(parents=True, exist_ok=True)
+    output_dir = Path(output_dir).absolute() if output_dir else job_dir / 'output'
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    # 先寫入所有項目，最後才寫入 job.json，工作者不會在項目不完整時把工作視為已清空
+    extension = 'jpg' if output_format == 'JPEG' else output_format.lower()
+    count = 0
+    for index, source in enumerate(sources):
+        name, _ = os.path.splitext(os.path.basename(source))
+        item_id = f"{index:06d}"
+        _write_json_atomic(job_dir / 'pending' / f"{item_id}.json", {
+            'id': item_id,
+            'source': _portable_path(job_dir, source),
+            'output': _portable_path(job_dir, output_dir / f"{name}_framed.{extension}"),
+            'attempts': 0,
+        })
+        count += 1
+    _write_json_atomic(job_dir / JOB_FILE, {
+        'settings': settings,
+        'format': output_format,
+        'quality': quality,
+        'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'total': count,
+    })
+    return count
+
+
+def job_status(job_dir) -> dict:
+    """各狀態的項目數，以及建立工作時的總項目數。"""
+    job_dir = Path(job_dir)
+    status = {name: len(JobQueue(job_dir).list_items(name)) for name in QUEUE_DIRS}
+    if (job_dir / JOB_FILE).exists():
+        status['total'] = _read_json(job_dir / JOB_FILE).get('total', 0)
+    return status
+
+
+class JobQueue:
+    """
+    以共用目錄實作的工作佇列，可由多台主機上的任意多個行程同時使用。
+    領取項目是把檔案從 pending/ 改名到 claimed/：改名在同一個檔案系統上是原子操作 (NFS / SMB 伺服器端亦然)，
+    同一個項目只有一個工作者會改名成功。領取後持續更新檔案的修改時間作為租約，
+    租約過期的項目會被任何一個工作者放回 pending/。
+    """
+
+    def __init__(self, job_dir):
+        self.job_dir = Path(job_dir).absolute()
+
+    def resolve(self, path: str) -> str:
+        return path if os.path.isabs(path) else os.path.normpath(self.job_dir / path)
+
+    def list_items(self, state: str) -> list[str]:
+        """列出某個狀態下的項目檔名 (忽略寫入中的暫存檔)。"""
+        try:
+            names = os.listdir(self.job_dir / state)
+        except FileNotFoundError:
+            return []
+        return sorted(n for n in names if n.endswith('.json') and not n.startswith('.'))
+
+    def claim(self):
+        """領取一個項目；佇列為空時返回 None。"""
+        candidates = self.list_items('pending')
+        while candidates:
+            name = random.choice(candidates[:CLAIM_WINDOW])
+            candidates.remove(name)
+            claimed_path = self.job_dir / 'claimed' / name
+            try:
+                os.rename(self.job_dir / 'pending' / name, claimed_path)
+            except FileNotFoundError:
+                continue  # 被其他工作者搶先領取
+            try:
+                # 改名會保留原本的修改時間，立即續約一次作為租約起點
+                os.utime(claimed_path)
+                return _read_json(claimed_path)
+            except FileNotFoundError:
+                continue  # 續約前就被其他工作者當作過期項目收回
+            except (OSError, json.JSONDecodeError) as e:
+                self._finish(name, 'failed', {'id': name[:-5], 'error': f"無法讀取項目: {e}"})
+        return None
+
+    def renew(self, item_ids):
+        """續約：更新領取中項目的修改時間。"""
+        for item_id in item_ids:
+            try:
+                os.utime(self.job_dir / 'claimed' / f"{item_id}.json")
+            except FileNotFoundError:
+                pass  # 租約已過期並被放回佇列
+
+    def complete(self, item: dict, status: dict):
+        self._finish(f"{item['id']}.json", 'done', status)
+
+    def fail(self, item: dict, status: dict):
+        self._finish(f"{item['id']}.json", 'failed', status)
+
+    def _finish(self, name: str, state: str, status: dict):
+        """先寫入結果狀態，再移除領取檔；順序相反的話，當機時項目會同時從兩邊消失。"""
+        _write_json_atomic(self.job_dir / state / name, status)
+        try:
+            os.remove(self.job_dir / 'claimed' / name)
+        except FileNotFoundError:
+            pass
+
+    def requeue_expired(self, lease_timeout: float = DEFAULT_LEASE_TIMEOUT) -> int:
+        """把租約過期的項目放回佇列 (或在超過重試次數時標記為失敗)，返回處理的項目數。"""
+        now = time.time()
+        requeued = 0
+        for name in self.list_items('claimed'):
+            claimed_path = self.job_dir / 'claimed' / name
+            try:
+                if now - os.stat(claimed_path).st_mtime < lease_timeout:
+                    continue
+                # 先改名為本工作者專屬的名稱，多個工作者同時發現過期時只有一個會接手
+                reclaim_path = claimed_path.with_name(f".{name}.reclaim-{socket.gethostname()}-{os.getpid()}")
+                os.rename(claimed_path, reclaim_path)
+            except FileNotFoundError:
+                continue
+            try:
+                item = _read_json(reclaim_path)
+                item['attempts'] = item.get('attempts', 0) + 1
+                if item['attempts'] >= MAX_ATTEMPTS:
+                    _write_json_atomic(self.job_dir / 'failed' / name, {
+                        **item, 'error': f"租約過期 {item['attempts']} 次，工作者可能在處理此項目時當機"})
+                else:
+                    _write_json_atomic(self.job_dir / 'pending' / name, item)
+                os.remove(reclaim_path)
+                requeued += 1
+                print(f"[工作佇列] 項目 {item.get('id')} 的租約已過期，第 {item['attempts']} 次放回佇列")
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"[工作佇列] 無法放回項目 {name}: {e}")
+        return requeued
+
+    def is_drained(self) -> bool:
+        """沒有等待中也沒有處理中的項目。"""
+        return not self.list_items('pending') and not self.list_items('claimed')
+
+
+class JobWorker:
+    """
+    從工作目錄領取項目並渲染的工作者。每個行程以一個執行緒池同時處理多個項目，
+    背景執行緒定期為所有處理中的項目續約。
+    設定快照在開始時編譯一次；Logo 與字體從本機的資源目錄解析，使用者自訂的 Logo 與字體需要在每台主機上都存在。
+    """
+
+    def __init__(self, job_dir, asset_manager, concurrency: int = None,
+                 lease_timeout: float = DEFAULT_LEASE_TIMEOUT, poll_interval: float = DEFAULT_POLL_INTERVAL,
+                 cache=None):
+        self.queue = JobQueue(job_dir)
+        self.asset_manager = asset_manager
+        # 本機的磁碟渲染快取 (RenderCache)；相同的來源與設定再次匯出時不需要重新渲染
+        self.cache = cache
+        self.concurrency = concurrency or max(1, (os.cpu_count() or 1) - 1)
+        self.lease_timeout = lease_timeout
+        self.poll_interval = poll_interval
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}"
+        self._active = {}  # 項目 id -> 項目
+        self._active_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def run(self, exit_when_empty: bool = False) -> dict:
+        """
+        持續領取並處理項目，直到呼叫 stop()，或 (exit_when_empty 時) 整個工作都已完成。
+        返回本工作者處理的統計。
+        """
+        # 工作者可以先於工作建立而啟動，等到設定快照出現再開始
+        job_file = self.queue.job_dir / JOB_FILE
+        while not job_file.exists():
+            if self._stop.wait(self.poll_interval):
+                return {'done': 0, 'failed': 0}
+        job = _read_json(job_file)
+        plan = RenderPlan.compile(job.get('settings') or {}, self.asset_manager)
+        encode_options = {'format': job.get('format', 'PNG'), 'quality': job.get('quality', 95)}
+        stats = {'done': 0, 'failed': 0}
+        heartbeat = threading.Thread(target=self._renew_leases, daemon=True)
+        heartbeat.start()
+        print(f"[工作佇列] 工作者 {self.worker_id} 開始處理 {self.queue.job_dir}，同時處理 {self.concurrency} 個項目")
+
+        last_requeue = 0.0
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='job-worker') as executor:
+            pending = set()
+            while not self._stop.is_set():
+                if time.time() - last_requeue >= self.lease_timeout / 2:
+                    self.queue.requeue_expired(self.lease_timeout)
+                    last_requeue = time.time()
+                while len(pending) < self.concurrency:
+                    item = self.queue.claim()
+                    if item is None:
+                        break
+                    with self._active_lock:
+                        self._active[item['id']] = item
+                    pending.add(executor.submit(self._process, item, plan, encode_options))
+
+                if not pending:
+                    if exit_when_empty and self.queue.is_drained():
+                        break
+                    self._stop.wait(self.poll_interval)
+                    continue
+                done, pending = wait(pending, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stats['done' if future.result() else 'failed'] += 1
+            for future in pending:
+                stats['done' if future.result() else 'failed'] += 1
+
+        self._stop.set()
+        print(f"[工作佇列] 工作者 {self.worker_id} 結束：完成 {stats['done']}，失敗 {stats['failed']}")
+        return stats
+
+    def stop(self):
+        self._stop.set()
+
+    def _renew_leases(self):
+        while not self._stop.wait(self.lease_timeout / 4):
+            with self._active_lock:
+                item_ids = list(self._active)
+            self.queue.renew(item_ids)
+
+    def _process(self, item: dict, plan: RenderPlan, encode_options: dict) -> bool:
+        """渲染單一項目並寫回結果與狀態檔；返回是否成功。"""
+        start = time.perf_counter()
+        source = self.queue.resolve(item['source'])
+        output = self.queue.resolve(item['output'])
+        status = {**item, 'worker': self.worker_id}
+        try:
+            data = render_to_bytes(source, plan, cache=self.cache, **encode_options)
+            # 先寫入暫存檔再改名，輸出目錄中不會出現不完整的圖片
+            tmp_output = f"{output}.{self.worker_id}.tmp"
+            with open(tmp_output, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_output, output)
+            status.update(elapsed_ms=round((time.perf_counter() - start) * 1000, 1),
+                          finished=time.strftime('%Y-%m-%d %H:%M:%S'))
+            self.queue.complete(item, status)
+            return True
+        except Exception as e:
+            print(f"[工作佇列] 項目 {item['id']} ({source}) 失敗: {e}")
+            status.update(error=str(e), finished=time.strftime('%Y-%m-%d %H:%M:%S'))
+            self.queue.fail(item, status)
+            return False
+        finally:
+            with self._active_lock:
+                self._active.pop(item['id'], None)
+
+
+def run_worker(job_dir, concurrency: int = None, lease_timeout: float = DEFAULT_LEASE_TIMEOUT,
+               poll_interval: float = DEFAULT_POLL_INTERVAL, exit_when_empty: bool = False) -> dict:
+    """啟動無視窗的工作者並阻塞至結束 (或收到中斷)。"""
+    from core.asset_manager import AssetManager
+    from core.env_patch import ensure_headless_application
+    from core.render_cache import CACHE_SETTINGS_KEY, RenderCache
+    from core.settings_manager import SettingsManager
+
+    ensure_headless_application()
+    cache = RenderCache.from_settings(SettingsManager().get(CACHE_SETTINGS_KEY))
+    worker = JobWorker(job_dir, AssetManager(), concurrency, lease_timeout, poll_interval, cache)
+    try:
+        return worker.run(exit_when_empty=exit_when_empty)
+    except KeyboardInterrupt:
+        # 已開始的項目會處理完畢；若行程被強制結束，租約過期後由其他工作者接手
+        print("[工作佇列] 收到中斷，停止領取新項目")
+        worker.stop()
+        raise
@@ -0,0 +1,64 @@
+# core/lru_cache.py
+import threading
+from collections import OrderedDict
+
+
+class ByteLRUCache:
+    """
+    以位元組數為上限的 LRU 快取，可在多個執行緒間共用。
+    每個項目在放入時自行回報大小；總量超過上限時，從最久未使用的項目開始淘汰。
+    單一項目大於上限時不會被快取。
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()  # key -> (value, nbytes)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key, value, nbytes: int):
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+            if nbytes > self.max_bytes:
+                return
+            self._items[key] = (value, nbytes)
+            self.current_bytes += nbytes
+            self._evict()
+
+    def set_max_bytes(self, max_bytes: int):
+        """調整上限，縮小時立即淘汰多出來的項目。"""
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def _evict(self):
+        while self.current_bytes > self.max_bytes and self._items:
+            _, (_, nbytes) = self._items.popitem(last=False)
+            self.current_bytes -= nbytes
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.current_bytes = 0
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._items
+
+    def __len__(self):
+        with self._lock:
+            return len(self._items)
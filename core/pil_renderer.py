@@ -0,0 +1,692 @@
+# core/pil_renderer.py
+import math
+import os
+from typing import NamedTuple
+
+import numpy as np
+from PIL import Image, ImageColor, ImageDraw, ImageFilter, ImageFont
+
+from core.lru_cache import ByteLRUCache
+from core.render_plan import RenderPlan
+
+# 分塊處理的列數：所有暫存陣列都被限制在「分塊列數 x 畫布寬度」以內
+CHUNK_ROWS = 256
+# 模糊延伸背景在降採樣後的工作模糊半徑；匯出半徑越大，可降採樣的倍率越高
+BLUR_WORK_RADIUS = 4.0
+# 串流 (分帶) 渲染時模糊背景工作圖的像素上限
+STREAMING_BLUR_WORK_PIXELS = 4_000_000
+# 文字圖快取的容量上限 (跨批次共用)
+TEXT_SPRITE_CACHE = ByteLRUCache(64 * 1024 ** 2)
+# 每次 alpha 合成處理的最大像素數，用來限制浮點暫存陣列的大小
+OVER_CHUNK_PIXELS = 1 << 20
+
+# 相片陰影參數 (與舊版 PIL 渲染器一致)
+PHOTO_SHADOW_BLUR = 30
+PHOTO_SHADOW_OFFSET = (8, 8)
+PHOTO_SHADOW_PADDING = int(PHOTO_SHADOW_BLUR * 1.5)
+PHOTO_SHADOW_ALPHA = 50
+
+# 相框外部陰影參數
+FRAME_SHADOW_BLUR = 20
+FRAME_SHADOW_PADDING = int(FRAME_SHADOW_BLUR * 1.5)
+FRAME_SHADOW_ALPHA = 80
+
+
+class AllocationLedger:
+    """
+    記錄單張圖片渲染期間配置的大型緩衝區，用於回報每張圖片的峰值記憶體。
+    採用明確登記的方式計算，因此多執行緒並行導出時，各張圖片的數據互不干擾。
+    """
+
+    def __init__(self):
+        self.current = 0
+        self.peak = 0
+
+    def alloc(self, nbytes: int):
+        """登記一塊會持續存在的緩衝區。"""
+        self.current += nbytes
+        self.peak = max(self.peak, self.current)
+
+    def free(self, nbytes: int):
+        self.current -= nbytes
+
+    def touch(self, nbytes: int):
+        """登記一塊用完即丟的暫存區，只影響峰值。"""
+        self.peak = max(self.peak, self.current + nbytes)
+
+
+def image_nbytes(img: Image.Image) -> int:
+    """估算 Pillow 影像像素資料所佔的位元組數。"""
+    return img.width * img.height * len(img.getbands())
+
+
+def subtract_box(box, hole):
+    """返回 box 扣除 hole 之後剩下的 (最多四個) 矩形。"""
+    x0, y0, x1, y1 = box
+    hx0, hy0 = max(hole[0], x0), max(hole[1], y0)
+    hx1, hy1 = min(hole[2], x1), min(hole[3], y1)
+    if hx0 >= hx1 or hy0 >= hy1:
+        return [box]
+    parts = [
+        (x0, y0, x1, hy0),  # 上
+        (x0, hy1, x1, y1),  # 下
+        (x0, hy0, hx0, hy1),  # 左
+        (hx1, hy0, x1, hy1),  # 右
+    ]
+    return [p for p in parts if p[0] < p[2] and p[1] < p[3]]
+
+
+def inset_box(box, amount):
+    """將矩形向內縮排；縮排後若為空則返回 None。"""
+    x0, y0, x1, y1 = box
+    inner = (x0 + amount, y0 + amount, x1 - amount, y1 - amount)
+    if inner[0] >= inner[2] or inner[1] >= inner[3]:
+        return None
+    return inner
+
+
+class Canvas:
+    """
+    包裝一塊預先配置的 RGBA 輸出緩衝區 (NumPy 陣列)。
+    所有繪製都透過 NumPy 視圖就地寫入受影響的區域，不再建立整張大小的中間圖層。
+    `top` 與 `left` 為此緩衝區在完整輸出中的起始列與起始行，讓同一套繪製流程也能用於分帶渲染與局部區域渲染。
+    """
+
+    def __init__(self, buffer: np.ndarray, top: int = 0, ledger: AllocationLedger = None, left: int = 0):
+        self.buffer = buffer
+        self.top = top
+        self.left = left
+        self.height, self.width = buffer.shape[:2]
+        self.ledger = ledger or AllocationLedger()
+
+    def clip(self, box):
+        """將全域座標的矩形裁切到此緩衝區範圍內；沒有交集時返回 None。"""
+        x0, y0, x1, y1 = (int(v) for v in box)
+        x0, x1 = max(x0, self.left), min(x1, self.left + self.width)
+        y0, y1 = max(y0, self.top), min(y1, self.top + self.height)
+        if x0 >= x1 or y0 >= y1:
+            return None
+        return x0, y0, x1, y1
+
+    def chunks(self, box):
+        """裁切區域後，按列切成小塊逐一產出，以限制暫存陣列的大小。"""
+        clipped = self.clip(box)
+        if not clipped:
+            return
+        x0, y0, x1, y1 = clipped
+        for cy in range(y0, y1, CHUNK_ROWS):
+            yield x0, cy, x1, min(cy + CHUNK_ROWS, y1)
+
+    def view(self, box) -> np.ndarray:
+        x0, y0, x1, y1 = box
+        return self.buffer[y0 - self.top:y1 - self.top, x0 - self.left:x1 - self.left]
+
+    def put(self, box, pixels, mask=None):
+        """以取代方式寫入像素 (等同 Image.paste 搭配 0/255 遮罩)。"""
+        view = self.view(box)
+        if mask is None:
+            view[...] = pixels
+        else:
+            np.copyto(view, np.broadcast_to(pixels, view.shape), where=mask[..., None])
+
+    def over(self, box, rgb, alpha):
+        """以標準 alpha 合成 (source-over) 將顏色疊加到區域上，alpha 為 0~255 的陣列。"""
+        view = self.view(box)
+        # 寬幅畫布時再按列細分，浮點暫存陣列最多只有 OVER_CHUNK_PIXELS 個像素
+        step = max(1, OVER_CHUNK_PIXELS // max(1, view.shape[1]))
+        src_rgb = np.asarray(rgb, dtype=np.float32)
+        per_row = src_rgb.ndim == 3
+        for start in range(0, view.shape[0], step):
+            rows = slice(start, start + step)
+            self._over_rows(view[rows], src_rgb[rows] if per_row else src_rgb, alpha[rows])
+
+    def _over_rows(self, view, src_rgb, alpha):
+        self.ledger.touch(view.shape[0] * view.shape[1] * 32)
+        src_a = alpha.astype(np.float32) / 255.0
+        dst_a = view[..., 3].astype(np.float32) / 255.0
+        out_a = src_a + dst_a * (1.0 - src_a)
+        dst_weight = dst_a * (1.0 - src_a)
+        safe_a = np.where(out_a > 0, out_a, 1.0)
+        out_rgb = (src_rgb * src_a[..., None] + view[..., :3] * dst_weight[..., None]) / safe_a[..., None]
+        view[..., :3] = np.clip(out_rgb + 0.5, 0, 255).astype(np.uint8)
+        view[..., 3] = np.clip(out_a * 255.0 + 0.5, 0, 255).astype(np.uint8)
+
+    def over_image(self, pos, pixels, clip_box=None):
+        """
+        將一張 RGBA 小圖 (如 Logo、文字) 以 alpha 合成疊加到指定位置。
+        pixels 可以是 NumPy 陣列，或支援相同切片方式的 ResizedSprite。
+        """
+        x, y = int(pos[0]), int(pos[1])
+        box = (x, y, x + pixels.shape[1], y + pixels.shape[0])
+        if clip_box:
+            box = (max(box[0], clip_box[0]), max(box[1], clip_box[1]),
+                   min(box[2], clip_box[2]), min(box[3], clip_box[3]))
+        for x0, y0, x1, y1 in self.chunks(box):
+            part = pixels[y0 - y:y1 - y, x0 - x:x1 - x]
+            self.over((x0, y0, x1, y1), part[..., :3], part[..., 3])
+
+
+class ResizedSprite:
+    """
+    按需縮放的 RGBA 小圖，用於串流渲染時的 Logo。
+    Logo 的輸出尺寸與原圖高度成正比，超大圖時整張縮放後的 Logo 本身就可能上百 MB；
+    這裡只在被切片取用時縮放所需的列 (Image.resize 的 box 參數)，結果與整張縮放只有捨入上的差異。
+    """
+
+    def __init__(self, image: Image.Image, size: tuple[int, int]):
+        self.image = image
+        self.shape = (size[1], size[0], 4)
+
+    def __getitem__(self, key):
+        rows, cols = key
+        y0, y1, _ = rows.indices(self.shape[0])
+        scale = self.image.height / self.shape[0]
+        part = self.image.resize((self.shape[1], max(0, y1 - y0)), Image.Resampling.LANCZOS,
+                                 box=(0, y0 * scale, self.image.width, y1 * scale))
+        return np.asarray(part)[:, cols]
+
+
+class RoundedRectPatch:
+    """
+    圓角矩形 (可選擇模糊，用於陰影) 的九宮格表示。
+    形狀在直邊部分沿著邊的方向是常數，因此只需繪製 (並模糊) 一張「四個角落 + 一像素中段」的小圖，
+    任意區域的值都能用索引從小圖中取出，不必建立整張大小的遮罩或陰影圖層。
+    座標系與舊版一致：畫布大小為形狀加上四周 padding，形狀位於 (padding, padding)，
+    並沿用 ImageDraw.rounded_rectangle 的邊界慣例，以畫出與整張繪製完全相同的角落。
+    """
+
+    def __init__(self, shape_w: int, shape_h: int, radius: float, padding: int = 0, blur: float = 0,
+                 alpha: int = 255):
+        self.width = shape_w + padding * 2
+        self.height = shape_h + padding * 2
+        self.radius = radius
+        self.padding = padding
+        margin = int(math.ceil(blur * 3)) + 2
+        core = padding + int(math.ceil(radius)) + margin
+        self.core = core
+        # 形狀太小時，該軸直接使用完整尺寸 (此時本來就不大)
+        self.core_x = core if self.width > core * 2 + 1 else None
+        self.core_y = core if self.height > core * 2 + 1 else None
+        self.mini_w = core * 2 + 1 if self.core_x else self.width
+        self.mini_h = core * 2 + 1 if self.core_y else self.height
+
+        mini = Image.new('L', (self.mini_w, self.mini_h), 0)
+        ImageDraw.Draw(mini).rounded_rectangle(
+            [(padding, padding), (self.mini_w - padding, self.mini_h - padding)], radius=radius, fill=alpha
+        )
+        if blur > 0:
+            mini = mini.filter(ImageFilter.GaussianBlur(radius=blur))
+        self.mini = np.asarray(mini)
+
+    @staticmethod
+    def _axis(start, stop, full, mini, core):
+        idx = np.arange(start, stop)
+        if core is None:
+            return idx
+        return np.where(idx < core, idx, np.where(idx >= full - core, idx - (full - mini), core))
+
+    def alpha(self, x0, y0, x1, y1) -> np.ndarray:
+        """返回畫布座標系中指定區域的值 (uint8)。"""
+        xs = self._axis(x0, x1, self.width, self.mini_w, self.core_x)
+        ys = self._axis(y0, y1, self.height, self.mini_h, self.core_y)
+        return self.mini[np.ix_(ys, xs)]
+
+    def mask(self, x0, y0, x1, y1):
+        """
+        返回指定區域的布林遮罩 (僅適用於未模糊的形狀)。
+        若區域完全落在形狀的直邊部分，返回 None，代表整塊都在形狀內。
+        """
+        pad, edge = self.padding, self.padding + int(math.ceil(self.radius)) + 1
+        inside = x0 >= pad and y0 >= pad and x1 <= self.width - pad and y1 <= self.height - pad
+        if inside and (self.radius <= 0 or
+                       (x0 >= edge and x1 <= self.width - edge) or
+                       (y0 >= edge and y1 <= self.height - edge)):
+            return None
+        return self.alpha(x0, y0, x1, y1) > 0
+
+
+class BlurBackground:
+    """
+    模糊延伸背景的按需產生器。
+    以「覆蓋」方式將原圖對應到相框，並在降採樣的工作尺寸上完成模糊；
+    之後只為實際要繪製的區域放大取樣，不再建立整張相框大小的縮放、裁切與模糊圖層。
+    """
+
+    def __init__(self, source: Image.Image, frame_w: int, frame_h: int, blur_radius: float,
+                 ledger: AllocationLedger = None, max_work_pixels: int = None):
+        self.source = source
+        self.frame_w, self.frame_h = frame_w, frame_h
+        self.blur_radius = max(0.0, blur_radius)
+        img_w, img_h = source.size
+        self.scale = max(frame_w / img_w, frame_h / img_h)
+        self.left = (img_w * self.scale - frame_w) / 2
+        self.top = (img_h * self.scale - frame_h) / 2
+
+        self.small = None
+        factor = self.blur_radius / BLUR_WORK_RADIUS
+        if max_work_pixels:
+            # 分帶渲染時限制工作圖的像素數，使其記憶體不隨原圖尺寸增長
+            factor = max(factor, math.sqrt(frame_w * frame_h / max_work_pixels))
+        if factor > 1:
+            small_w = max(1, int(math.ceil(frame_w / factor)))
+            small_h = max(1, int(math.ceil(frame_h / factor)))
+            box = self._source_box(0, 0, frame_w, frame_h)
+            if max_work_pixels:
+                reduced, box = self._reduce_in_bands(box, int(factor / 2))
+                small = reduced.resize((small_w, small_h), Image.Resampling.LANCZOS, box=box)
+            else:
+                small = source.resize((small_w, small_h), Image.Resampling.LANCZOS, box=box, reducing_gap=3.0)
+            self.small = small.filter(ImageFilter.GaussianBlur(radius=self.blur_radius * small_w / frame_w))
+            if ledger:
+                ledger.alloc(image_nbytes(self.small))
+
+    def _reduce_in_bands(self, box, ratio):
+        """
+        以整數倍率逐帶縮小原圖，避免 resize 在整張原圖上建立大型中間影像。
+        返回縮小後的影像以及對應縮小座標系的來源區域。
+        """
+        if ratio < 2:
+            return self.source, box
+        img_w, img_h = self.source.size
+        reduced = Image.new(self.source.mode, (math.ceil(img_w / ratio), math.ceil(img_h / ratio)))
+        band_rows = ratio * max(1, CHUNK_ROWS // ratio)
+        for y in range(0, img_h, band_rows):
+            band = self.source.crop((0, y, img_w, min(y + band_rows, img_h))).reduce(ratio)
+            reduced.paste(band, (0, y // ratio))
+        return reduced, tuple(v / ratio for v in box)
+
+    def _source_box(self, x0, y0, x1, y1):
+        img_w, img_h = self.source.size
+        return (
+            min(max((x0 + self.left) / self.scale, 0), img_w),
+            min(max((y0 + self.top) / self.scale, 0), img_h),
+            min(max((x1 + self.left) / self.scale, 0), img_w),
+            min(max((y1 + self.top) / self.scale, 0), img_h),
+        )
+
+    def region(self, x0, y0, x1, y1) -> np.ndarray:
+        """返回相框座標系中指定區域的背景像素 (RGBA uint8 陣列)。"""
+        size = (x1 - x0, y1 - y0)
+        if self.small is not None:
+            sx = self.small.width / self.frame_w
+            sy = self.small.height / self.frame_h
+            tile = self.small.resize(size, Image.Resampling.BICUBIC, box=(x0 * sx, y0 * sy, x1 * sx, y1 * sy))
+        else:
+            # 模糊半徑很小時直接在全解析度上處理，只需為區域多取一圈模糊所需的邊界
+            margin = int(math.ceil(self.blur_radius * 3)) + 1 if self.blur_radius > 0 else 0
+            ex0, ey0 = max(x0 - margin, 0), max(y0 - margin, 0)
+            ex1, ey1 = min(x1 + margin, self.frame_w), min(y1 + margin, self.frame_h)
+            tile = self.source.resize((ex1 - ex0, ey1 - ey0), Image.Resampling.LANCZOS,
+                                      box=self._source_box(ex0, ey0, ex1, ey1))
+            if self.blur_radius > 0:
+                tile = tile.filter(ImageFilter.GaussianBlur(radius=self.blur_radius))
+            tile = tile.crop((x0 - ex0, y0 - ey0, x0 - ex0 + size[0], y0 - ey0 + size[1]))
+        if tile.mode != 'RGBA':
+            tile = tile.convert('RGBA')
+        return np.asarray(tile)
+
+
+class TextSprite(NamedTuple):
+    """預先繪製好的文字圖：像素、相對於繪製原點的偏移，以及字形外框的寬高 (用於排版)。"""
+    pixels: np.ndarray
+    offset: tuple[int, int]
+    size: tuple[int, int]
+
+
+def load_font(font_path, font_size: int, face_index: int = 0):
+    """載入指定字體；沒有指定或載入失敗時使用 Pillow 的預設字體。"""
+    try:
+        if font_path:
+            return ImageFont.truetype(font_path, font_size, index=face_index)
+        return ImageFont.load_default(font_size)
+    except IOError:
+        return ImageFont.load_default(font_size)
+
+
+def text_sprite(text: str, font, color) -> TextSprite:
+    """
+    將文字繪製成一張剛好包住字形的 RGBA 小圖。
+    偏移與 ImageDraw.text 的字形位置一致。
+    """
+    left, top, right, bottom = font.getbbox(text)
+    coverage = Image.new('L', (max(1, right - left), max(1, bottom - top)), 0)
+    ImageDraw.Draw(coverage).text((-left, -top), text, font=font, fill=255)
+    rgba = ImageColor.getrgb(color) if isinstance(color, str) else tuple(color)
+    sprite = np.zeros((coverage.height, coverage.width, 4), dtype=np.uint8)
+    sprite[..., :3] = rgba[:3]
+    alpha = rgba[3] if len(rgba) > 3 else 255
+    sprite[..., 3] = (np.asarray(coverage).astype(np.uint16) * alpha + 127) // 255
+    return TextSprite(sprite, (left, top), (right - left, bottom - top))
+
+
+def cached_text_sprite(text: str, font_path, font_size: int, color, face_index: int = 0) -> TextSprite:
+    """
+    以 (文字, 字體, 字級, 顏色) 為鍵取得文字圖。
+    同一批次中重複的浮水印 (自訂文字、同一機身與鏡頭的 EXIF) 只需光柵化一次，
+    命中時連字體檔都不必再載入。快取的陣列被設為唯讀，由所有執行緒共用。
+    """
+    key = (text, font_path, face_index, font_size, color)
+    sprite = TEXT_SPRITE_CACHE.get(key)
+    if sprite is None:
+        sprite = text_sprite(text, load_font(font_path, font_size, face_index), color)
+        sprite.pixels.setflags(write=False)
+        TEXT_SPRITE_CACHE.put(key, sprite, sprite.pixels.nbytes)
+    return sprite
+
+
+class Compositor:
+    """
+    PIL 匯出渲染器的合成器。
+    建構時只計算佈局並準備小型資源 (陰影九宮格、模糊背景工作圖、Logo、文字)，
+    之後 `paint` 會將所有內容依序就地繪製到傳入的 Canvas 上。
+    繪製順序：相框陰影 → 相框背景 → 相片陰影 → 相片 → 浮水印。
+    """
+
+    def __init__(self, source: Image.Image, exif_data: dict, plan: RenderPlan, ledger: AllocationLedger = None,
+                 streaming: bool = False):
+        self.source = source
+        self.streaming = streaming
+        self.ledger = ledger or AllocationLedger()
+        self.plan = plan
+
+        # --- 1. 基於原始圖片尺寸計算佈局 ---
+        img_w, img_h = source.size
+        self.img_w, self.img_h = img_w, img_h
+        padding_top, padding_sides, padding_bottom = plan.paddings(img_w, img_h)
+
+        self.frame_enabled = plan.frame_enabled
+        frame_w = img_w + padding_sides * 2
+        frame_h = img_h + padding_top + padding_bottom
+        self.frame_w, self.frame_h = frame_w, frame_h
+
+        # 相框陰影需要在四周預留空間，所有元素都以 offset 平移到輸出座標
+        self.frame_shadow = plan.frame_shadow
+        offset = FRAME_SHADOW_PADDING if self.frame_shadow else 0
+        self.offset = offset
+        self.width = frame_w + offset * 2
+        self.height = frame_h + offset * 2
+
+        self.frame_box = (offset, offset, offset + frame_w, offset + frame_h)
+        self.frame_radius = plan.frame_radius_ratio * min(frame_w, frame_h) / 2
+        self.photo_pos = (offset + padding_sides, offset + padding_top)
+        self.photo_box = (self.photo_pos[0], self.photo_pos[1], self.photo_pos[0] + img_w, self.photo_pos[1] + img_h)
+        self.photo_radius = plan.photo_radius_ratio * min(img_w, img_h) / 2
+        self.frame_shape = RoundedRectPatch(frame_w, frame_h, self.frame_radius)
+        self.photo_shape = RoundedRectPatch(img_w, img_h, self.photo_radius)
+        # 相片內部一定會被相片本身覆蓋的區域，底下的背景與陰影都不必繪製
+        self.photo_hidden_box = inset_box(self.photo_box, int(math.ceil(self.photo_radius)) + 1)
+
+        # --- 2. 相框背景 ---
+        self.frame_style = plan.frame_style
+        self.frame_color = None
+        self.blur_background = None
+        if self.frame_enabled:
+            if self.frame_style == 'solid_color':
+                self.frame_color = plan.frame_color
+            elif self.frame_style == 'blur_extend':
+                blur_radius = plan.blur_radius
+                if plan.preview_photo_width > 0:
+                    blur_radius *= (img_w / plan.preview_photo_width)
+                self.blur_background = BlurBackground(source, frame_w, frame_h, blur_radius, self.ledger,
+                                                      STREAMING_BLUR_WORK_PIXELS if streaming else None)
+
+        # --- 3. 陰影九宮格 ---
+        self.frame_shadow_patch = None
+        if self.frame_shadow:
+            self.frame_shadow_patch = RoundedRectPatch(frame_w, frame_h, self.frame_radius, FRAME_SHADOW_PADDING,
+                                                       FRAME_SHADOW_BLUR, FRAME_SHADOW_ALPHA)
+            # 舊版以陰影自身作為遮罩貼到透明畫布上，實際透明度為 a * a / 255，這裡保持相同的外觀
+            mini = self.frame_shadow_patch.mini.astype(np.uint16)
+            self.frame_shadow_patch.mini = ((mini * mini + 127) // 255).astype(np.uint8)
+
+        self.photo_shadow_patch = None
+        if plan.photo_shadow:
+            self.photo_shadow_patch = RoundedRectPatch(img_w, img_h, self.photo_radius, PHOTO_SHADOW_PADDING,
+                                                       PHOTO_SHADOW_BLUR, PHOTO_SHADOW_ALPHA)
+            self.photo_shadow_origin = (
+                self.photo_pos[0] + PHOTO_SHADOW_OFFSET[0] - PHOTO_SHADOW_PADDING,
+                self.photo_pos[1] + PHOTO_SHADOW_OFFSET[1] - PHOTO_SHADOW_PADDING
+            )
+
+        # --- 4. 浮水印 ---
+        self.watermark_items = []
+        self._prepare_watermark(exif_data, padding_top, padding_bottom)
+
+    # --- 浮水印資源與佈局 (邏輯與舊版相同) ---
+
+    def _prepare_watermark(self, exif_data, padding_top, padding_bottom):
+        plan = self.plan
+        logo_enabled = plan.logo_enabled
+        text_enabled = plan.text_enabled
+        if not logo_enabled and not text_enabled:
+            return
+
+        img_w, img_h = self.img_w, self.img_h
+        photo_pos = self.photo_pos
+        offset = self.offset
+
+        # (A) Logo 資源：路徑已在計畫中解析，影像在整個批次中只解碼一次
+        logo_img = plan.logo_image(exif_data) if logo_enabled else None
+        logo_text = plan.logo_text if logo_enabled else ""
+
+        # (B) 文字
+        watermark_text = plan.watermark_text(exif_data) if text_enabled else ""
+
+        # (C) 字體與文字圖：相同的 (文字, 字體, 字級, 顏色) 在批次中只光柵化一次
+        font_size = plan.font_size(img_w, img_h)
+        font_color = plan.font_color
+        font_path = plan.font_path
+
+        # (D) 計算元素尺寸
+        text_sprite_data = None
+        text_w, text_h = 0, 0
+        if watermark_text:
+            text_sprite_data = cached_text_sprite(watermark_text, font_path, font_size, font_color,
+                                                  plan.font_face_index)
+            text_w, text_h = text_sprite_data.size
+        logo_w, logo_h = 0, 0
+        logo_sprite_data = None
+        if logo_img:
+            logo_h_scaled = plan.logo_height(img_h)
+            if logo_h_scaled > 0:
+                logo_size = (int(logo_img.width * (logo_h_scaled / logo_img.height)), logo_h_scaled)
+                logo_w, logo_h = logo_size
+                if self.streaming:
+                    logo_sprite_data = (ResizedSprite(logo_img, logo_size), (0, 0))
+                else:
+                    logo_sprite_data = (np.asarray(logo_img.resize(logo_size, Image.Resampling.LANCZOS)), (0, 0))
+        elif logo_text:
+            logo_sprite_data = cached_text_sprite(logo_text, font_path, int(font_size * 1.2), font_color,
+                                                  plan.font_face_index)
+            logo_w, logo_h = logo_sprite_data.size
+        gap = int(font_size * 0.3)
+
+        # (E) 計算整體佈局與位置
+        layout = plan.layout
+        has_both = (logo_w > 0 and logo_h > 0) and (text_w > 0 and text_h > 0)
+        if layout in ['logo_top', 'logo_bottom']:
+            total_w = max(logo_w, text_w)
+            total_h = (logo_h + text_h + gap) if has_both else (logo_h or text_h)
+        else:
+            total_w = (logo_w + text_w + gap) if has_both else (logo_w or text_w)
+            total_h = max(logo_h, text_h)
+        area = plan.area
+        target_rect = (photo_pos[0], photo_pos[1], img_w, img_h) if area == 'in_photo' else \
+            (offset, offset, self.frame_w, self.frame_h)
+        padding = int(font_size * 0.5)
+        align = plan.align
+        x, y = 0, 0
+        if 'left' in align:
+            x = target_rect[0] + padding
+        elif 'center' in align:
+            x = target_rect[0] + (target_rect[2] - total_w) / 2
+        elif 'right' in align:
+            x = target_rect[0] + target_rect[2] - total_w - padding
+        if area == 'in_photo':
+            if 'top' in align:
+                y = target_rect[1] + padding
+            elif 'middle' in align:
+                y = target_rect[1] + (target_rect[3] - total_h) / 2
+            elif 'bottom' in align:
+                y = target_rect[1] + target_rect[3] - total_h - padding
+        else:
+            if 'top' in align:
+                y = offset + (padding_top - total_h) / 2
+            elif 'bottom' in align:
+                y = photo_pos[1] + img_h + (padding_bottom - total_h) / 2
+            else:
+                y = target_rect[1] + (target_rect[3] - total_h) / 2
+
+        # (F) 計算內部相對位置
+        if layout in ['logo_top', 'logo_bottom']:
+            if 'left' in align:
+                logo_x_rel, text_x_rel = 0, 0
+            elif 'right' in align:
+                logo_x_rel, text_x_rel = total_w - logo_w, total_w - text_w
+            else:
+                logo_x_rel, text_x_rel = (total_w - logo_w) / 2, (total_w - text_w) / 2
+            if layout == 'logo_top':
+                logo_y_rel, text_y_rel = 0, logo_h + gap
+            else:
+                text_y_rel, logo_y_rel = 0, text_h + gap
+        else:
+            logo_y_rel, text_y_rel = (total_h - logo_h) / 2, (total_h - text_h) / 2
+            if layout == 'logo_right':
+                text_x_rel, logo_x_rel = 0, text_w + gap
+            else:
+                logo_x_rel, text_x_rel = 0, logo_w + gap
+        final_logo_pos = (int(x + logo_x_rel), int(y + logo_y_rel))
+        final_text_pos = (int(x + text_x_rel), int(y + text_y_rel))
+
+        if logo_enabled and logo_sprite_data:
+            pixels, (dx, dy) = logo_sprite_data[:2]
+            self.watermark_items.append(((final_logo_pos[0] + dx, final_logo_pos[1] + dy), pixels))
+        if text_enabled and text_sprite_data:
+            pixels, (dx, dy), _ = text_sprite_data
+            self.watermark_items.append(((final_text_pos[0] + dx, final_text_pos[1] + dy), pixels))
+
+    # --- 繪製 ---
+
+    def paint(self, canvas: Canvas):
+        """將所有內容繪製到 canvas 上；canvas 可以是完整輸出或其中一個水平帶。"""
+        self._paint_frame_shadow(canvas)
+        self._paint_frame(canvas)
+        self._paint_photo_shadow(canvas)
+        self._paint_photo(canvas)
+        for pos, pixels in self.watermark_items:
+            # 舊版浮水印繪製在相框大小的內部畫布上，因此同樣裁切在相框範圍內
+            canvas.over_image(pos, pixels, clip_box=self.frame_box)
+
+    def _frame_is_opaque(self) -> bool:
+        if self.blur_background is not None:
+            return True
+        return self.frame_color is not None and (len(self.frame_color) < 4 or self.frame_color[3] == 255)
+
+    def _paint_frame_shadow(self, canvas: Canvas):
+        if not self.frame_shadow_patch:
+            return
+        regions = [(0, 0, self.width, self.height)]
+        # 不透明相框會完全蓋住其內部的陰影，只需繪製邊緣一圈
+        hidden = inset_box(self.frame_box, int(math.ceil(self.frame_radius)) + 1) if self._frame_is_opaque() else None
+        if hidden:
+            regions = subtract_box(regions[0], hidden)
+        for region in regions:
+            for box in canvas.chunks(region):
+                # 畫布在此之前完全透明，陰影 (黑色) 只需直接寫入 alpha 通道
+                canvas.view(box)[..., 3] = self.frame_shadow_patch.alpha(*box)
+
+    def _paint_frame(self, canvas: Canvas):
+        if not self.frame_enabled or (self.frame_color is None and self.blur_background is None):
+            return
+        regions = [self.frame_box]
+        if self.photo_hidden_box:
+            regions = subtract_box(self.frame_box, self.photo_hidden_box)
+        opaque = self._frame_is_opaque()
+        for region in regions:
+            for box in canvas.chunks(region):
+                local = (box[0] - self.offset, box[1] - self.offset, box[2] - self.offset, box[3] - self.offset)
+                mask = self.frame_shape.mask(*local)
+                if self.blur_background is not None:
+                    pixels = self.blur_background.region(*local)
+                    self.ledger.touch(pixels.nbytes * 2)
+                    canvas.put(box, pixels, mask)
+                elif opaque:
+                    canvas.put(box, np.array(self.frame_color[:3] + (255,), dtype=np.uint8), mask)
+                else:
+                    h, w = box[3] - box[1], box[2] - box[0]
+                    alpha = np.full((h, w), self.frame_color[3], dtype=np.uint8)
+                    if mask is not None:
+                        alpha[~mask] = 0
+                    canvas.over(box, self.frame_color[:3], alpha)
+
+    def _paint_photo_shadow(self, canvas: Canvas):
+        if not self.photo_shadow_patch:
+            return
+        sx, sy = self.photo_shadow_origin
+        patch = self.photo_shadow_patch
+        shadow_box = (sx, sy, sx + patch.width, sy + patch.height)
+        # 舊版陰影貼在相框大小的內部畫布上，超出相框的部分會被裁掉
+        shadow_box = (max(shadow_box[0], self.frame_box[0]), max(shadow_box[1], self.frame_box[1]),
+                      min(shadow_box[2], self.frame_box[2]), min(shadow_box[3], self.frame_box[3]))
+        regions = [shadow_box]
+        if self.photo_hidden_box:
+            regions = subtract_box(shadow_box, self.photo_hidden_box)
+        for region in regions:
+            for box in canvas.chunks(region):
+                alpha = patch.alpha(box[0] - sx, box[1] - sy, box[2] - sx, box[3] - sy)
+                canvas.over(box, (0, 0, 0), alpha)
+
+    def _paint_photo(self, canvas: Canvas):
+        px, py = self.photo_pos
+        for box in canvas.chunks(self.photo_box):
+            local = (box[0] - px, box[1] - py, box[2] - px, box[3] - py)
+            rows = self.source.crop(local)
+            if rows.mode != 'RGBA':
+                rows = rows.convert('RGBA')
+            pixels = np.asarray(rows)
+            self.ledger.touch(pixels.nbytes * 3)
+            canvas.put(box, pixels, self.photo_shape.mask(*local))
+
+
+def source_name(image_path) -> str:
+    """訊息中使用的來源名稱：檔案路徑取檔名，記憶體中的來源 (檔案物件) 以 <memory> 表示。"""
+    if isinstance(image_path, (str, os.PathLike)):
+        return os.path.basename(image_path)
+    return '<memory>'
+
+
+def load_source_image(image_path) -> Image.Image:
+    """
+    載入來源圖片並只解碼一次。image_path 也可以是已開啟的二進位檔案物件 (例如 io.BytesIO)。
+    單幀圖片在 load() 之後會自動關閉檔案，因此不需要再 copy() 一份。
+    """
+    try:
+        img = Image.open(image_path)
+        img.load()
+    except Exception as e:
+        raise RuntimeError(f"無法使用 Pillow 載入圖片 {source_name(image_path)}: {e}")
+    if img.mode not in ('RGB', 'RGBA'):
+        img = img.convert('RGBA')
+    return img
+
+
+def render_with_pil(image_path, exif_data: dict, plan: RenderPlan) -> Image.Image:
+    """
+    使用 Pillow 離屏渲染單張圖片。
+    所有內容都直接繪製到一塊預先配置的 RGBA 輸出緩衝區中；
+    返回的影像與該緩衝區共用記憶體，並在 info['peak_alloc_bytes'] 中記錄本次渲染的峰值配置量。
+    """
+    ledger = AllocationLedger()
+    source = load_source_image(image_path)
+    ledger.alloc(image_nbytes(source))
+
+    compositor = Compositor(source, exif_data, plan, ledger)
+    buffer = np.zeros((compositor.height, compositor.width, 4), dtype=np.uint8)
+    ledger.alloc(buffer.nbytes)
+    compositor.paint(Canvas(buffer, ledger=ledger))
+
+    output = Image.fromarray(buffer)
+    output.info['peak_alloc_bytes'] = ledger.peak
+    print(f"[PIL 渲染] {source_name(image_path)}: 峰值配置約 {ledger.peak / 1024 ** 2:.1f} MB "
+          f"(輸出緩衝 {buffer.nbytes / 1024 ** 2:.1f} MB)")
+    return output
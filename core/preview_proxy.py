@@ -0,0 +1,295 @@
+# core/preview_proxy.py
+import os
+import threading
+from dataclasses import dataclass
+
+from PIL import Image, ImageFilter
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+from core.lru_cache import ByteLRUCache
+from core.qt_bridge import qimage_from_pil
+
+# 縮圖時先以整數倍縮小解碼 (JPEG 在 DCT 階段直接縮小)，
+# 保留至少目標尺寸的這個倍數再以 LANCZOS 精細縮放，兼顧速度與畫質
+PROXY_REDUCING_GAP = 2.0
+# 背景解碼預覽代理圖的執行緒數：一個給目前的圖片，另一個預先載入相鄰的圖片
+PREVIEW_LOADER_THREADS = 2
+# 檢視第 N 張圖片時預先載入的相鄰圖片 (依優先順序)
+PREVIEW_PREFETCH_OFFSETS = (1, -1, 2, -2)
+# 設定檔中預覽快取 (代理圖、模糊背景與縮放後的照片) 的記憶體上限 (MB)
+PREVIEW_CACHE_SETTINGS_KEY = "preview_cache_mb"
+DEFAULT_PREVIEW_CACHE_MB = 256
+# 模糊背景的尺寸以此像素數為級距向上取整：連續調整視窗或分隔線大小時，
+# 同一級距內沿用稍大一點的快取背景 (以畫刷變換縮放到相框大小)，不必每個像素寬度都重新計算
+BLUR_SIZE_BUCKET = 32
+# 模糊半徑的級距 (像素)；拖動滑桿時相鄰的數值共用同一張背景
+BLUR_RADIUS_STEP = 2
+# 背景模糊完成前先顯示的近似背景：長邊縮到這個像素數計算，再放大顯示
+BLUR_APPROX_MAX_SIDE = 96
+# 照片縮放用的 mip 鏈：每一層為上一層長寬減半，短邊小於此像素數時不再往下建立
+MIP_MIN_SIDE = 64
+
+
+def file_identity(path: str):
+    """檔案的識別：(路徑, 大小, 修改時間)；檔案被改寫後快取不會再命中舊的內容。無法讀取時返回 None。"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return path, stat.st_size, stat.st_mtime_ns
+
+
+@dataclass
+class PreviewProxy:
+    """
+    預覽用的代理圖：只解碼一次、縮小到足以填滿預覽區域的尺寸。
+    照片畫刷與模糊背景都由這張代理圖產生，不需要保留原圖的完整像素。
+    """
+    path: str
+    full_size: tuple[int, int]  # 原圖尺寸，用於計算版面比例
+    image: Image.Image  # 縮小後的 RGB / RGBA 影像
+    identity: tuple = None  # 解碼時的 file_identity，作為快取鍵
+    qimage: object = None  # 在背景執行緒中由 image 建立的 QImage，介面執行緒只需轉為 QPixmap
+    pixmap: object = None  # 第一次顯示時由 qimage 轉換而來 (之後釋放 qimage)
+
+    @property
+    def nbytes(self) -> int:
+        # Pillow 影像 (每像素 4 位元組) 加上一份 Qt 影像 (QImage 或 QPixmap)
+        return self.image.width * self.image.height * 4 * 2
+
+    @property
+    def is_full_resolution(self) -> bool:
+        return self.image.size == self.full_size
+
+    def covers(self, width: int, height: int) -> bool:
+        """以 width x height (裝置像素) 的區域等比例顯示原圖時，代理圖的解析度是否足夠 (不需要放大)。"""
+        if self.is_full_resolution:
+            return True
+        full_w, full_h = self.full_size
+        scale = min(width / full_w, height / full_h)
+        # 縮圖時的四捨五入可能少一個像素，不應因此反覆重新解碼
+        return self.image.width >= int(full_w * scale) - 1 and self.image.height >= int(full_h * scale) - 1
+
+
+def mip_level(source_w: int, source_h: int, target_w: int, target_h: int) -> int:
+    """
+    縮放到 target_w x target_h 時應使用的 mip 層級：長寬都仍不小於目標的最小一層 (0 為代理圖本身)。
+    從只比目標大一點的層級平滑縮放，比每次都從代理圖縮放快得多，畫質也相同。
+    """
+    level = 0
+    while True:
+        next_w, next_h = source_w >> (level + 1), source_h >> (level + 1)
+        if next_w < target_w or next_h < target_h or min(next_w, next_h) < MIP_MIN_SIDE:
+            return level
+        level += 1
+
+
+def blur_bucket_size(width: int, height: int) -> tuple[int, int]:
+    """相框尺寸向上取整到 BLUR_SIZE_BUCKET 的倍數。"""
+    return (-(-width // BLUR_SIZE_BUCKET) * BLUR_SIZE_BUCKET,
+            -(-height // BLUR_SIZE_BUCKET) * BLUR_SIZE_BUCKET)
+
+
+def quantize_blur_radius(radius: int) -> int:
+    """模糊半徑取最接近的 BLUR_RADIUS_STEP 倍數；0 (不模糊) 保持不變，其餘至少為一個級距。"""
+    if radius <= 0:
+        return 0
+    return max(BLUR_RADIUS_STEP, int(radius / BLUR_RADIUS_STEP + 0.5) * BLUR_RADIUS_STEP)
+
+
+def render_blur_background(image: Image.Image, width: int, height: int, radius: int):
+    """
+    以等比例縮放「覆蓋」width x height 後從中心裁切，再套用高斯模糊，返回 QImage。
+    只依賴傳入的影像，可以在背景執行緒中呼叫。
+    """
+    img_w, img_h = image.size
+    # 1. 計算統一的縮放比例，以「覆蓋」目標區域，再等比例縮放
+    scale = max(width / img_w, height / img_h)
+    new_w, new_h = int(img_w * scale), int(img_h * scale)
+    resized = image.resize((new_w, new_h), Image.Resampling.LANCZOS)
+    # 2. 從中心裁切到目標尺寸
+    left, top = (new_w - width) / 2, (new_h - height) / 2
+    cropped = resized.crop((left, top, left + width, top + height))
+    # 3. 僅在 radius > 0 時應用模糊，半徑為 0 時使用清晰的裁切後圖像
+    blurred = cropped.filter(ImageFilter.GaussianBlur(radius=radius)) if radius > 0 else cropped
+    # 直接以 Pillow 的像素建立 QImage (只複製一次)，快取中每個背景只保留這一份
+    return qimage_from_pil(blurred)
+
+
+def render_blur_approximation(image: Image.Image, width: int, height: int, radius: int):
+    """
+    快速的近似背景：在長邊 BLUR_APPROX_MAX_SIDE 像素的縮圖上以等比例縮小的半徑模糊，
+    返回小尺寸的 QImage，由呼叫端以畫刷變換放大到相框大小。只需幾毫秒，可以直接在主執行緒中呼叫。
+    """
+    scale = min(1.0, BLUR_APPROX_MAX_SIDE / max(width, height))
+    return render_blur_background(image, max(1, round(width * scale)), max(1, round(height * scale)),
+                                  radius * scale)
+
+
+def load_preview_proxy(path: str, width: int, height: int) -> PreviewProxy:
+    """
+    解碼一張剛好能以 width x height (裝置像素) 顯示的代理圖。
+    JPEG 會以縮小解碼 (draft) 只解出需要的解析度，比完整解碼後再縮小快得多，記憶體也只需一小部分。
+    """
+    identity = file_identity(path)
+    with Image.open(path) as img:
+        full_size = img.size
+        # thumbnail 會先以 draft 縮小解碼，再以 LANCZOS 縮到目標尺寸內 (比目標小的圖片保持原尺寸)
+        img.thumbnail((max(1, width), max(1, height)), Image.Resampling.LANCZOS, reducing_gap=PROXY_REDUCING_GAP)
+        if img.mode in ('RGB', 'RGBA'):
+            img.load()
+            image = img
+        else:
+            image = img.convert('RGBA' if img.has_transparency_data else 'RGB')
+    return PreviewProxy(path, full_size, image, identity)
+
+
+class PreviewSignals(QObject):
+    loaded = pyqtSignal(str, object)  # 路徑, PreviewProxy
+    failed = pyqtSignal(str, str)  # 路徑, 錯誤訊息
+    skipped = pyqtSignal(str)  # 開始執行前已不再需要的路徑
+
+
+class PreviewLoadTask(QRunnable):
+    """在背景執行緒中解碼一張代理圖，並預先建立 QImage。"""
+
+    def __init__(self, path: str, width: int, height: int, signals: PreviewSignals, is_wanted):
+        super().__init__()
+        self.path = path
+        self.width = width
+        self.height = height
+        self.signals = signals
+        self.is_wanted = is_wanted
+
+    def run(self):
+        # 使用者快速切換圖片時，排隊中的任務可能已經離開預先載入的範圍
+        if not self.is_wanted(self.path):
+            self.signals.skipped.emit(self.path)
+            return
+        try:
+            proxy = load_preview_proxy(self.path, self.width, self.height)
+            proxy.qimage = qimage_from_pil(proxy.image)
+            self.signals.loaded.emit(self.path, proxy)
+        except Exception as e:
+            self.signals.failed.emit(self.path, str(e))
+
+
+class PreviewLoader(QObject):
+    """
+    預覽代理圖的背景載入器，在主執行緒中使用。
+    呼叫端以 set_window 告知目前選取的圖片與要預先載入的相鄰圖片，範圍外排隊中的任務會被略過；
+    載入完成的代理圖以檔案識別為鍵放入共用的 ByteLRUCache，回頭看剛看過的圖片時不需要重新解碼。
+    載入完成後發出 loaded 信號。
+    """
+    loaded = pyqtSignal(str, object)  # 路徑, PreviewProxy
+    failed = pyqtSignal(str, str)  # 路徑, 錯誤訊息
+
+    def __init__(self, cache: ByteLRUCache, parent=None):
+        super().__init__(parent)
+        self.cache = cache
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(PREVIEW_LOADER_THREADS)
+        self.signals = PreviewSignals()
+        self.signals.loaded.connect(self._on_loaded)
+        self.signals.failed.connect(self._on_failed)
+        self.signals.skipped.connect(self._on_skipped)
+        self._in_flight = {}  # 路徑 -> 請求的 (寬, 高)；只在主執行緒中存取
+        self._wanted = set()  # 背景執行緒也會讀取，以鎖保護
+        self._wanted_lock = threading.Lock()
+
+    def set_window(self, paths):
+        """設定目前需要的圖片 (選取的圖片與相鄰的圖片)，範圍外排隊中的任務會被略過。"""
+        with self._wanted_lock:
+            self._wanted = set(paths)
+
+    def get(self, path: str, width: int, height: int):
+        """返回已載入且解析度足以用 width x height 顯示的代理圖；否則返回 None。"""
+        identity = file_identity(path)
+        proxy = self.cache.get(('proxy', identity)) if identity else None
+        if proxy is not None and proxy.covers(width, height):
+            return proxy
+        return None
+
+    def request(self, path: str, width: int, height: int, priority: int = 0):
+        """在背景載入代理圖；已有足夠的代理圖或相同的請求正在進行時不會重複解碼。"""
+        if self.get(path, width, height) is not None:
+            return
+        in_flight = self._in_flight.get(path)
+        if in_flight and in_flight[0] >= width and in_flight[1] >= height:
+            return
+        self._in_flight[path] = (width, height)
+        self.pool.start(PreviewLoadTask(path, width, height, self.signals, self._is_wanted), priority)
+
+    def _is_wanted(self, path: str) -> bool:
+        with self._wanted_lock:
+            return path in self._wanted
+
+    def _on_loaded(self, path: str, proxy: PreviewProxy):
+        self._in_flight.pop(path, None)
+        key = ('proxy', proxy.identity)
+        existing = self.cache.get(key)
+        # 較早發出的小尺寸請求可能較晚完成，不覆蓋已有的高解析度代理圖
+        if existing is None or proxy.image.width >= existing.image.width:
+            self.cache.put(key, proxy, proxy.nbytes)
+        self.loaded.emit(path, proxy)
+
+    def _on_failed(self, path: str, error: str):
+        self._in_flight.pop(path, None)
+        print(f"無法載入預覽圖片 {path}: {error}")
+        self.failed.emit(path, error)
+
+    def _on_skipped(self, path: str):
+        self._in_flight.pop(path, None)
+
+
+class BlurSignals(QObject):
+    finished = pyqtSignal(object, object)  # 快取鍵, QImage
+
+
+class BlurTask(QRunnable):
+    """在背景執行緒中計算一張模糊背景。"""
+
+    def __init__(self, key, image: Image.Image, width: int, height: int, radius: int, signals: BlurSignals):
+        super().__init__()
+        self.key = key
+        self.image = image
+        self.width = width
+        self.height = height
+        self.radius = radius
+        self.signals = signals
+
+    def run(self):
+        try:
+            self.signals.finished.emit(self.key, render_blur_background(self.image, self.width, self.height,
+                                                                        self.radius))
+        except Exception as e:
+            print(f"無法計算模糊背景: {e}")
+
+
+class BlurWorker(QObject):
+    """
+    模糊背景的背景計算器，在主執行緒中使用。
+    同一時間只保留最新的一個請求：新的請求會把排隊中、尚未開始的舊請求移除，
+    已經開始計算的請求仍會完成 (結果依然可以放入快取)。
+    """
+    finished = pyqtSignal(object, object)  # 快取鍵, QImage
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        self.signals = BlurSignals()
+        self.signals.finished.connect(self._on_finished)
+        self._requested_key = None
+
+    def request(self, key, image: Image.Image, width: int, height: int, radius: int):
+        if key == self._requested_key:
+            return  # 相同的背景已在計算中
+        self.pool.clear()
+        self._requested_key = key
+        self.pool.start(BlurTask(key, image, width, height, radius, self.signals))
+
+    def _on_finished(self, key, image):
+        if key == self._requested_key:
+            self._requested_key = None
+        self.finished.emit(key, image)
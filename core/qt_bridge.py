@@ -0,0 +1,51 @@
+# core/qt_bridge.py
+import numpy as np
+from PIL import Image
+from PyQt6.QtGui import QImage
+
+
+def qimage_from_array(pixels: np.ndarray) -> QImage:
+    """
+    將 (高, 寬, 4) 的 RGBA uint8 陣列包裝成 QImage (不複製)。
+    QImage 不持有陣列，呼叫端必須在 QImage 使用期間保留陣列的引用。
+    """
+    pixels = np.ascontiguousarray(pixels)
+    h, w = pixels.shape[:2]
+    return QImage(pixels.data, w, h, pixels.strides[0], QImage.Format.Format_RGBA8888)
+
+
+def pil_view_of_qimage(image: QImage) -> Image.Image:
+    """
+    以 Pillow 影像的形式共用 RGBA8888 QImage 的像素記憶體 (不複製)。
+    返回的影像為唯讀，且只能在 QImage 存活期間使用。
+    """
+    bits = image.constBits()
+    bits.setsize(image.sizeInBytes())
+    return Image.frombuffer('RGBA', (image.width(), image.height()), bits, 'raw', 'RGBA', image.bytesPerLine(), 1)
+
+
+def encodable_view(image: QImage) -> Image.Image:
+    """
+    將渲染結果交給 Pillow 編碼器：原地轉為非預乘的 RGBA8888
+    (與 ARGB32_Premultiplied 位元深度相同，沒有其他引用時 Qt 不會重新配置)，
+    再以零複製的 Pillow 影像共用其像素。
+    注意：會改變傳入 QImage 的格式，呼叫端之後不應再把它當作原格式使用。
+    """
+    if image.format() != QImage.Format.Format_RGBA8888:
+        image.convertTo(QImage.Format.Format_RGBA8888)
+    return pil_view_of_qimage(image)
+
+
+def qimage_from_pil(image: Image.Image) -> QImage:
+    """
+    以 Pillow 影像的像素建立 QImage，整個過程只複製一次。
+    Pillow 內部的 RGB 以每像素 4 位元組儲存，以 RGBX 原樣匯出即可對應 Format_RGBX8888，不需重新排列；
+    PyQt 會保留傳入的 bytes 物件的引用，因此返回的 QImage 可以獨立使用，不必另外保留 Pillow 影像。
+    """
+    if image.mode == 'RGBA':
+        data, fmt = image.tobytes(), QImage.Format.Format_RGBA8888
+    else:
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        data, fmt = image.tobytes('raw', 'RGBX'), QImage.Format.Format_RGBX8888
+    return QImage(data, image.width, image.height, image.width * 4, fmt)
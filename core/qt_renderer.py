@@ -0,0 +1,243 @@
+# core/qt_renderer.py
+import os
+
+import numpy as np
+from PyQt6.QtCore import Qt, QPointF, QRectF
+from PyQt6.QtGui import QBrush, QColor, QFont, QFontMetrics, QImage, QImageReader, QPainter, QPainterPath, QTransform
+
+from core.pil_renderer import BlurBackground, PHOTO_SHADOW_ALPHA, PHOTO_SHADOW_BLUR, PHOTO_SHADOW_OFFSET, \
+    PHOTO_SHADOW_PADDING, RoundedRectPatch
+from core.qt_bridge import pil_view_of_qimage, qimage_from_array
+from core.render_plan import RenderPlan
+
+
+def supports_plan(plan: RenderPlan) -> bool:
+    """
+    此渲染器能否產生與 PIL 渲染器相同的輸出。
+    相框陰影會讓 PIL 的輸出向外擴大一圈，此渲染器沒有實作，使用時必須改用 PIL 渲染器。
+    """
+    return not plan.frame_shadow
+
+
+def load_source_qimage(image_path: str) -> QImage:
+    """以 QImageReader 解碼來源圖片 (QImage 可在任何執行緒使用，QPixmap 不行)。"""
+    reader = QImageReader(image_path)
+    image = reader.read()
+    if image.isNull():
+        raise RuntimeError(f"無法使用 Qt 載入圖片 {os.path.basename(image_path)}: {reader.errorString()}")
+    return image
+
+
+def draw_nine_patch(painter: QPainter, patch: RoundedRectPatch, x: float, y: float):
+    """
+    將 RoundedRectPatch 的小圖以九宮格方式繪製到 (x, y)：四個角落原樣繪製，
+    中段的一像素列 / 欄拉伸到整段直邊，不必建立整張陰影大小的影像。
+    """
+    mini = QImage(patch.mini.data, patch.mini_w, patch.mini_h, patch.mini.strides[0], QImage.Format.Format_Alpha8)
+
+    def spans(full, mini_len, core):
+        if core is None:
+            return [(0, full, 0, mini_len)]
+        return [(0, core, 0, core), (core, full - core * 2, core, 1), (full - core, core, core + 1, core)]
+
+    for dx, dw, sx, sw in spans(patch.width, patch.mini_w, patch.core_x):
+        for dy, dh, sy, sh in spans(patch.height, patch.mini_h, patch.core_y):
+            if dw > 0 and dh > 0:
+                painter.drawImage(QRectF(x + dx, y + dy, dw, dh), mini, QRectF(sx, sy, sw, sh))
+
+
+def render_with_qt(image_path: str, exif_data: dict, plan: RenderPlan) -> QImage:
+    """
+    使用 QPainter 直接在 QImage (ARGB32_Premultiplied) 上離屏渲染單張圖片。
+    相片陰影與 PIL 渲染器使用相同的參數；不繪製相框陰影 (見 supports_plan)。
+    不使用 QPixmap、QGraphicsScene 或圖形特效，因此可以同時在多個工作執行緒中執行；
+    來源圖片只解碼一次，模糊背景也直接共用同一份解碼後的像素。
+    """
+    source = load_source_qimage(image_path)
+    img_w, img_h = source.width(), source.height()
+
+    # --- 1. 基於原始圖片尺寸計算佈局 ---
+    padding_top, padding_sides, padding_bottom = plan.paddings(img_w, img_h)
+    frame_w = img_w + padding_sides * 2
+    frame_h = img_h + padding_top + padding_bottom
+    frame_rect = QRectF(0, 0, frame_w, frame_h)
+    photo_rect = QRectF(padding_sides, padding_top, img_w, img_h)
+
+    output = QImage(frame_w, frame_h, QImage.Format.Format_ARGB32_Premultiplied)
+    output.fill(Qt.GlobalColor.transparent)
+    painter = QPainter(output)
+    try:
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing, True)
+        painter.setRenderHint(QPainter.RenderHint.TextAntialiasing, True)
+        painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform, True)
+        painter.setPen(Qt.PenStyle.NoPen)
+
+        # (A) 相框
+        if plan.frame_enabled:
+            frame_radius = plan.frame_radius_ratio * min(frame_w, frame_h) / 2
+            frame_path = QPainterPath()
+            frame_path.addRoundedRect(frame_rect, frame_radius, frame_radius)
+            if plan.frame_style == 'solid_color':
+                painter.fillPath(frame_path, QColor(*plan.frame_color))
+            elif plan.frame_style == 'blur_extend':
+                # 模糊背景需要以 Pillow 處理：原地轉為 RGBA8888 (位元深度相同，不重新配置) 後直接共用像素
+                source.convertTo(QImage.Format.Format_RGBA8888)
+                blur_radius = plan.blur_radius
+                if plan.preview_photo_width > 0:
+                    blur_radius *= (img_w / plan.preview_photo_width)
+                background = BlurBackground(pil_view_of_qimage(source), frame_w, frame_h, blur_radius)
+                if background.small is not None:
+                    # 降採樣後的模糊圖直接作為紋理，由畫刷變換放大，不建立相框大小的中間影像
+                    texture = background.small.convert('RGBA') if background.small.mode != 'RGBA' else background.small
+                    pixels = np.asarray(texture)
+                    brush = QBrush(qimage_from_array(pixels))
+                    brush.setTransform(QTransform.fromScale(frame_w / texture.width, frame_h / texture.height))
+                else:
+                    pixels = background.region(0, 0, frame_w, frame_h)
+                    brush = QBrush(qimage_from_array(pixels))
+                painter.fillPath(frame_path, brush)
+                del pixels
+
+        # (B) 相片陰影與相片 (帶圓角)
+        photo_radius = plan.photo_radius_ratio * min(img_w, img_h) / 2
+        if plan.photo_shadow:
+            patch = RoundedRectPatch(img_w, img_h, photo_radius, PHOTO_SHADOW_PADDING,
+                                     PHOTO_SHADOW_BLUR, PHOTO_SHADOW_ALPHA)
+            # 拉伸的中段只有一像素寬，不需要平滑取樣
+            painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform, False)
+            draw_nine_patch(painter, patch,
+                            photo_rect.left() + PHOTO_SHADOW_OFFSET[0] - PHOTO_SHADOW_PADDING,
+                            photo_rect.top() + PHOTO_SHADOW_OFFSET[1] - PHOTO_SHADOW_PADDING)
+            painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform, True)
+
+        photo_path = QPainterPath()
+        photo_path.addRoundedRect(0, 0, img_w, img_h, photo_radius, photo_radius)
+        painter.save()
+        painter.translate(photo_rect.topLeft())
+        painter.fillPath(photo_path, QBrush(source))
+        painter.restore()
+
+        # (C) 浮水印
+        _paint_watermark(painter, plan, exif_data, frame_rect, photo_rect)
+    finally:
+        painter.end()
+
+    print(f"[Qt 渲染] {os.path.basename(image_path)}: {frame_w}x{frame_h}")
+    return output
+
+
+def _paint_watermark(painter: QPainter, plan: RenderPlan, exif_data: dict, frame_rect: QRectF, photo_rect: QRectF):
+    """浮水印的排版與繪製 (邏輯與預覽的 _update_watermark 相同)。"""
+    logo_enabled = plan.logo_enabled
+    text_enabled = plan.text_enabled
+    if not logo_enabled and not text_enabled:
+        return
+
+    # (A) Logo：影像在整個批次中只解碼一次，這裡只做縮放
+    logo_image = None
+    logo_text = plan.logo_text if logo_enabled else ""
+    logo_pil = plan.logo_image(exif_data) if logo_enabled else None
+    if logo_pil is not None:
+        logo_h_scaled = plan.logo_height(int(photo_rect.height()))
+        if logo_h_scaled > 0:
+            logo_pixels = np.asarray(logo_pil)
+            logo_image = qimage_from_array(logo_pixels).scaledToHeight(
+                logo_h_scaled, Qt.TransformationMode.SmoothTransformation)
+
+    watermark_text = plan.watermark_text(exif_data) if text_enabled else ""
+
+    # (B) 字體：以預覽上的字體大小按比例放大，使導出與預覽的視覺大小一致
+    font_size = plan.preview_scaled_font_size(int(photo_rect.width()))
+    font_color = QColor(plan.font_color)
+    font_family_name = plan.font_family_name or "Arial"
+    watermark_font = QFont(font_family_name, max(1, font_size))
+    logo_font = QFont(font_family_name, max(1, int(font_size * 1.2)))
+
+    fm = QFontMetrics(watermark_font)
+    text_rect = fm.boundingRect(watermark_text)
+    logo_fm = QFontMetrics(logo_font)
+    logo_text_rect = logo_fm.boundingRect(logo_text)
+
+    gap = int(font_size * 0.3)
+    logo_w = logo_image.width() if logo_image is not None else logo_text_rect.width()
+    logo_h = logo_image.height() if logo_image is not None else logo_text_rect.height()
+    text_w = text_rect.width()
+    text_h = text_rect.height()
+
+    layout = plan.layout
+    if layout in ['logo_top', 'logo_bottom']:
+        total_w = max(logo_w, text_w)
+        total_h = (logo_h + text_h + gap) if (
+                logo_enabled and text_enabled and logo_w > 0 and text_w > 0) else (logo_h or text_h)
+    else:  # logo_left or logo_right
+        total_w = (logo_w + text_w + gap) if (
+                logo_enabled and text_enabled and logo_w > 0 and text_w > 0) else (logo_w or text_w)
+        total_h = max(logo_h, text_h)
+
+    # (C) 錨點 (左上角)
+    area = plan.area
+    align = plan.align or 'bottom_center'
+    target_rect = photo_rect if area == 'in_photo' else frame_rect
+    padding = int(font_size * 0.5)
+
+    x, y = 0, 0
+    if 'left' in align:
+        x = target_rect.left() + padding
+    elif 'center' in align:
+        x = target_rect.center().x() - total_w / 2
+    elif 'right' in align:
+        x = target_rect.right() - total_w - padding
+
+    if area == 'in_photo':
+        if 'top' in align:
+            y = target_rect.top() + padding
+        elif 'middle' in align:
+            y = target_rect.center().y() - total_h / 2
+        elif 'bottom' in align:
+            y = target_rect.bottom() - total_h - padding
+    elif area == 'in_frame':
+        if 'top' in align:
+            # 垂直置中於上邊框的空白區域
+            y = (photo_rect.top() - total_h) / 2
+        elif 'bottom' in align:
+            # 垂直置中於下邊框的空白區域
+            y = photo_rect.bottom() + (frame_rect.bottom() - photo_rect.bottom() - total_h) / 2
+        else:
+            y = target_rect.center().y() - total_h / 2
+
+    # (D) 內部相對位置
+    logo_x_rel, logo_y_rel, text_x_rel, text_y_rel = 0, 0, 0, 0
+    if layout in ['logo_top', 'logo_bottom']:
+        if 'left' in align:
+            logo_x_rel = text_x_rel = 0
+        elif 'right' in align:
+            logo_x_rel = total_w - logo_w
+            text_x_rel = total_w - text_w
+        else:
+            logo_x_rel = (total_w - logo_w) / 2
+            text_x_rel = (total_w - text_w) / 2
+        if layout == 'logo_top':
+            text_y_rel = logo_h + gap
+        else:
+            logo_y_rel = text_h + gap
+    else:
+        logo_y_rel = (total_h - logo_h) / 2
+        text_y_rel = (total_h - text_h) / 2
+        if layout == 'logo_right':
+            logo_x_rel = text_w + gap
+        else:
+            text_x_rel = logo_w + gap
+
+    # (E) 繪製；文字的位置為外框左上角，基線位於其下方 ascent 處 (與 QGraphicsSimpleTextItem 相同)
+    if logo_enabled:
+        if logo_image is not None:
+            painter.drawImage(QPointF(x + logo_x_rel, y + logo_y_rel), logo_image)
+        elif logo_text:
+            painter.setFont(logo_font)
+            painter.setPen(font_color)
+            painter.drawText(QPointF(x + logo_x_rel, y + logo_y_rel + logo_fm.ascent()), logo_text)
+
+    if text_enabled and watermark_text:
+        painter.setFont(watermark_font)
+        painter.setPen(font_color)
+        painter.drawText(QPointF(x + text_x_rel, y + text_y_rel + fm.ascent()), watermark_text)
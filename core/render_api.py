@@ -0,0 +1,170 @@
+# core/render_api.py
+import io
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Iterable, Iterator, NamedTuple
+
+from PIL import Image
+
+from core.env_patch import ensure_headless_application
+from core.exif_reader import build_exif_bytes, get_exif_data
+from core.pil_renderer import render_with_pil
+from core.render_cache import render_key
+from core.render_plan import RenderPlan
+from core.tiled_renderer import needs_tiled_render, render_with_pil_tiled, render_with_pil_tiled_encoded
+
+# 支援的輸出格式：格式名稱 -> 是否支援透明度
+OUTPUT_FORMATS = {
+    'PNG': True,
+    'WEBP': True,
+    'TIFF': True,
+    'JPEG': False,
+}
+
+_shared_asset_manager = None
+
+
+class RenderResult(NamedTuple):
+    """批次渲染的單一結果：輸入順序中的索引、原始來源、編碼後的位元組，或失敗時的例外。"""
+    index: int
+    source: Any
+    data: bytes | None
+    error: Exception | None
+
+
+def _default_asset_manager():
+    """
+    呼叫端只提供設定字典時，共用一個 AssetManager 來解析 Logo 與字體。
+    第一次呼叫必須在主執行緒中進行 (會視需要建立無視窗的 QGuiApplication)。
+    """
+    global _shared_asset_manager
+    if _shared_asset_manager is None:
+        from core.asset_manager import AssetManager
+        ensure_headless_application()
+        _shared_asset_manager = AssetManager()
+    return _shared_asset_manager
+
+
+def compile_plan(settings, asset_manager=None) -> RenderPlan:
+    """
+    將設定快照轉為渲染計畫。可以直接傳入 RenderPlan，
+    或與設定檔中 gallery_settings 格式相同的字典 ({'frame': {...}, 'watermark': {...}})。
+    """
+    if isinstance(settings, RenderPlan):
+        return settings
+    return RenderPlan.compile(settings or {}, asset_manager or _default_asset_manager())
+
+
+def _read_source(source):
+    """
+    將來源統一為「檔案路徑」或「記憶體中的完整位元組」。
+    位元組直接在記憶體中解碼，不寫入暫存檔；已開啟的檔案物件會先讀入記憶體。
+    """
+    if isinstance(source, (str, os.PathLike)):
+        return os.fspath(source)
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return source
+    if hasattr(source, 'read'):
+        return source.read()
+    raise TypeError(f"不支援的來源類型: {type(source)}")
+
+
+def _open(source):
+    """每次解碼都使用新的記憶體檔案，讓多個讀取者互不影響讀取位置。"""
+    return io.BytesIO(source) if isinstance(source, (bytes, bytearray, memoryview)) else source
+
+
+def render_to_bytes(source, settings, exif_data: dict = None, *, format: str = 'PNG', quality: int = 95,
+                    compress_level: int = 6, background=(255, 255, 255), asset_manager=None, cache=None) -> bytes:
+    """
+    渲染單張圖片並直接返回編碼後的位元組 (含 EXIF)，整個過程不寫入任何檔案。
+
+    source: 檔案路徑、圖片檔的完整位元組 (bytes / bytearray / memoryview) 或二進位檔案物件。
+    settings: RenderPlan，或 gallery_settings 格式的設定字典。
+    exif_data: 浮水印與輸出 EXIF 使用的扁平 EXIF 字典；None 代表從來源讀取。
+    format: 'PNG'、'JPEG'、'WEBP' 或 'TIFF'。不支援透明度的格式會以 background 顏色填滿圓角外的透明區域。
+    cache: RenderCache；相同來源、設定與編碼參數的輸出直接從磁碟快取讀取。
+    """
+    output_format = format.upper()
+    if output_format == 'JPG':
+        output_format = 'JPEG'
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"不支援的輸出格式: {format}")
+
+    plan = compile_plan(settings, asset_manager)
+    source = _read_source(source)
+    if exif_data is None:
+        exif_data = get_exif_data(source)
+    exif_bytes = build_exif_bytes(exif_data)
+
+    # 超大圖不論輸出格式都分帶渲染，不配置整張未壓縮的輸出緩衝區
+    tiled = needs_tiled_render(_open(source))
+    cache_key = None
+    if cache is not None:
+        encode_options = {'compress_level': compress_level} if output_format == 'PNG' else {'quality': quality}
+        if not OUTPUT_FORMATS[output_format]:
+            encode_options['background'] = tuple(background)
+        cache_key = render_key(source, plan, exif_data, 'pil-tiled' if tiled else 'pil', output_format,
+                               exif=sorted(exif_data.items()), **encode_options)
+        data = cache.get_bytes(cache_key)
+        if data is not None:
+            return data
+
+    save_args = {}
+    if output_format == 'PNG':
+        save_args['compress_level'] = compress_level
+    elif output_format in ('JPEG', 'WEBP'):
+        save_args['quality'] = quality
+    if exif_bytes:
+        save_args['exif'] = exif_bytes
+
+    output = io.BytesIO()
+    if tiled and output_format == 'PNG':
+        # 超大圖輸出 PNG：分帶渲染並直接串流編碼到記憶體中，不組出整張未壓縮的輸出
+        render_with_pil_tiled(_open(source), output, exif_data, plan, exif_bytes)
+    elif tiled:
+        # 其他格式無法串流編碼：分帶渲染到暫存的記憶體映射檔後再整張編碼
+        render_with_pil_tiled_encoded(_open(source), output, exif_data, plan, output_format, save_args,
+                                      None if OUTPUT_FORMATS[output_format] else background)
+    else:
+        image = render_with_pil(_open(source), exif_data, plan)
+        if not OUTPUT_FORMATS[output_format]:
+            flattened = Image.new('RGB', image.size, background)
+            flattened.paste(image, mask=image.getchannel('A'))
+            image = flattened
+        image.save(output, format=output_format, **save_args)
+    if cache_key:
+        cache.put_bytes(cache_key, output.getvalue())
+    return output.getvalue()
+
+
+def render_batch(sources: Iterable, settings, *, max_workers: int = None, asset_manager=None,
+                 **encode_options) -> Iterator[RenderResult]:
+    """
+    批次渲染並依完成順序逐一產出 RenderResult，呼叫端可以邊收邊寫到自己的儲存空間。
+    設定只在批次開始時編譯一次；來源可以是任意 (包括惰性的) 可迭代物件，
+    同時在處理中的來源數量有上限，不會一次把所有來源讀進記憶體。
+    單張圖片失敗時不會中斷整個批次，錯誤記錄在該結果的 error 欄位中。
+    """
+    plan = compile_plan(settings, asset_manager)
+    max_workers = max_workers or max(1, (os.cpu_count() or 1) - 1)
+    max_pending = max_workers * 2
+
+    def task(index, source):
+        try:
+            return RenderResult(index, source, render_to_bytes(source, plan, **encode_options), None)
+        except Exception as e:
+            return RenderResult(index, source, None, e)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = set()
+        for index, source in enumerate(sources):
+            pending.add(executor.submit(task, index, source))
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
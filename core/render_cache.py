@@ -0,0 +1,259 @@
+# core/render_cache.py
+import hashlib
+import os
+import shutil
+import threading
+import uuid
+from pathlib import Path
+
+from PyQt6.QtCore import QObject, QRunnable, pyqtSignal
+
+from core.lru_cache import ByteLRUCache
+
+# 快取內容的格式版本；渲染結果的演算法改變時遞增，舊的快取項目自然不再命中並逐漸被淘汰
+CACHE_VERSION = 1
+# 設定檔中渲染快取的鍵：{'enabled': bool, 'max_mb': int}
+CACHE_SETTINGS_KEY = "render_cache"
+# 預設的快取容量上限 (MB)
+DEFAULT_MAX_MB = 2048
+# 超過容量上限時，淘汰到容量的這個比例以下，避免每次寫入都重新掃描目錄
+EVICT_TARGET_RATIO = 0.9
+# 計算來源檔案雜湊時每次讀取的大小
+HASH_CHUNK_BYTES = 1024 * 1024
+
+# 來源雜湊記憶的容量上限 (約可記住上萬個檔案)；常駐的渲染服務與工作者會不斷看到新的路徑
+SOURCE_DIGEST_CACHE_BYTES = 4 * 1024 ** 2
+# 每個記憶項目除路徑字串外的大約開銷 (鍵值 tuple、雜湊字串與字典項目)
+SOURCE_DIGEST_ENTRY_BYTES = 256
+
+# 來源檔案內容雜湊的記憶：(路徑, 大小, 修改時間) -> 雜湊，同一個檔案在容量內只讀取一次
+_source_digests = ByteLRUCache(SOURCE_DIGEST_CACHE_BYTES)
+
+
+def source_digest(source) -> str:
+    """
+    來源圖片的內容雜湊。檔案路徑以 (路徑, 大小, 修改時間) 記憶結果，
+    因此同一張圖片重複匯出時只有第一次需要讀取整個檔案；記憶體中的位元組直接計算。
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return hashlib.blake2b(source, digest_size=20).hexdigest()
+    path = os.path.abspath(os.fspath(source))
+    stat = os.stat(path)
+    identity = (path, stat.st_size, stat.st_mtime_ns)
+    digest = _source_digests.get(identity)
+    if digest is None:
+        hasher = hashlib.blake2b(digest_size=20)
+        with open(path, 'rb') as f:
+            while chunk := f.read(HASH_CHUNK_BYTES):
+                hasher.update(chunk)
+        digest = hasher.hexdigest()
+        _source_digests.put(identity, digest, len(path) + SOURCE_DIGEST_ENTRY_BYTES)
+    return digest
+
+
+def asset_identity(path) -> str:
+    """
+    Logo 與字體等素材檔的識別：路徑、大小與修改時間。
+    使用者替換了同名的素材檔時，快取項目便不再命中。
+    """
+    if not path:
+        return ''
+    try:
+        stat = os.stat(path)
+        return f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+    except OSError:
+        return f"{path}:missing"
+
+
+def render_key(source, plan, exif_data: dict, renderer: str, output_format: str, **encode_options) -> str:
+    """
+    一次渲染輸出的快取鍵：來源內容、編譯後的設定、實際使用的素材、渲染器、輸出格式與編碼參數。
+    EXIF 由來源內容決定，因此不另外納入；只用來找出此圖片自動偵測到的 Logo。
+    """
+    parts = (
+        CACHE_VERSION,
+        source_digest(source),
+        plan.fingerprint(),
+        asset_identity(plan.resolve_logo_path(exif_data)),
+        asset_identity(plan.font_path),
+        renderer,
+        output_format.upper(),
+        sorted(encode_options.items()),
+    )
+    return hashlib.sha256(repr(parts).encode('utf-8')).hexdigest()
+
+
+class RenderCache:
+    """
+    以內容定址的磁碟渲染快取，存放編碼後的輸出檔。
+    檔案的修改時間記錄最後一次使用的時間：命中時更新，超過容量上限時從最久未使用的項目開始淘汰。
+    寫入先寫暫存檔再原子地改名，多個匯出執行緒或多個行程可以共用同一個快取目錄。
+    """
+
+    def __init__(self, cache_dir: Path = None, max_bytes: int = DEFAULT_MAX_MB * 1024 ** 2, hardlink: bool = False):
+        self.cache_dir = Path(cache_dir) if cache_dir else Path.home() / ".stellar-neo" / "cache"
+        self.max_bytes = max_bytes
+        # 命中時以硬連結取代複製：最快也不佔額外空間，但輸出檔與快取共用同一份資料，
+        # 之後若有程式就地修改輸出檔，快取內容也會一起被改動，因此預設關閉
+        self.hardlink = hardlink
+        self._lock = threading.Lock()
+        self._total_bytes = None  # 第一次寫入時才掃描目錄取得
+
+    @classmethod
+    def from_settings(cls, settings: dict):
+        """依設定建立快取；未啟用時返回 None。"""
+        settings = settings or {}
+        if not settings.get('enabled'):
+            return None
+        return cls(max_bytes=int(settings.get('max_mb', DEFAULT_MAX_MB)) * 1024 ** 2)
+
+    def path_for(self, key: str) -> Path:
+        # 以前兩個字元分子目錄，避免單一目錄中的檔案數過多
+        return self.cache_dir / key[:2] / key
+
+    def lookup(self, key: str):
+        """返回快取項目的路徑並標記為剛使用；未命中時返回 None。"""
+        path = self.path_for(key)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def export_to(self, key: str, output_path) -> bool:
+        """命中時把快取的輸出放到 output_path (硬連結或複製) 並返回 True。"""
+        cached = self.lookup(key)
+        if cached is None:
+            return False
+        tmp_path = f"{output_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            if self.hardlink:
+                try:
+                    os.link(cached, tmp_path)
+                except OSError:
+                    # 跨檔案系統或不支援硬連結時改為複製
+                    shutil.copyfile(cached, tmp_path)
+            else:
+                shutil.copyfile(cached, tmp_path)
+            os.replace(tmp_path, output_path)
+            return True
+        except FileNotFoundError:
+            # 項目剛好被其他行程淘汰：視為未命中
+            return False
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def get_bytes(self, key: str):
+        cached = self.lookup(key)
+        if cached is None:
+            return None
+        try:
+            return cached.read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def put_file(self, key: str, source_path):
+        """把已寫好的輸出檔複製一份到快取中。"""
+        self._store(key, lambda tmp_path: shutil.copyfile(source_path, tmp_path))
+
+    def put_bytes(self, key: str, data: bytes):
+        self._store(key, lambda tmp_path: Path(tmp_path).write_bytes(data))
+
+    def _store(self, key: str, write):
+        path = self.path_for(key)
+        tmp_path = path.with_name(f"{key}.{uuid.uuid4().hex}.tmp")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            write(tmp_path)
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"警告：無法寫入渲染快取 {path}: {e}")
+            if tmp_path.exists():
+                tmp_path.unlink()
+            return
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = self.size()
+            else:
+                self._total_bytes += size
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        """返回所有快取項目的 (最後使用時間, 大小, 路徑)；暫存檔不計入。"""
+        entries = []
+        if not self.cache_dir.is_dir():
+            return entries
+        for sub_dir in self.cache_dir.iterdir():
+            if not sub_dir.is_dir():
+                continue
+            for entry in os.scandir(sub_dir):
+                if entry.name.endswith('.tmp'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _evict(self):
+        """從最久未使用的項目開始刪除，直到容量低於上限的 EVICT_TARGET_RATIO。"""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * EVICT_TARGET_RATIO
+        removed = 0
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        self._total_bytes = total
+        if removed:
+            print(f"[渲染快取] 淘汰 {removed} 個項目，目前約 {total / 1024 ** 2:.0f} MB")
+
+    def size(self) -> int:
+        """快取目前佔用的位元組數。"""
+        return sum(size for _, size, _ in self._entries())
+
+    def clear(self):
+        for _, _, path in self._entries():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            self._total_bytes = 0
+
+
+class CacheSizeSignals(QObject):
+    finished = pyqtSignal(int)  # 快取目前佔用的位元組數
+    error = pyqtSignal(str)
+
+
+class CacheSizeTask(QRunnable):
+    """
+    在執行緒池中計算渲染快取的佔用空間 (clear 為 True 時先清除快取)。
+    兩者都需要走訪整個快取目錄，快取很大或位於慢速磁碟時不應在 GUI 執行緒中進行。
+    """
+
+    def __init__(self, clear: bool = False):
+        super().__init__()
+        self.clear = clear
+        self.signals = CacheSizeSignals()
+
+    def run(self):
+        try:
+            cache = RenderCache()
+            if self.clear:
+                cache.clear()
+            self.signals.finished.emit(cache.size())
+        except Exception as e:
+            print(f"無法計算渲染快取的大小: {e}")
+            self.signals.error.emit(str(e))
@@ -0,0 +1,219 @@
+# core/render_plan.py
+import hashlib
+import os
+import threading
+from dataclasses import dataclass, field, fields
+from pathlib import Path
+
+from PIL import Image, ImageColor
+
+from core.logo_mapping import get_logo_path
+
+# 浮水印 EXIF 文字的組成：(設定鍵, EXIF 鍵, 前綴, 後綴)，順序即輸出順序
+EXIF_TEXT_PARTS = (
+    ('model', 'Model', '', ''),
+    ('focal_length', 'FocalLength', '', 'mm'),
+    ('aperture', 'FNumber', 'f/', ''),
+    ('shutter', 'ExposureTime', '', 's'),
+    ('iso', 'ISO', 'ISO ', ''),
+)
+
+
+@dataclass(frozen=True)
+class RenderPlan:
+    """
+    一次導出批次的渲染計畫。
+    在批次開始時由 `RenderPlan.compile` 從設定字典編譯一次：解析資源路徑、預先換算比例、
+    準備浮水印文字模板，之後每張圖片的渲染只剩下像素運算。
+    計畫本身不可變且可雜湊 (載入的資源快取不參與比較)，可直接作為快取鍵使用。
+    """
+    # --- 相框 ---
+    frame_enabled: bool = True
+    frame_style: str = 'solid_color'
+    frame_color: tuple = (255, 255, 255, 255)
+    blur_radius: float = 20
+    frame_shadow: bool = False
+    photo_shadow: bool = True
+    # 內距為設定中的百分比 (相對於短邊的 10%)；相框停用時皆為 0
+    padding_top: float = 10
+    padding_sides: float = 10
+    padding_bottom: float = 10
+    # 圓角已換算為「短邊一半的比例」
+    frame_radius_ratio: float = 0.05
+    photo_radius_ratio: float = 0.03
+    # 導出時的預覽相片尺寸，用來將預覽上的模糊半徑與字體大小換算到原圖尺寸；0 代表不換算
+    preview_photo_width: float = 0
+    preview_photo_height: float = 0
+
+    # --- 浮水印 ---
+    logo_enabled: bool = False
+    logo_auto_detect: bool = False
+    logo_path: str = None
+    logo_text: str = ''
+    logo_size: float = 30
+    text_enabled: bool = True
+    text_parts: tuple = ()  # EXIF 文字模板：((EXIF 鍵, 前綴, 後綴), ...)
+    text_custom: str = ''
+    font_path: str = None
+    font_face_index: int = 0  # 字型集合檔 (.ttc) 內的字型索引
+    font_family_name: str = None  # 供 Qt 渲染器使用的字體家族名稱；None 代表使用預設字體
+    font_size_ratio: float = 0.2
+    font_color: str = '#FFFFFFFF'
+    layout: str = 'logo_left'
+    area: str = 'in_photo'
+    align: str = 'bottom_center'
+    logos_dir: str = ''
+
+    # 批次內共用的已載入資源 (Logo 影像、自動偵測結果)
+    _resources: dict = field(default_factory=dict, compare=False, hash=False, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, compare=False, hash=False, repr=False)
+
+    @classmethod
+    def compile(cls, all_settings: dict, asset_manager, preview_photo_width: float = 0,
+                preview_photo_height: float = 0) -> 'RenderPlan':
+        """將設定字典編譯成渲染計畫；所有目錄掃描與名稱比對都只在這裡做一次。"""
+        f_settings = all_settings.get('frame', {})
+        w_settings = all_settings.get('watermark', {})
+        frame_enabled = f_settings.get('enabled', True)
+
+        # (A) Logo
+        logo_enabled = w_settings.get('logo_enabled', False)
+        logo_source = w_settings.get('logo_source', 'auto_detect')
+        logo_path, logo_text = None, ''
+        if logo_enabled:
+            if logo_source == 'select_from_library':
+                logo_key = w_settings.get('logo_source_app', '')
+                logo_path = next((p for p in asset_manager.get_default_logos() if Path(p).stem == logo_key), None)
+            elif logo_source == 'my_custom_logo':
+                logo_key = w_settings.get('logo_source_my_custom', '')
+                logo_path = next((p for p in asset_manager.get_user_logos() if
+                                  asset_manager._create_key_from_name(Path(p).stem) == logo_key), None)
+            elif logo_source == 'custom_text':
+                logo_text = w_settings.get('logo_text_custom', 'Logo')
+            if logo_path and not os.path.exists(logo_path):
+                logo_path = None
+
+        # (B) 文字模板
+        text_source = w_settings.get('text_source', 'exif')
+        text_parts = ()
+        if text_source == 'exif':
+            exif_options = w_settings.get('exif_options', {})
+            text_parts = tuple((exif_key, prefix, suffix) for option, exif_key, prefix, suffix in EXIF_TEXT_PARTS
+                               if exif_options.get(option))
+
+        # (C) 字體：系統字體透過字體索引解析為字體檔，兩種渲染器使用同一個字型
+        font_path, font_face_index, font_family_name = None, 0, None
+        if w_settings.get('font_family', 'system') == 'my_custom':
+            font_key = w_settings.get('font_my_custom', '')
+            for path, families in asset_manager.get_user_fonts().items():
+                if asset_manager._create_key_from_name(Path(path).stem) == font_key:
+                    font_path = path
+                    font_family_name = families[0] if families else None
+                    break
+        else:
+            font_key = w_settings.get('font_system', '')
+            resolved = asset_manager.resolve_system_font(font_key)
+            if resolved:
+                font_path, font_face_index, font_family_name, _ = resolved
+            elif font_key:
+                print(f"警告：在系統字體索引中找不到字體 '{font_key}'，將使用預設字體。")
+
+        return cls(
+            frame_enabled=frame_enabled,
+            frame_style=f_settings.get('style', 'solid_color'),
+            frame_color=ImageColor.getrgb(f_settings.get('color', '#FFFFFFFF')),
+            blur_radius=f_settings.get('blur_radius', 20),
+            frame_shadow=frame_enabled and f_settings.get('frame_shadow', False),
+            photo_shadow=frame_enabled and f_settings.get('photo_shadow', True),
+            padding_top=f_settings.get('padding_top', 10) if frame_enabled else 0,
+            padding_sides=f_settings.get('padding_sides', 10) if frame_enabled else 0,
+            padding_bottom=f_settings.get('padding_bottom', 10) if frame_enabled else 0,
+            frame_radius_ratio=f_settings.get('frame_radius', 5) / 100.0,
+            photo_radius_ratio=f_settings.get('photo_radius', 3) / 100.0,
+            preview_photo_width=preview_photo_width or 0,
+            preview_photo_height=preview_photo_height or 0,
+            logo_enabled=logo_enabled,
+            logo_auto_detect=logo_enabled and logo_source == 'auto_detect',
+            logo_path=logo_path,
+            logo_text=logo_text,
+            logo_size=w_settings.get('logo_size', 30),
+            text_enabled=w_settings.get('text_enabled', True),
+            text_parts=text_parts,
+            text_custom=w_settings.get('text_custom', '') if text_source == 'custom' else '',
+            font_path=font_path,
+            font_face_index=font_face_index,
+            font_family_name=font_family_name,
+            font_size_ratio=w_settings.get('font_size', 20) / 100.0,
+            font_color=w_settings.get('font_color', '#FFFFFFFF'),
+            layout=w_settings.get('layout', 'logo_left'),
+            area=w_settings.get('area', 'in_photo') if frame_enabled else 'in_photo',
+            align=w_settings.get('align', 'bottom_center'),
+            logos_dir=str(asset_manager.default_logos_dir),
+        )
+
+    # --- 每張圖片的查詢 ---
+
+    def paddings(self, img_w: int, img_h: int) -> tuple[int, int, int]:
+        """返回 (上, 左右, 下) 內距的像素值，算式與舊版渲染器相同以保持逐像素一致。"""
+        base_padding = min(img_w, img_h) * 0.1
+        return (int(base_padding * self.padding_top / 100),
+                int(base_padding * self.padding_sides / 100),
+                int(base_padding * self.padding_bottom / 100))
+
+    def logo_height(self, img_h: int) -> int:
+        return int((img_h * 0.1) * (self.logo_size / 50.0))
+
+    def font_size(self, img_w: int, img_h: int) -> int:
+        base_font_size = max(12, int(min(img_w, img_h) * 0.04))
+        return int(base_font_size * self.font_size_ratio)
+
+    def preview_scaled_font_size(self, img_w: int) -> int:
+        """Qt 渲染器的字體點數：以預覽上的字體大小按相片寬度比例放大，使導出與預覽的視覺大小一致。"""
+        preview_w, preview_h = self.preview_photo_width, self.preview_photo_height
+        base_preview_font_size = max(8, int(min(preview_w, preview_h) * 0.04))
+        scale_factor = (img_w / preview_w * 0.95) if preview_w > 0 else 1.0
+        return int(base_preview_font_size * self.font_size_ratio * scale_factor)
+
+    def watermark_text(self, exif_data: dict) -> str:
+        """依照文字模板組合浮水印文字 (格式與舊版一致)。"""
+        if self.text_custom:
+            return self.text_custom
+        formatted_parts = []
+        for exif_key, prefix, suffix in self.text_parts:
+            value = exif_data.get(exif_key, '')
+            formatted_parts.append(f"{prefix}{value}{suffix}" if prefix or suffix else value)
+        return "  ".join(filter(None, formatted_parts))
+
+    def resolve_logo_path(self, exif_data: dict):
+        """返回此圖片要使用的 Logo 路徑；自動偵測的結果按相機品牌記憶。"""
+        if not self.logo_auto_detect:
+            return self.logo_path
+        make = exif_data.get('Make', '')
+        cache = self._resources.setdefault('auto_logo_paths', {})
+        if make not in cache:
+            cache[make] = get_logo_path(make, self.logos_dir)
+        return cache[make]
+
+    def logo_image(self, exif_data: dict):
+        """
+        返回此圖片的 Logo 影像 (RGBA)，同一路徑在整個批次中只解碼一次。
+        返回的影像由所有執行緒共用，呼叫端只能讀取或產生新影像，不可就地修改。
+        """
+        path = self.resolve_logo_path(exif_data)
+        if not path:
+            return None
+        with self._lock:
+            images = self._resources.setdefault('logo_images', {})
+            if path not in images:
+                try:
+                    with Image.open(path) as img:
+                        images[path] = img.convert('RGBA')
+                except Exception as e:
+                    print(f"無法載入 Logo {path}: {e}")
+                    images[path] = None
+            return images[path]
+
+    def fingerprint(self) -> str:
+        """跨行程穩定的計畫摘要 (內建 hash 對字串有隨機化，不適合寫入磁碟)。"""
+        values = tuple((f.name, getattr(self, f.name)) for f in fields(self) if f.compare)
+        return hashlib.sha1(repr(values).encode('utf-8')).hexdigest()
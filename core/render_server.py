@@ -0,0 +1,418 @@
+# core/render_server.py
+import base64
+import io
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from email import policy
+from email.parser import BytesParser
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+from PIL import Image, UnidentifiedImageError
+
+from core.render_api import OUTPUT_FORMATS, render_to_bytes
+from core.render_plan import RenderPlan
+from core.tiled_renderer import open_large_image
+
+# 只綁定本機回環位址，服務不會暴露到網路上
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+# 所有工作執行緒都忙碌時，最多還能排隊等候的請求數；超過時直接回應 503
+DEFAULT_MAX_QUEUE = 16
+# 單一請求內容的大小上限 (位元組)
+MAX_REQUEST_BYTES = 256 * 1024 * 1024
+# 上傳圖片的像素數上限；壓縮後很小的檔案也可能宣告數十億像素，因此與位元組上限分開檢查
+DEFAULT_MAX_PIXELS = 150_000_000
+# 依設定內容快取的已編譯渲染計畫數量
+PLAN_CACHE_SIZE = 32
+# 只接受 Host 標頭為這些名稱的請求，防止 DNS rebinding 讓外部網頁借用本機服務
+LOOPBACK_HOSTS = ('127.0.0.1', 'localhost', '[::1]')
+
+CONTENT_TYPES = {
+    'PNG': 'image/png',
+    'JPEG': 'image/jpeg',
+    'WEBP': 'image/webp',
+    'TIFF': 'image/tiff',
+}
+
+
+class ServiceBusy(Exception):
+    """工作執行緒與等候佇列都已滿。"""
+
+
+class ImageTooLarge(Exception):
+    """上傳圖片的像素數超過服務的上限。"""
+
+
+class RenderService:
+    """
+    常駐的渲染服務：資源管理器、字體索引與 Logo 在啟動時載入一次，
+    之後每個請求只需解碼、渲染與編碼。
+    同時處理中 (執行中 + 排隊中) 的請求數有上限，超過時立即拒絕而不是無限制地堆積記憶體。
+    """
+
+    def __init__(self, asset_manager, default_settings: dict = None, workers: int = None,
+                 max_queue: int = DEFAULT_MAX_QUEUE, cache=None):
+        self.asset_manager = asset_manager
+        # 磁碟渲染快取 (RenderCache)；None 代表每次都重新渲染
+        self.cache = cache
+        self.default_settings = default_settings or {}
+        self.workers = workers or max(1, (os.cpu_count() or 1) - 1)
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='render-worker')
+        self._slots = threading.BoundedSemaphore(self.workers + max_queue)
+        self._plans = OrderedDict()  # 正規化的設定 JSON -> RenderPlan
+        self._lock = threading.Lock()
+        self._started = time.time()
+        self._stats = {
+            'requests': 0, 'completed': 0, 'failed': 0, 'rejected': 0,
+            'queued': 0, 'running': 0,
+            'render_ms_total': 0.0, 'render_ms_max': 0.0, 'wait_ms_total': 0.0,
+            'plan_hits': 0, 'plan_misses': 0,
+        }
+
+    def _merge_settings(self, settings: dict) -> dict:
+        """請求中的設定以區段為單位覆蓋預設設定，只需傳入要改變的欄位。"""
+        merged = {}
+        for section in set(self.default_settings) | set(settings or {}):
+            base, override = self.default_settings.get(section), (settings or {}).get(section)
+            if isinstance(base, dict) and isinstance(override, dict):
+                merged[section] = {**base, **override}
+            else:
+                merged[section] = override if override is not None else base
+        return merged
+
+    def plan_for(self, settings: dict) -> RenderPlan:
+        """返回設定對應的渲染計畫；相同設定的請求共用同一個計畫 (以及其中已載入的 Logo)。"""
+        merged = self._merge_settings(settings)
+        key = json.dumps(merged, sort_keys=True, ensure_ascii=False)
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is not None:
+                self._plans.move_to_end(key)
+                self._stats['plan_hits'] += 1
+                return plan
+            self._stats['plan_misses'] += 1
+        plan = RenderPlan.compile(merged, self.asset_manager)
+        with self._lock:
+            self._plans[key] = plan
+            while len(self._plans) > PLAN_CACHE_SIZE:
+                self._plans.popitem(last=False)
+        return plan
+
+    def warm(self):
+        """預先完成第一個請求才會做的工作：字體索引、預設計畫的 Logo，以及解碼 / 編碼器的初始化。"""
+        start = time.perf_counter()
+        self.asset_manager.font_index.ensure_loaded()
+        plan = self.plan_for({})
+        plan.logo_image({})
+        pixels = np.linspace(0, 255, 64 * 48 * 3).astype(np.uint8).reshape(48, 64, 3)
+        sample = Image.fromarray(pixels)
+        buffer = io.BytesIO()
+        sample.save(buffer, format='JPEG')
+        # 預熱每個工作執行緒，讓執行緒與其緩存都在第一個請求之前建立
+        futures = [self._executor.submit(render_to_bytes, buffer.getvalue(), plan, {}) for _ in range(self.workers)]
+        for future in futures:
+            future.result()
+        print(f"[渲染服務] 預熱完成 ({(time.perf_counter() - start) * 1000:.0f} ms)，{self.workers} 個工作執行緒")
+
+    def submit(self, data: bytes, settings: dict = None, **encode_options) -> bytes:
+        """在工作執行緒中渲染並等待結果；佇列已滿時拋出 ServiceBusy。"""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats['rejected'] += 1
+            raise ServiceBusy()
+        try:
+            plan = self.plan_for(settings)
+            with self._lock:
+                self._stats['requests'] += 1
+                self._stats['queued'] += 1
+            return self._executor.submit(self._render, data, plan, encode_options, time.perf_counter()).result()
+        finally:
+            self._slots.release()
+
+    def _render(self, data, plan, encode_options, queued_at):
+        start = time.perf_counter()
+        with self._lock:
+            self._stats['queued'] -= 1
+            self._stats['running'] += 1
+            self._stats['wait_ms_total'] += (start - queued_at) * 1000
+        ok = False
+        try:
+            result = render_to_bytes(data, plan, cache=self.cache, **encode_options)
+            ok = True
+            return result
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            with self._lock:
+                self._stats['running'] -= 1
+                self._stats['completed' if ok else 'failed'] += 1
+                self._stats['render_ms_total'] += elapsed
+                self._stats['render_ms_max'] = max(self._stats['render_ms_max'], elapsed)
+
+    def health(self) -> dict:
+        with self._lock:
+            running, queued = self._stats['running'], self._stats['queued']
+        return {
+            'status': 'ok',
+            'workers': self.workers,
+            'running': running,
+            'queued': queued,
+            'accepting': running + queued < self.workers + self.max_queue,
+        }
+
+    def metrics(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            cached_plans = len(self._plans)
+        finished = stats['completed'] + stats['failed']
+        started = finished + stats['running']
+        return {
+            'uptime_s': round(time.time() - self._started, 1),
+            'workers': self.workers,
+            'max_queue': self.max_queue,
+            'requests': stats['requests'],
+            'completed': stats['completed'],
+            'failed': stats['failed'],
+            'rejected': stats['rejected'],
+            'running': stats['running'],
+            'queued': stats['queued'],
+            'render_ms_avg': round(stats['render_ms_total'] / finished, 1) if finished else 0.0,
+            'render_ms_max': round(stats['render_ms_max'], 1),
+            'queue_wait_ms_avg': round(stats['wait_ms_total'] / started, 1) if started else 0.0,
+            'plan_cache': {'size': cached_plans, 'hits': stats['plan_hits'], 'misses': stats['plan_misses']},
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+def _encode_options(fields: dict) -> dict:
+    """從請求欄位中取出輸出格式與壓縮參數。"""
+    options = {}
+    if fields.get('format'):
+        output_format = str(fields['format']).upper()
+        output_format = 'JPEG' if output_format == 'JPG' else output_format
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"不支援的輸出格式: {fields['format']}")
+        options['format'] = output_format
+    for name in ('quality', 'compress_level'):
+        if fields.get(name) not in (None, ''):
+            try:
+                options[name] = int(fields[name])
+            except (TypeError, ValueError):
+                raise ValueError(f"{name} 必須是整數")
+    return options
+
+
+def _load_settings(value) -> dict:
+    if value in (None, ''):
+        return {}
+    if isinstance(value, (bytes, bytearray)):
+        value = value.decode('utf-8')
+    settings = json.loads(value) if isinstance(value, str) else value
+    if not isinstance(settings, dict):
+        raise ValueError("settings 必須是 JSON 物件")
+    return settings
+
+
+def parse_render_request(content_type: str, body: bytes, query: dict, max_pixels: int = DEFAULT_MAX_PIXELS):
+    """
+    解析 POST /render 的內容，返回 (圖片位元組, 設定字典, 編碼選項)。支援三種格式：
+    - multipart/form-data：欄位 image (檔案)、settings (JSON)、format、quality、compress_level
+    - application/json：{"image": Base64 字串, "settings": {...}, "format": ..., "quality": ...}
+    - 其他：請求內容即為圖片檔，設定以查詢參數 settings (JSON) 傳入
+    查詢參數中的 format / quality / compress_level 在三種格式中皆可使用，請求內容中的欄位優先。
+    圖片的像素數超過 max_pixels 時拋出 ImageTooLarge。
+    """
+    fields = {name: values[-1] for name, values in query.items()}
+    mime_type = content_type.split(';', 1)[0].strip().lower()
+    if mime_type == 'multipart/form-data':
+        message = BytesParser(policy=policy.HTTP).parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode('latin-1') + body)
+        if not message.is_multipart():
+            raise ValueError("無法解析 multipart 內容")
+        image = None
+        for part in message.iter_parts():
+            name = part.get_param('name', header='content-disposition')
+            payload = part.get_payload(decode=True) or b''
+            if name == 'image':
+                image = payload
+            elif name:
+                fields[name] = payload.decode('utf-8')
+    elif mime_type == 'application/json':
+        try:
+            document = json.loads(body)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"無效的 JSON: {e}")
+        if not isinstance(document, dict):
+            raise ValueError("請求內容必須是 JSON 物件")
+        try:
+            image = base64.b64decode(document.get('image') or '', validate=True)
+        except ValueError:
+            raise ValueError("image 必須是 Base64 字串")
+        fields.update({k: v for k, v in document.items() if k != 'image'})
+    else:
+        image = body
+    if not image:
+        raise ValueError("請求中沒有圖片")
+    # 只讀取檔頭辨識格式與尺寸 (不解碼像素)，無法辨識或過大的圖片在進入佇列前就拒絕；
+    # 像素數以服務自己的上限檢查，不依賴 Pillow 的全域設定
+    try:
+        with open_large_image(io.BytesIO(image)) as img:
+            width, height = img.size
+    except Image.DecompressionBombError:
+        raise ImageTooLarge(f"圖片超過 {max_pixels} 像素的上限")
+    if width * height > max_pixels:
+        raise ImageTooLarge(f"圖片尺寸 {width}x{height} 超過 {max_pixels} 像素的上限")
+    return image, _load_settings(fields.get('settings')), _encode_options(fields)
+
+
+class RenderRequestHandler(BaseHTTPRequestHandler):
+    """
+    GET  /health   服務狀態 (JSON)
+    GET  /metrics  請求計數、佇列長度與耗時統計 (JSON)
+    POST /render   渲染上傳的圖片，返回加上相框的圖片
+    """
+    server_version = 'StellarNeoRender/1.0'
+    protocol_version = 'HTTP/1.1'
+
+    @property
+    def service(self) -> RenderService:
+        return self.server.service
+
+    def _host_allowed(self) -> bool:
+        host = (self.headers.get('Host') or '').lower()
+        if host.startswith('['):
+            host = host.split(']', 1)[0] + ']'
+        else:
+            host = host.split(':', 1)[0]
+        return host in LOOPBACK_HOSTS
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: dict = None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        origin = self.headers.get('Origin')
+        if origin and origin in self.server.allowed_origins:
+            self.send_header('Access-Control-Allow-Origin', origin)
+            self.send_header('Vary', 'Origin')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status: int, data: dict, headers: dict = None):
+        self._send(status, json.dumps(data, ensure_ascii=False).encode('utf-8'),
+                   'application/json; charset=utf-8', headers)
+
+    def _send_error(self, status: HTTPStatus, message: str, headers: dict = None):
+        self._send_json(status, {'error': message}, headers)
+
+    def do_OPTIONS(self):
+        """瀏覽器跨來源請求的預檢；只對啟動時指定的來源開放。"""
+        origin = self.headers.get('Origin')
+        if not self._host_allowed() or origin not in self.server.allowed_origins:
+            self._send_error(HTTPStatus.FORBIDDEN, 'origin not allowed')
+            return
+        self._send(HTTPStatus.NO_CONTENT, b'', 'text/plain', {
+            'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+            'Access-Control-Allow-Headers': 'Content-Type',
+            'Access-Control-Max-Age': '600',
+        })
+
+    def do_GET(self):
+        if not self._host_allowed():
+            self._send_error(HTTPStatus.FORBIDDEN, 'host not allowed')
+            return
+        path = urlsplit(self.path).path
+        if path == '/health':
+            self._send_json(HTTPStatus.OK, self.service.health())
+        elif path == '/metrics':
+            self._send_json(HTTPStatus.OK, self.service.metrics())
+        else:
+            self._send_error(HTTPStatus.NOT_FOUND, 'not found')
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if not self._host_allowed():
+            self.close_connection = True
+            self._send_error(HTTPStatus.FORBIDDEN, 'host not allowed')
+            return
+        if url.path != '/render':
+            self.close_connection = True
+            self._send_error(HTTPStatus.NOT_FOUND, 'not found')
+            return
+        try:
+            length = int(self.headers.get('Content-Length', ''))
+        except ValueError:
+            self.close_connection = True
+            self._send_error(HTTPStatus.LENGTH_REQUIRED, 'Content-Length required')
+            return
+        if length > MAX_REQUEST_BYTES:
+            # 不讀取過大的請求內容，回應後直接關閉連線
+            self.close_connection = True
+            self._send_error(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f'request body exceeds {MAX_REQUEST_BYTES} bytes')
+            return
+        body = self.rfile.read(length)
+
+        try:
+            image, settings, options = parse_render_request(self.headers.get('Content-Type', ''), body,
+                                                            parse_qs(url.query), self.server.max_pixels)
+            data = self.service.submit(image, settings, **options)
+        except ServiceBusy:
+            self._send_error(HTTPStatus.SERVICE_UNAVAILABLE, 'render queue is full', {'Retry-After': '1'})
+        except ImageTooLarge as e:
+            self._send_error(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, str(e))
+        except (ValueError, UnidentifiedImageError) as e:
+            self._send_error(HTTPStatus.BAD_REQUEST, str(e))
+        except Exception as e:
+            print(f"[渲染服務] 渲染失敗: {e}")
+            self._send_error(HTTPStatus.INTERNAL_SERVER_ERROR, str(e))
+        else:
+            self._send(HTTPStatus.OK, data, CONTENT_TYPES[options.get('format', 'PNG')])
+
+    def log_message(self, format, *args):
+        print(f"[渲染服務] {self.address_string()} {format % args}")
+
+
+class RenderHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, service: RenderService, port: int = DEFAULT_PORT, allowed_origins=(),
+                 max_pixels: int = DEFAULT_MAX_PIXELS):
+        super().__init__((DEFAULT_HOST, port), RenderRequestHandler)
+        self.service = service
+        self.allowed_origins = frozenset(allowed_origins)
+        self.max_pixels = max_pixels
+
+
+def run_server(port: int = DEFAULT_PORT, workers: int = None, max_queue: int = DEFAULT_MAX_QUEUE,
+               allowed_origins=(), max_pixels: int = DEFAULT_MAX_PIXELS):
+    """啟動本機渲染服務並阻塞至收到中斷；預設使用設定檔中目前的相框與浮水印設定。"""
+    from core.asset_manager import AssetManager
+    from core.env_patch import ensure_headless_application
+    from core.render_cache import CACHE_SETTINGS_KEY, RenderCache
+    from core.settings_manager import SettingsManager
+
+    ensure_headless_application()
+    settings_manager = SettingsManager()
+    settings = settings_manager.get('gallery_settings') or {}
+    cache = RenderCache.from_settings(settings_manager.get(CACHE_SETTINGS_KEY))
+    service = RenderService(AssetManager(), settings, workers, max_queue, cache)
+    service.warm()
+    httpd = RenderHTTPServer(service, port, allowed_origins, max_pixels)
+    print(f"[渲染服務] 正在監聽 http://{DEFAULT_HOST}:{httpd.server_port}/ (按 Ctrl+C 結束)")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        print("[渲染服務] 正在關閉...")
+    finally:
+        httpd.server_close()
+        service.shutdown()
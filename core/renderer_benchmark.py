@@ -0,0 +1,169 @@
+# core/renderer_benchmark.py
+import os
+import platform
+import tempfile
+import time
+
+import numpy as np
+import PIL
+from PIL import Image
+from PyQt6.QtCore import QObject, QRunnable, QT_VERSION_STR, pyqtSignal
+
+from core.pil_renderer import render_with_pil
+from core.qt_bridge import encodable_view
+from core.qt_renderer import render_with_qt, supports_plan
+from core.render_plan import RenderPlan
+from core.utils import get_os_type
+
+# 設定檔中儲存基準測試結果的鍵
+BENCHMARK_SETTINGS_KEY = "renderer_benchmark"
+# 結果格式版本；格式或測試內容變更時遞增，舊結果會被視為過期
+BENCHMARK_VERSION = 2
+# 每個測試案例重複的次數 (取最快的一次，排除冷啟動與排程的雜訊)
+BENCHMARK_REPEAT = 2
+# 兩個渲染器輸出的平均像素差 (0-255) 超過此值時，視為結果不一致，不採用較快的渲染器
+RENDERER_DIFF_TOLERANCE = 3.0
+
+# 標準測試案例：(名稱, 寬, 高, 渲染計畫參數)
+# 兩個渲染器的字體來源本來就不同，浮水印會造成與渲染器品質無關的差異，因此測試中停用浮水印；
+# Qt 渲染器沒有相框陰影，使用相框陰影的計畫一律由 PIL 渲染 (見 choose_renderer)，因此不納入比較
+BENCHMARK_CASES = (
+    ('landscape_solid', 2400, 1600, dict(frame_style='solid_color', frame_color=(255, 255, 255, 255))),
+    ('landscape_blur', 2400, 1600, dict(frame_style='blur_extend', blur_radius=20, preview_photo_width=800)),
+    ('portrait_solid', 1600, 2400, dict(frame_style='solid_color', frame_color=(32, 32, 32, 255),
+                                        padding_bottom=30, photo_radius_ratio=0.08)),
+)
+
+# 渲染器代號 -> 匯出時使用的渲染函式
+RENDERERS = {
+    'pil': lambda path, plan: render_with_pil(path, {}, plan),
+    'qt': lambda path, plan: render_with_qt(path, {}, plan),
+}
+
+
+def default_renderer(os_type: str = None) -> str:
+    """沒有基準測試結果時使用的渲染器 (與過去的行為相同：Windows 使用 PIL，其他系統使用 Qt)。"""
+    return 'pil' if (os_type or get_os_type()) == 'windows' else 'qt'
+
+
+def machine_signature() -> dict:
+    """描述基準測試環境的資訊；任何一項改變 (換電腦、升級函式庫) 都會讓舊結果失效。"""
+    return {
+        'machine': platform.node(),
+        'processor': platform.machine(),
+        'cpu_count': os.cpu_count() or 1,
+        'pillow': PIL.__version__,
+        'qt': QT_VERSION_STR,
+        'version': BENCHMARK_VERSION,
+    }
+
+
+def is_result_current(result: dict) -> bool:
+    return bool(result) and result.get('signature') == machine_signature()
+
+
+def choose_renderer(result: dict, os_type: str = None, plan: RenderPlan = None) -> str:
+    """
+    依基準測試結果選擇匯出渲染器。
+    結果不存在、已過期，或兩個渲染器的輸出差異超過容許值時，退回預設的渲染器；
+    指定渲染計畫時，計畫用到 Qt 渲染器無法重現的功能 (相框陰影) 則一律使用 PIL。
+    """
+    if plan is not None and not supports_plan(plan):
+        return 'pil'
+    if not is_result_current(result) or not result.get('consistent'):
+        return default_renderer(os_type)
+    return result.get('preferred') or default_renderer(os_type)
+
+
+def _synthetic_image(path: str, width: int, height: int):
+    """產生帶有漸層、斜紋與雜訊的測試圖片，讓解碼、縮放與模糊都有實際的工作量。"""
+    rng = np.random.default_rng(width * 31 + height)
+    y, x = np.mgrid[0:height, 0:width]
+    pixels = np.stack([x * 255 // width, y * 255 // height, ((x + y) * 3) % 256], axis=-1).astype(np.int16)
+    pixels += rng.integers(-12, 13, size=pixels.shape, dtype=np.int16)
+    Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(path, quality=92)
+
+
+def _as_rgba_array(output) -> np.ndarray:
+    if isinstance(output, Image.Image):
+        return np.asarray(output.convert('RGBA') if output.mode != 'RGBA' else output)
+    return np.asarray(encodable_view(output))
+
+
+def run_renderer_benchmark(progress_callback=None) -> dict:
+    """
+    以兩個渲染器渲染所有標準測試案例，量測耗時與輸出差異。
+    返回可直接寫入設定檔的結果字典。
+    """
+    timings = {name: 0.0 for name in RENDERERS}
+    cases = []
+    with tempfile.TemporaryDirectory(prefix='stellar-neo-bench-') as tmp_dir:
+        for index, (case_name, width, height, plan_args) in enumerate(BENCHMARK_CASES):
+            if progress_callback:
+                progress_callback(index, len(BENCHMARK_CASES), case_name)
+            path = os.path.join(tmp_dir, f"{case_name}.jpg")
+            _synthetic_image(path, width, height)
+            plan = RenderPlan(logo_enabled=False, text_enabled=False, frame_shadow=False, **plan_args)
+
+            outputs, case_times = {}, {}
+            for name, render in RENDERERS.items():
+                best = None
+                for _ in range(BENCHMARK_REPEAT):
+                    start = time.perf_counter()
+                    output = render(path, plan)
+                    elapsed = time.perf_counter() - start
+                    best = elapsed if best is None else min(best, elapsed)
+                outputs[name] = _as_rgba_array(output)
+                case_times[name] = best
+                timings[name] += best
+
+            a, b = outputs['pil'], outputs['qt']
+            if a.shape == b.shape:
+                mean_diff = float(np.abs(a.astype(np.int16) - b.astype(np.int16)).mean())
+            else:
+                mean_diff = 255.0
+            cases.append({
+                'name': case_name,
+                'size': [width, height],
+                'pil_ms': round(case_times['pil'] * 1000, 1),
+                'qt_ms': round(case_times['qt'] * 1000, 1),
+                'mean_diff': round(mean_diff, 3),
+            })
+
+    max_diff = max(case['mean_diff'] for case in cases)
+    preferred = min(timings, key=timings.get)
+    result = {
+        'signature': machine_signature(),
+        'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'pil_ms': round(timings['pil'] * 1000, 1),
+        'qt_ms': round(timings['qt'] * 1000, 1),
+        'max_mean_diff': round(max_diff, 3),
+        'consistent': max_diff <= RENDERER_DIFF_TOLERANCE,
+        'preferred': preferred,
+        'cases': cases,
+    }
+    print(f"[渲染器基準測試] PIL {result['pil_ms']} ms / Qt {result['qt_ms']} ms，"
+          f"最大平均差異 {result['max_mean_diff']}，選用 {choose_renderer(result)}")
+    return result
+
+
+class BenchmarkSignals(QObject):
+    progress = pyqtSignal(int, int, str)  # 目前案例, 總數, 案例名稱
+    finished = pyqtSignal(dict)  # 基準測試結果
+    error = pyqtSignal(str)
+
+
+class RendererBenchmarkTask(QRunnable):
+    """在執行緒池中執行渲染器基準測試 (兩個渲染器都可以在工作執行緒中使用)。"""
+
+    def __init__(self):
+        super().__init__()
+        self.signals = BenchmarkSignals()
+
+    def run(self):
+        try:
+            result = run_renderer_benchmark(self.signals.progress.emit)
+            self.signals.finished.emit(result)
+        except Exception as e:
+            print(f"渲染器基準測試失敗: {e}")
+            self.signals.error.emit(str(e))
@@ -0,0 +1,273 @@
+# core/tiled_renderer.py
+import os
+import struct
+import tempfile
+import threading
+import zlib
+
+import numpy as np
+from PIL import Image
+
+from core.pil_renderer import AllocationLedger, Canvas, Compositor, source_name
+from core.render_plan import RenderPlan
+
+# 原圖像素數超過此值時改用分帶渲染 (約 1 億像素；整張 RGBA 輸出緩衝區已達 400 MB 以上)
+TILED_RENDER_THRESHOLD = 100_000_000
+# 每次渲染並寫出的輸出列數
+TILED_BAND_ROWS = 256
+# PNG 過濾時每次處理的列數，用來限制 int16 暫存陣列的大小
+PNG_FILTER_ROWS = 16
+# 累積多少壓縮資料後寫出一個 IDAT 區塊
+PNG_IDAT_SIZE = 1 << 20
+# 分帶渲染接受的原圖像素數上限 (約 20 億像素)，取代 Pillow 的解壓縮炸彈保護 (約 1.8 億像素即拒絕)
+TILED_MAX_PIXELS = 2_000_000_000
+
+# Pillow 的像素上限是全域設定，暫時放寬時以此鎖避免多個執行緒互相還原成錯誤的值
+_pixel_limit_lock = threading.Lock()
+
+# 可以直接解碼到記憶體映射緩衝區的模式：(圖片模式, 緩衝區模式, 每像素位元組數)
+# Pillow 內部的 RGB 以每像素 4 位元組 (RGBX) 儲存，因此直接以 RGBX 映射
+_MAPPED_MODES = {
+    'RGB': ('RGBX', 4),
+    'RGBA': ('RGBA', 4),
+    'L': ('L', 1),
+}
+
+
+def open_large_image(image_path) -> Image.Image:
+    """
+    開啟可能超過 Pillow 解壓縮炸彈上限的圖片 (只讀取檔頭，尚未解碼)。
+    只在 Image.open 期間暫時解除 Pillow 的全域上限並立即還原，改以 TILED_MAX_PIXELS 檢查尺寸；
+    預覽、渲染服務等其他地方的解碼仍受 Pillow 預設的上限保護。
+    """
+    with _pixel_limit_lock:
+        limit = Image.MAX_IMAGE_PIXELS
+        Image.MAX_IMAGE_PIXELS = None
+        try:
+            img = Image.open(image_path)
+        finally:
+            Image.MAX_IMAGE_PIXELS = limit
+    if img.width * img.height > TILED_MAX_PIXELS:
+        img.close()
+        raise Image.DecompressionBombError(
+            f"圖片尺寸 {img.width}x{img.height} 超過上限 {TILED_MAX_PIXELS} 像素")
+    return img
+
+
+def needs_tiled_render(image_path) -> bool:
+    """只讀取檔頭，判斷圖片是否大到需要分帶渲染 (也接受可 seek 的檔案物件，讀完後會回到開頭)。"""
+    try:
+        with open_large_image(image_path) as img:
+            return img.width * img.height > TILED_RENDER_THRESHOLD
+    except Exception:
+        return False
+    finally:
+        if hasattr(image_path, 'seek'):
+            image_path.seek(0)
+
+
+class PngStreamWriter:
+    """
+    逐列寫出 RGBA PNG 的串流編碼器。
+    每次寫入一個水平帶，過濾後立即送入 zlib 並寫到檔案，記憶體用量只與圖片寬度有關。
+    path 也可以是已開啟的二進位檔案物件 (例如 io.BytesIO)，此時結束時不會關閉它。
+    """
+
+    def __init__(self, path, width: int, height: int, exif_bytes: bytes = None, compress_level: int = 6):
+        self.width, self.height = width, height
+        self.rows_written = 0
+        self._prev_row = np.zeros(width * 4, dtype=np.uint8)
+        self._compressor = zlib.compressobj(compress_level)
+        self._pending = []
+        self._pending_size = 0
+        self._owns_fp = isinstance(path, (str, os.PathLike))
+        self._fp = open(path, 'wb') if self._owns_fp else path
+        self._closed = False
+        self._fp.write(b'\x89PNG\r\n\x1a\n')
+        self._chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0))
+        if exif_bytes:
+            # 與 Pillow 相同：eXIf 區塊不包含 "Exif\0\0" 前綴
+            if exif_bytes[:6] == b'Exif\x00\x00':
+                exif_bytes = exif_bytes[6:]
+            self._chunk(b'eXIf', exif_bytes)
+
+    def _chunk(self, tag: bytes, data: bytes):
+        self._fp.write(struct.pack('>I', len(data)))
+        self._fp.write(tag)
+        self._fp.write(data)
+        self._fp.write(struct.pack('>I', zlib.crc32(data, zlib.crc32(tag)) & 0xFFFFFFFF))
+
+    def _emit(self, data: bytes, force: bool = False):
+        if data:
+            self._pending.append(data)
+            self._pending_size += len(data)
+        if self._pending_size >= PNG_IDAT_SIZE or (force and self._pending_size):
+            self._chunk(b'IDAT', b''.join(self._pending))
+            self._pending, self._pending_size = [], 0
+
+    def _paeth(self, rows: np.ndarray) -> bytes:
+        """對一組列套用 Paeth 過濾 (PNG 過濾類型 4)，返回帶有過濾類型位元組的資料。"""
+        cur = rows.astype(np.int16)
+        up = np.empty_like(cur)
+        up[0] = self._prev_row
+        up[1:] = cur[:-1]
+        left = np.zeros_like(cur)
+        left[:, 4:] = cur[:, :-4]
+        up_left = np.zeros_like(cur)
+        up_left[:, 4:] = up[:, :-4]
+
+        pa = np.abs(up - up_left)
+        pb = np.abs(left - up_left)
+        pc = np.abs(left + up - 2 * up_left)
+        predictor = np.where((pa <= pb) & (pa <= pc), left, np.where(pb <= pc, up, up_left))
+
+        filtered = np.empty((rows.shape[0], rows.shape[1] + 1), dtype=np.uint8)
+        filtered[:, 0] = 4
+        filtered[:, 1:] = (cur - predictor).astype(np.uint8)
+        self._prev_row = rows[-1].copy()
+        return filtered.tobytes()
+
+    def write(self, rows: np.ndarray):
+        """寫入一個 (列數, 寬度, 4) 的 uint8 RGBA 水平帶。"""
+        rows = rows.reshape(rows.shape[0], self.width * 4)
+        for start in range(0, rows.shape[0], PNG_FILTER_ROWS):
+            self._emit(self._compressor.compress(self._paeth(rows[start:start + PNG_FILTER_ROWS])))
+        self.rows_written += rows.shape[0]
+
+    def _release(self):
+        self._closed = True
+        if self._owns_fp:
+            self._fp.close()
+
+    def close(self):
+        if self._closed:
+            return
+        try:
+            if self.rows_written != self.height:
+                raise RuntimeError(f"PNG 串流寫入的列數不符：{self.rows_written} / {self.height}")
+            self._emit(self._compressor.flush(), force=True)
+            self._chunk(b'IEND', b'')
+        finally:
+            self._release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type:
+            self._release()
+        else:
+            self.close()
+
+
+class MappedSource:
+    """
+    將來源圖片解碼到磁碟上的暫存記憶體映射檔，而非一般的記憶體。
+    作業系統可以隨時將已讀過的分頁換出，因此常駐記憶體不會隨原圖尺寸增長；
+    之後的逐帶裁切只會讀取實際需要的列。
+    不支援直接映射的模式 (例如調色盤、CMYK) 會退回一般的記憶體解碼。
+    """
+
+    def __init__(self, image_path):
+        self._tmp = None
+        self._buffer = None
+        try:
+            img = open_large_image(image_path)
+            mapping = _MAPPED_MODES.get(img.mode)
+            if mapping is None:
+                img.load()
+                self.image = img.convert('RGBA')
+                return
+            buffer_mode, bpp = mapping
+            self._tmp = tempfile.TemporaryFile(prefix='stellar-neo-')
+            self._buffer = np.memmap(self._tmp, dtype=np.uint8, mode='w+', shape=(img.height, img.width, bpp))
+            mapped = Image.frombuffer(buffer_mode, img.size, self._buffer, 'raw', buffer_mode, 0, 1)
+            # 預先指定影像記憶體，Pillow 的解碼器便會直接寫入映射緩衝區
+            img.im = mapped.im
+            img.load()
+            # 未壓縮的檔案可能被 Pillow 直接映射原檔，此時沿用 Pillow 的影像即可
+            self.image = mapped if img.im is mapped.im else img
+        except Exception as e:
+            self.close()
+            raise RuntimeError(f"無法使用 Pillow 載入圖片 {source_name(image_path)}: {e}")
+
+    def close(self):
+        self.image = None
+        self._buffer = None
+        if self._tmp:
+            self._tmp.close()
+            self._tmp = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def render_with_pil_tiled(image_path, output_path, exif_data: dict, plan: RenderPlan,
+                          exif_bytes: bytes = None):
+    """
+    分帶渲染超大圖片並直接寫出 PNG。
+    原圖經由記憶體映射逐帶讀取，輸出每次只保留一個水平帶，
+    相框、陰影、模糊背景與浮水印都由同一個 Compositor 按帶繪製，
+    因此峰值記憶體只與圖片寬度有關，不隨總像素數增長。
+    來源與輸出都可以是檔案路徑或二進位檔案物件。
+    """
+    ledger = AllocationLedger()
+    with MappedSource(image_path) as mapped:
+        compositor = Compositor(mapped.image, exif_data, plan, ledger, streaming=True)
+        band = np.empty((TILED_BAND_ROWS, compositor.width, 4), dtype=np.uint8)
+        ledger.alloc(band.nbytes)
+        with PngStreamWriter(output_path, compositor.width, compositor.height, exif_bytes) as writer:
+            for top in range(0, compositor.height, TILED_BAND_ROWS):
+                rows = band[:min(TILED_BAND_ROWS, compositor.height - top)]
+                rows.fill(0)
+                compositor.paint(Canvas(rows, top, ledger))
+                writer.write(rows)
+
+    print(f"[分帶渲染] {source_name(image_path)}: {compositor.width}x{compositor.height}，"
+          f"峰值配置約 {ledger.peak / 1024 ** 2:.1f} MB")
+    return output_path
+
+
+def _flatten_rows(rows: np.ndarray, background):
+    """將一個 RGBA 水平帶原地與不透明的背景色合成 (與 Image.paste 以 alpha 為遮罩的結果相同)。"""
+    alpha = rows[..., 3:4].astype(np.uint16)
+    color = np.array(background[:3], dtype=np.uint16)
+    rows[..., :3] = (rows[..., :3] * alpha + color * (255 - alpha) + 127) // 255
+    rows[..., 3] = 255
+
+
+def render_with_pil_tiled_encoded(image_path, output, exif_data: dict, plan: RenderPlan, output_format: str,
+                                  save_args: dict = None, background=None):
+    """
+    分帶渲染超大圖片並編碼為 PNG 以外的格式 (JPEG、WEBP、TIFF)。
+    這些格式的編碼器無法逐帶寫入，因此輸出先逐帶寫到磁碟上的暫存記憶體映射檔，再整張交給 Pillow 編碼；
+    映射檔的分頁隨時可以換出，常駐記憶體不隨總像素數增長 (WEBP 的編碼器本身仍需要整張圖片大小的記憶體)。
+    background 不為 None 時 (不支援透明度的格式)，每個帶在寫入前先與該顏色合成。
+    """
+    ledger = AllocationLedger()
+    with MappedSource(image_path) as mapped, tempfile.TemporaryFile(prefix='stellar-neo-') as tmp:
+        compositor = Compositor(mapped.image, exif_data, plan, ledger, streaming=True)
+        width, height = compositor.width, compositor.height
+        pixels = np.memmap(tmp, dtype=np.uint8, mode='w+', shape=(height, width, 4))
+        band = np.empty((TILED_BAND_ROWS, width, 4), dtype=np.uint8)
+        ledger.alloc(band.nbytes)
+        for top in range(0, height, TILED_BAND_ROWS):
+            rows = band[:min(TILED_BAND_ROWS, height - top)]
+            rows.fill(0)
+            compositor.paint(Canvas(rows, top, ledger))
+            if background is not None:
+                _flatten_rows(rows, background)
+            pixels[top:top + rows.shape[0]] = rows
+        # RGBX 與 RGBA 都能直接共用映射檔的記憶體，編碼時不會再複製一份
+        mode = 'RGBA' if background is None else 'RGBX'
+        image = Image.frombuffer(mode, (width, height), pixels, 'raw', mode, 0, 1)
+        image.save(output, format=output_format, **(save_args or {}))
+        # 先釋放對映射檔的引用，暫存檔才能關閉
+        del image, pixels
+
+    print(f"[分帶渲染] {source_name(image_path)}: {width}x{height} ({output_format})，"
+          f"峰值配置約 {ledger.peak / 1024 ** 2:.1f} MB")
+    return output
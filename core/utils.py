@@ -113,3 +113,18 @@ def get_os_type():
     elif 'darwin' in system:
         return 'darwin'
     return 'unknown'
+
+
+def format_bytes(num_bytes: float) -> str:
+    """以最接近的單位顯示位元組數，例如 1.5 GB。"""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(num_bytes) < 1024:
+            return f"{num_bytes:.0f} {unit}" if unit == 'B' else f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+    return f"{num_bytes:.1f} TB"
+
+
+def format_duration(seconds: float) -> str:
+    """以 時:分:秒 顯示時間長度。"""
+    seconds = int(round(seconds))
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
@@ -0,0 +1,165 @@
+# core/watermark_resources.py
+import os
+from collections import OrderedDict
+from pathlib import Path
+
+from PyQt6.QtCore import Qt
+from PyQt6.QtGui import QFont, QFontMetrics, QPixmap
+
+from core.logo_mapping import get_logo_path
+
+# 各類資源快取的項目數上限；Logo 與字體都很小，以項目數限制即可
+LOGO_CACHE_ENTRIES = 32
+FONT_CACHE_ENTRIES = 32
+EXIF_TEXT_CACHE_ENTRIES = 512
+
+
+def _cache_get(cache: OrderedDict, key):
+    value = cache.get(key)
+    if value is not None:
+        cache.move_to_end(key)
+    return value
+
+
+def _cache_put(cache: OrderedDict, key, value, max_entries: int):
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > max_entries:
+        cache.popitem(last=False)
+    return value
+
+
+def _stat_signature(path) -> tuple:
+    """檔案或目錄的 (大小, 修改時間)；目錄中新增、刪除檔案時修改時間會改變。"""
+    try:
+        stat = os.stat(path)
+        return stat.st_size, stat.st_mtime_ns
+    except OSError:
+        return None
+
+
+class WatermarkResources:
+    """
+    預覽浮水印使用的資源快取：解析後的 Logo 路徑、依高度縮放的 Logo、字體與字體度量，以及每張圖片的 EXIF 文字。
+    鍵值包含相關的設定與素材目錄 / 檔案的修改時間，設定或素材檔改變時自然不再命中；
+    因此只調整顏色或文字時不會再列出目錄、比對鍵值或從磁碟載入 Logo。
+    只在 GUI 執行緒中使用。
+    """
+
+    def __init__(self, asset_manager):
+        self.asset_manager = asset_manager
+        self._logo_paths = OrderedDict()  # (來源, 鍵值, 目錄狀態) -> 路徑
+        self._logo_pixmaps = OrderedDict()  # (路徑, 檔案狀態, 高度) -> QPixmap；高度 0 為原始大小
+        self._font_families = OrderedDict()  # (來源, 鍵值, 使用者字體數) -> 家族名稱
+        self._fonts = OrderedDict()  # (家族, 大小) -> (QFont, QFontMetrics)
+        self._exif_texts = OrderedDict()  # (圖片路徑, 勾選的欄位) -> 文字
+
+    def logo_path(self, w_settings: dict, exif_data: dict):
+        """依 Logo 來源設定解析 Logo 路徑；找不到時返回 None。"""
+        logo_source = w_settings.get('logo_source', 'auto_detect')
+        if logo_source == 'auto_detect':
+            logos_dir = str(self.asset_manager.default_logos_dir)
+            key = (logo_source, exif_data.get('Make', ''), _stat_signature(logos_dir))
+            resolve = lambda: get_logo_path(exif_data.get('Make', ''), logos_dir)
+        elif logo_source == 'select_from_library':
+            logo_key = w_settings.get('logo_source_app', '')
+            key = (logo_source, logo_key, _stat_signature(self.asset_manager.default_logos_dir))
+            resolve = lambda: next(
+                (p for p in self.asset_manager.get_default_logos() if Path(p).stem == logo_key), None)
+        elif logo_source == 'my_custom_logo':
+            logo_key = w_settings.get('logo_source_my_custom', '')
+            key = (logo_source, logo_key, _stat_signature(self.asset_manager.user_logos_dir))
+            resolve = lambda: next((p for p in self.asset_manager.get_user_logos() if
+                                    self.asset_manager._create_key_from_name(Path(p).stem) == logo_key), None)
+        else:
+            return None
+
+        if key in self._logo_paths:
+            self._logo_paths.move_to_end(key)
+            return self._logo_paths[key]
+        return _cache_put(self._logo_paths, key, resolve(), LOGO_CACHE_ENTRIES)
+
+    def logo_pixmap(self, path: str, height: int):
+        """返回縮放到指定高度的 Logo；檔案被替換後會重新載入。無法載入時返回 None。"""
+        signature = _stat_signature(path)
+        if signature is None:
+            return None
+        key = (path, signature, height)
+        scaled = _cache_get(self._logo_pixmaps, key)
+        if scaled is not None:
+            return scaled
+        source = _cache_get(self._logo_pixmaps, (path, signature, 0))
+        if source is None:
+            source = QPixmap(path)
+            if source.isNull():
+                return None
+            _cache_put(self._logo_pixmaps, (path, signature, 0), source, LOGO_CACHE_ENTRIES)
+        scaled = source.scaledToHeight(height, Qt.TransformationMode.SmoothTransformation)
+        return _cache_put(self._logo_pixmaps, key, scaled, LOGO_CACHE_ENTRIES)
+
+    def font_family(self, w_settings: dict) -> str:
+        """依字體設定返回實際的字體家族名稱。"""
+        font_source = w_settings.get('font_family', 'system')
+        if font_source == 'system':
+            font_key = w_settings.get('font_system', '')
+            # 字體索引在背景建立，建立完成 (或重新整理) 後版本改變，先前的暫代結果便不再命中
+            index = self.asset_manager.font_index
+            key = (font_source, font_key, index.generation if index.loaded else None)
+        elif font_source == 'my_custom':
+            font_key = w_settings.get('font_my_custom', '')
+            # 使用者字體載入後才會出現在映射中，以映射的大小判斷是否有新增或刪除
+            key = (font_source, font_key, len(self.asset_manager.get_user_fonts()))
+        else:
+            return "Arial"
+
+        family = _cache_get(self._font_families, key)
+        if family is not None:
+            return family
+        family = "Arial"
+        if font_source == 'system':
+            # 設定中存的是字體鍵值，透過字體索引還原成實際的家族名稱；索引尚未建立時不等待，暫以鍵值代替
+            resolved = self.asset_manager.resolve_system_font(font_key, wait=False)
+            family = resolved[2] if resolved else (font_key or "Arial")
+        else:
+            for path, families in self.asset_manager.get_user_fonts().items():
+                if self.asset_manager._create_key_from_name(Path(path).stem) == font_key:
+                    family = families[0] if families else "Arial"
+                    break
+        return _cache_put(self._font_families, key, family, FONT_CACHE_ENTRIES)
+
+    def font(self, family: str, size: int) -> tuple[QFont, QFontMetrics]:
+        """返回 (字體, 字體度量)，同一家族與大小只建立一次。"""
+        key = (family, size)
+        cached = _cache_get(self._fonts, key)
+        if cached is not None:
+            return cached
+        font = QFont(family, size)
+        return _cache_put(self._fonts, key, (font, QFontMetrics(font)), FONT_CACHE_ENTRIES)
+
+    def exif_text(self, image_path: str, exif_data: dict, exif_options: dict) -> str:
+        """依勾選的欄位組合 EXIF 浮水印文字，每張圖片與欄位組合只格式化一次。"""
+        key = (image_path, tuple(sorted(name for name, enabled in exif_options.items() if enabled)))
+        text = _cache_get(self._exif_texts, key)
+        if text is not None:
+            return text
+        parts = []
+        if exif_options.get('model') and exif_data.get('Model'): parts.append(exif_data['Model'])
+        if exif_options.get('focal_length') and exif_data.get('FocalLength'): parts.append(
+            f"{exif_data['FocalLength']}mm")
+        if exif_options.get('aperture') and exif_data.get('FNumber'): parts.append(f"f/{exif_data['FNumber']}")
+        if exif_options.get('shutter') and exif_data.get('ExposureTime'): parts.append(
+            f"{exif_data['ExposureTime']}s")
+        if exif_options.get('iso') and exif_data.get('ISO'): parts.append(f"ISO {exif_data['ISO']}")
+        return _cache_put(self._exif_texts, key, "  ".join(parts), EXIF_TEXT_CACHE_ENTRIES)
+
+    def forget_image(self, image_path: str):
+        """圖片從圖庫移除時丟棄它的 EXIF 文字；重新加入時會重新讀取 EXIF。"""
+        for key in [k for k in self._exif_texts if k[0] == image_path]:
+            del self._exif_texts[key]
+
+    def clear(self):
+        self._logo_paths.clear()
+        self._logo_pixmaps.clear()
+        self._font_families.clear()
+        self._fonts.clear()
+        self._exif_texts.clear()
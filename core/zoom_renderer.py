@@ -0,0 +1,144 @@
+# core/zoom_renderer.py
+import time
+
+import numpy as np
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+from PyQt6.QtGui import QImage
+
+from core.pil_renderer import Canvas, Compositor, source_name
+from core.qt_bridge import qimage_from_array
+from core.render_plan import RenderPlan
+from core.tiled_renderer import MappedSource
+
+# 1:1 檢視時在可見區域四周多渲染的範圍 (相對於可見區域的寬高)，小幅平移時不必重新渲染
+ZOOM_REGION_MARGIN = 0.125
+
+
+def expand_region(box, margin: float, width: int, height: int) -> tuple[int, int, int, int]:
+    """將可見區域向四周擴大 margin 倍的寬高，並裁切到輸出影像範圍內 (整數像素)。"""
+    x0, y0, x1, y1 = box
+    dx, dy = (x1 - x0) * margin, (y1 - y0) * margin
+    return (max(0, int(x0 - dx)), max(0, int(y0 - dy)),
+            min(width, int(x1 + dx + 1)), min(height, int(y1 + dy + 1)))
+
+
+def region_covers(outer, inner) -> bool:
+    return outer is not None and outer[0] <= inner[0] and outer[1] <= inner[1] and \
+        outer[2] >= inner[2] and outer[3] >= inner[3]
+
+
+class RegionRenderer:
+    """
+    以匯出用的 PIL 合成器，在輸出解析度下渲染輸出影像中的任意矩形區域。
+    來源與分帶渲染相同，解碼到記憶體映射檔後只讀取區域實際需要的像素；
+    Pillow 無法只解碼 JPEG 的一部分，因此開啟時會完整解碼一次，之後每個區域只需處理可見範圍的像素。
+    設定改變時只重建合成器 (佈局、模糊背景工作圖與浮水印)，不重新解碼來源。
+    合成器不使用分帶渲染的串流模式：Logo 與模糊背景工作圖在建立時縮放一次，之後的每個區域直接沿用。
+    """
+
+    def __init__(self, image_path):
+        start = time.perf_counter()
+        self.image_path = image_path
+        self.source = MappedSource(image_path)
+        self.compositor = None
+        self._plan_key = None
+        print(f"[1:1 檢視] {source_name(image_path)}: 來源解碼 {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    def prepare(self, plan: RenderPlan, exif_data: dict) -> tuple[int, int]:
+        """依渲染計畫建立合成器 (計畫未變時沿用)，返回輸出尺寸。"""
+        plan_key = plan.fingerprint()
+        if plan_key != self._plan_key:
+            self.compositor = Compositor(self.source.image, exif_data, plan)
+            self._plan_key = plan_key
+        return self.compositor.width, self.compositor.height
+
+    def render(self, box) -> QImage:
+        """渲染輸出座標系中的 (x0, y0, x1, y1) 區域。"""
+        x0, y0, x1, y1 = box
+        buffer = np.zeros((y1 - y0, x1 - x0, 4), dtype=np.uint8)
+        self.compositor.paint(Canvas(buffer, y0, left=x0))
+        return qimage_from_array(buffer).copy()
+
+    def close(self):
+        self.source.close()
+
+
+class ZoomSignals(QObject):
+    rendered = pyqtSignal(int, object, object)  # 請求編號, 區域 (x0, y0, x1, y1), QImage
+    failed = pyqtSignal(int, str)
+
+
+class ZoomRegionTask(QRunnable):
+    """在背景執行緒中渲染一個區域；開始前已被更新的請求取代時直接略過。"""
+
+    def __init__(self, worker, request_id: int, image_path: str, plan: RenderPlan, exif_data: dict, box):
+        super().__init__()
+        self.worker = worker
+        self.request_id = request_id
+        self.image_path = image_path
+        self.plan = plan
+        self.exif_data = exif_data
+        self.box = box
+
+    def run(self):
+        if self.request_id != self.worker.latest_request:
+            return
+        try:
+            start = time.perf_counter()
+            renderer = self.worker._renderer_for(self.image_path)
+            width, height = renderer.prepare(self.plan, self.exif_data)
+            x0, y0, x1, y1 = self.box
+            box = (max(0, x0), max(0, y0), min(width, x1), min(height, y1))
+            if box[0] >= box[2] or box[1] >= box[3]:
+                return
+            image = renderer.render(box)
+            print(f"[1:1 檢視] 區域 {box[2] - box[0]}x{box[3] - box[1]}: "
+                  f"{(time.perf_counter() - start) * 1000:.0f} ms")
+            self.worker.signals.rendered.emit(self.request_id, box, image)
+        except Exception as e:
+            print(f"無法渲染 1:1 檢視區域: {e}")
+            self.worker.signals.failed.emit(self.request_id, str(e))
+
+
+class ZoomWorker(QObject):
+    """
+    1:1 檢視的背景渲染器，在主執行緒中使用。
+    所有渲染都在同一個執行緒中依序進行，開啟的來源 (記憶體映射) 只在該執行緒中使用；
+    新的請求會移除排隊中的舊請求，因此快速平移時只渲染最後停下的位置。
+    """
+    rendered = pyqtSignal(int, object, object)  # 請求編號, 區域, QImage
+    failed = pyqtSignal(int, str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        self.signals = ZoomSignals()
+        self.signals.rendered.connect(self.rendered)
+        self.signals.failed.connect(self.failed)
+        self.latest_request = 0
+        self._renderer = None  # 只在工作執行緒中存取
+
+    def request(self, image_path: str, plan: RenderPlan, exif_data: dict, box) -> int:
+        """要求渲染一個區域，返回請求編號 (單調遞增)。"""
+        self.pool.clear()
+        self.latest_request += 1
+        self.pool.start(ZoomRegionTask(self, self.latest_request, image_path, plan, exif_data, box))
+        return self.latest_request
+
+    def close(self):
+        """離開 1:1 檢視：取消排隊中的請求，並在工作執行緒中釋放來源。"""
+        self.pool.clear()
+        self.latest_request += 1
+        self.pool.start(self._close_renderer)
+
+    def _renderer_for(self, image_path: str) -> RegionRenderer:
+        if self._renderer is None or self._renderer.image_path != image_path:
+            self._close_renderer()
+            self._renderer = RegionRenderer(image_path)
+        return self._renderer
+
+    def _close_renderer(self):
+        if self._renderer is not None:
+            self._renderer.close()
+            self._renderer = None
@@ -1,3 +1,5 @@
+import argparse
+import json
 import os
 import sys
 
@@ -49,10 +51,93 @@ def setup_application(app: QApplication):
         print(f"錯誤: 無法讀取樣式表檔案: {e}")
 
 
+# 無視窗模式的子命令
+CLI_COMMANDS = ("serve", "enqueue", "worker", "status", "estimate")
+
+
+def build_cli_parser() -> argparse.ArgumentParser:
+    """無視窗模式的命令列參數；沒有指定子命令時啟動圖形介面。"""
+    parser = argparse.ArgumentParser(prog="stellar-neo")
+    commands = parser.add_subparsers(dest="command")
+
+    serve = commands.add_parser("serve", help="啟動本機 HTTP 渲染服務 (只監聽 127.0.0.1)")
+    serve.add_argument("--port", type=int, default=8765, help="監聽的連接埠 (預設 8765)")
+    serve.add_argument("--workers", type=int, default=None, help="渲染工作執行緒數 (預設為 CPU 核心數 - 1)")
+    serve.add_argument("--max-queue", type=int, default=16, help="工作執行緒全忙時最多排隊的請求數 (預設 16)")
+    serve.add_argument("--allow-origin", action="append", default=[], metavar="ORIGIN",
+                       help="允許跨來源呼叫的網頁來源，例如 http://localhost:3000 (可重複指定)")
+    serve.add_argument("--max-pixels", type=int, default=150_000_000,
+                       help="上傳圖片的像素數上限，超過時回應 413 (預設 1.5 億)")
+
+    enqueue = commands.add_parser("enqueue", help="在共用目錄中建立匯出工作 (使用目前儲存的相框與浮水印設定)")
+    enqueue.add_argument("job_dir", help="工作目錄 (所有工作者都能存取的共用目錄)")
+    enqueue.add_argument("images", nargs="+", help="要匯出的圖片")
+    enqueue.add_argument("--output", default=None, help="輸出目錄 (預設為工作目錄下的 output)")
+    enqueue.add_argument("--format", default="PNG", help="輸出格式：PNG、JPEG、WEBP 或 TIFF (預設 PNG)")
+    enqueue.add_argument("--quality", type=int, default=95, help="JPEG / WEBP 品質 (預設 95)")
+
+    worker = commands.add_parser("worker", help="從共用工作目錄領取並匯出項目 (可在多台主機上同時執行)")
+    worker.add_argument("job_dir", help="工作目錄")
+    worker.add_argument("--concurrency", type=int, default=None, help="同時處理的項目數 (預設為 CPU 核心數 - 1)")
+    worker.add_argument("--lease-timeout", type=float, default=300, help="租約逾時秒數，逾時的項目回到佇列 (預設 300)")
+    worker.add_argument("--exit-when-empty", action="store_true", help="所有項目都處理完畢後結束")
+
+    status = commands.add_parser("status", help="顯示共用工作目錄中各狀態的項目數")
+    status.add_argument("job_dir", help="工作目錄")
+
+    estimate = commands.add_parser("estimate", help="試算匯出的耗時、記憶體峰值與輸出大小 (只讀取檔頭)")
+    estimate.add_argument("images", nargs="+", help="要匯出的圖片")
+    estimate.add_argument("--output", default=None, help="輸出目錄，用於檢查可用空間")
+    estimate.add_argument("--format", default="PNG", help="輸出格式 (預設 PNG)")
+    return parser
+
+
+def run_cli(argv: list[str]) -> bool:
+    """執行無視窗的子命令；argv 不是子命令時返回 False，交由圖形介面處理 (其中可能包含 Qt 的參數)。"""
+    if not argv or argv[0] not in CLI_COMMANDS:
+        return False
+    args = build_cli_parser().parse_args(argv)
+    if args.command == "serve":
+        from core.render_server import run_server
+        run_server(port=args.port, workers=args.workers, max_queue=args.max_queue,
+                   allowed_origins=args.allow_origin, max_pixels=args.max_pixels)
+    elif args.command == "enqueue":
+        from core.job_queue import create_job
+        from core.settings_manager import SettingsManager
+        settings = SettingsManager().get("gallery_settings") or {}
+        count = create_job(args.job_dir, args.images, settings, args.output, args.format, args.quality)
+        print(f"已建立 {count} 個匯出項目：{args.job_dir}")
+    elif args.command == "worker":
+        from core.job_queue import run_worker
+        run_worker(args.job_dir, concurrency=args.concurrency, lease_timeout=args.lease_timeout,
+                   exit_when_empty=args.exit_when_empty)
+    elif args.command == "status":
+        from core.job_queue import job_status
+        print(json.dumps(job_status(args.job_dir), ensure_ascii=False))
+    elif args.command == "estimate":
+        from core.export_estimator import ExportTelemetry, estimate_export
+        from core.export_worker import export_thread_count
+        from core.render_api import compile_plan
+        from core.settings_manager import SettingsManager
+        from core.utils import format_bytes, format_duration
+        plan = compile_plan(SettingsManager().get("gallery_settings") or {})
+        result = estimate_export(args.images, plan, args.output, args.format, 'pil', export_thread_count(),
+                                 ExportTelemetry())
+        print(f"{result.count} 張圖片，預估耗時 {format_duration(result.seconds)}，"
+              f"記憶體峰值約 {format_bytes(result.peak_bytes)}，輸出約 {format_bytes(result.output_bytes)}")
+        if result.free_bytes is not None:
+            print(f"可用空間 {format_bytes(result.free_bytes)}" + ("" if result.fits_disk else "，空間不足！"))
+    return True
+
+
 def main():
     """
     應用程式主入口點。
     """
+    # 無視窗模式 (渲染服務等) 不建立主視窗
+    if run_cli(sys.argv[1:]):
+        return
+
     # 平台修補
     patch_qt_platform()
 
@@ -0,0 +1,66 @@
+import os
+import sys
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pytest
+from PyQt6.QtCore import QRectF, Qt
+from PyQt6.QtGui import QColor, QImage, QPainter
+from PyQt6.QtWidgets import QApplication
+
+from core.pil_renderer import RoundedRectPatch
+from ui.customs.shadow_item import BLUR_RADIUS_PER_SIGMA, ShadowItem, _shadow_patches
+
+
+@pytest.fixture(scope='module', autouse=True)
+def app():
+    return QApplication.instance() or QApplication([])
+
+
+@pytest.fixture(autouse=True)
+def empty_patch_cache():
+    _shadow_patches.clear()
+    yield
+    _shadow_patches.clear()
+
+
+def _paint_alpha(item: ShadowItem) -> np.ndarray:
+    bounds = item.boundingRect()
+    image = QImage(int(bounds.width()), int(bounds.height()), QImage.Format.Format_ARGB32_Premultiplied)
+    image.fill(Qt.GlobalColor.transparent)
+    painter = QPainter(image)
+    item.paint(painter, None)
+    painter.end()
+    pixels = np.frombuffer(image.constBits().asstring(image.sizeInBytes()), dtype=np.uint8)
+    return pixels.reshape(image.height(), image.bytesPerLine())[:, :image.width() * 4].reshape(
+        image.height(), image.width(), 4)[..., 3]
+
+
+@pytest.mark.parametrize('width, height', [(400, 300), (1000, 500)])
+def test_resize_with_same_radius_updates_bounds(width, height):
+    blur = 40
+    first = ShadowItem(blur, QColor(0, 0, 0, 100))
+    first.set_rect(QRectF(0, 0, 800, 600), 10)
+    assert first.boundingRect() == QRectF(0, 0, 800 + blur * 2, 600 + blur * 2)
+
+    # 同一個物件改變尺寸，以及新物件沿用快取中的小圖，都必須以新的尺寸計算
+    first.set_rect(QRectF(0, 0, width, height), 10)
+    second = ShadowItem(blur, QColor(0, 0, 0, 100))
+    second.set_rect(QRectF(0, 0, width, height), 10)
+    for item in (first, second):
+        assert item.boundingRect() == QRectF(0, 0, width + blur * 2, height + blur * 2)
+
+
+def test_cached_patch_paints_requested_shape():
+    blur = 40
+    ShadowItem(blur, QColor(0, 0, 0, 100)).set_rect(QRectF(0, 0, 800, 600), 10)
+    item = ShadowItem(blur, QColor(0, 0, 0, 100))
+    item.set_rect(QRectF(0, 0, 400, 300), 10)
+
+    expected = RoundedRectPatch(400, 300, 10, blur, blur / BLUR_RADIUS_PER_SIGMA, 100)
+    reference = expected.alpha(0, 0, expected.width, expected.height)
+    painted = _paint_alpha(item)
+    assert painted.shape == reference.shape
+    assert np.abs(painted.astype(np.int16) - reference.astype(np.int16)).max() <= 1
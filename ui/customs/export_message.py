@@ -5,6 +5,7 @@ from core.translator import Translator
 class ExportMessageBox(MessageBoxBase):
     cancelExport = pyqtSignal()
     exportError = pyqtSignal()
+    runInBackground = pyqtSignal()
 
     def __init__(self, translator: Translator, parent=None, current: int = 0, total: int = 100):
         super().__init__(parent)
@@ -29,9 +30,9 @@ class ExportMessageBox(MessageBoxBase):
 
         # 设置对话框的最小宽度
         self.widget.setMinimumWidth(400)
-        # 隱藏確認按鈕
-        self.yesButton.hide()
-        self.buttonLayout.insertStretch(0, 1)
+        # 確認按鈕改為「背景執行」：關閉對話框，導出以低優先權繼續進行，使用者可以繼續編輯
+        self.yesButton.setText(self.tr('export_in_background', 'Run in Background'))
+        self.yesButton.clicked.connect(self.runInBackground)
         # 取消按鈕
         self.cancelButton.setText(self.tr('cancel', 'Cancel'))
         self.cancelButton.clicked.connect(self._on_cancel_export)
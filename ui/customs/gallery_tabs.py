@@ -21,6 +21,13 @@ class GalleryTabs(QWidget):
         - 發出的信號只包含已變更的設定，以供 view_gallery 進行策略性更新。
     """
     settingsChanged = pyqtSignal(dict)  # 信號現在會攜帶一個包含變更的字典
+    # 使用者按住 (True) 或放開 (False) 會觸發完整重繪的滑桿；預覽在拖動期間改用較低的品質
+    interactionChanged = pyqtSignal(bool)
+
+    # 一般情況下的延遲更新時間 (毫秒)
+    UPDATE_INTERVAL_MS = 150
+    # 拖動滑桿期間的更新間隔 (毫秒)：約每個畫面更新一次，讓預覽跟著滑桿移動
+    DRAG_UPDATE_INTERVAL_MS = 16
 
     # 接收 translator
     def __init__(self, asset_manager: AssetManager, settings: SettingsManager, translator: Translator, parent=None):
@@ -67,7 +74,7 @@ class GalleryTabs(QWidget):
 
         # --- 新增：設定計時器 ---
         self.update_timer.setSingleShot(True)
-        self.update_timer.setInterval(150)  # 150毫秒的延遲
+        self.update_timer.setInterval(self.UPDATE_INTERVAL_MS)  # 150毫秒的延遲
         self.update_timer.timeout.connect(self._emit_changes)
 
         # 首次載入後，快取初始設定
@@ -236,6 +243,22 @@ class GalleryTabs(QWidget):
             # 所有控制項的信號都只觸發計時器，而不是直接處理
             getattr(control, signal_name).connect(self._request_update)
 
+        # 會觸發完整重繪的滑桿：按住時進入拖動模式，放開時立即套用最後的數值
+        for slider in (f.frame_radius_slider, f.photo_radius_slider, f.padding_top_slider, f.padding_sides_slider,
+                       f.padding_bottom_slider, f.frame_blur_slider, w.font_size_slider):
+            slider.sliderPressed.connect(self._on_slider_pressed)
+            slider.sliderReleased.connect(self._on_slider_released)
+
+    def _on_slider_pressed(self):
+        self.update_timer.setInterval(self.DRAG_UPDATE_INTERVAL_MS)
+        self.interactionChanged.emit(True)
+
+    def _on_slider_released(self):
+        self.update_timer.stop()
+        self.update_timer.setInterval(self.UPDATE_INTERVAL_MS)
+        self._emit_changes()
+        self.interactionChanged.emit(False)
+
     def _request_update(self):
         """當任何設定改變時，這個槽函數會被呼叫，它的唯一作用是啟動或重置計時器。"""
         self.update_timer.start()
@@ -0,0 +1,106 @@
+import math
+
+import numpy as np
+from PyQt6.QtCore import QRectF
+from PyQt6.QtGui import QColor, QImage, QPainter, QPixmap
+from PyQt6.QtWidgets import QGraphicsItem
+
+from core.pil_renderer import RoundedRectPatch
+
+# Qt 的 QGraphicsDropShadowEffect 的模糊半徑約為高斯模糊標準差的三倍，
+# 以此換算讓預先計算的陰影與原本的效果看起來一致
+BLUR_RADIUS_PER_SIGMA = 3.0
+# 九宮格小圖的快取項目數上限 (每張只有數百像素見方)
+SHADOW_PATCH_CACHE_ENTRIES = 32
+
+# (圓角, 模糊半徑, 顏色[, 寬, 高]) -> (QPixmap 小圖, 小圖寬, 小圖高, 橫向角落寬, 縱向角落高)
+# 只保存與尺寸無關的部分；角落寬高為 None 時該軸沒有中段 (小圖即完整尺寸，只適用於同一尺寸)
+_shadow_patches = {}
+
+
+def _shadow_patch(width: int, height: int, radius: int, blur_radius: int, color: QColor):
+    """
+    返回陰影的九宮格小圖 (四個角落 + 一像素的中段)：(QPixmap, 小圖寬, 小圖高, 橫向角落寬, 縱向角落高)。
+    形狀夠大時小圖與尺寸無關，同樣的圓角、模糊半徑與顏色只模糊一次；形狀太小時才依尺寸分別計算。
+    """
+    shared_key = (radius, blur_radius, color.rgba())
+    cached = _shadow_patches.get(shared_key)
+    if cached and width + blur_radius * 2 > cached[1] and height + blur_radius * 2 > cached[2]:
+        return cached
+    sized_key = shared_key + (width, height)
+    cached = _shadow_patches.get(sized_key)
+    if cached:
+        return cached
+
+    patch = RoundedRectPatch(width, height, radius, blur_radius, blur_radius / BLUR_RADIUS_PER_SIGMA, color.alpha())
+    # 以預乘的 ARGB32 (記憶體中為 BGRA) 建立帶顏色的小圖
+    alpha = patch.mini.astype(np.uint16)
+    pixels = np.empty((patch.mini_h, patch.mini_w, 4), dtype=np.uint8)
+    for channel, value in enumerate((color.blue(), color.green(), color.red())):
+        pixels[..., channel] = (alpha * value + 127) // 255
+    pixels[..., 3] = patch.mini
+    image = QImage(pixels.data, patch.mini_w, patch.mini_h, patch.mini_w * 4,
+                   QImage.Format.Format_ARGB32_Premultiplied).copy()
+
+    if len(_shadow_patches) >= SHADOW_PATCH_CACHE_ENTRIES:
+        _shadow_patches.pop(next(iter(_shadow_patches)))
+    cached = (QPixmap.fromImage(image), patch.mini_w, patch.mini_h, patch.core_x, patch.core_y)
+    _shadow_patches[shared_key if patch.core_x and patch.core_y else sized_key] = cached
+    return cached
+
+
+def _segments(full: int, mini: int, core):
+    """一個軸向上的 (目標起點, 目標終點, 來源起點, 來源終點)；中段由小圖中一像素寬的直邊拉伸而成。"""
+    if core is None:
+        return [(0, full, 0, full)]
+    return [(0, core, 0, core), (core, full - core, core, core + 1), (full - core, full, mini - core, mini)]
+
+
+class ShadowItem(QGraphicsItem):
+    """
+    以九宮格小圖繪製的圓角矩形陰影，取代 QGraphicsDropShadowEffect。
+    陰影只在形狀改變時重新計算 (且通常直接命中快取)，平移、縮放與一般重繪只是貼上幾塊小圖，不會重新模糊。
+    """
+
+    def __init__(self, blur_radius: int, color: QColor, offset: tuple[float, float] = (0, 0), parent=None):
+        super().__init__(parent)
+        self.blur_radius = blur_radius
+        self.color = QColor(color)
+        self.offset = offset
+        self._shape = None  # (寬, 高, 圓角)
+        self._pixmap = None
+        self._pieces = []  # [(目標矩形, 來源矩形)]
+        self._bounds = QRectF()
+
+    def set_rect(self, rect: QRectF, radius: float):
+        """設定陰影對應的形狀 (場景座標)；尺寸與圓角不變時只移動位置。"""
+        pad = self.blur_radius
+        self.setPos(rect.left() + self.offset[0] - pad, rect.top() + self.offset[1] - pad)
+        shape = (max(1, int(round(rect.width()))), max(1, int(round(rect.height()))), int(math.ceil(radius)))
+        if shape == self._shape:
+            return
+        self.prepareGeometryChange()
+        self._shape = shape
+        width, height, radius = shape
+        self._pixmap, mini_w, mini_h, core_x, core_y = _shadow_patch(width, height, radius, pad, self.color)
+        # 小圖可能來自其他尺寸的形狀，拉伸範圍必須以這次的形狀 (加上四周的模糊範圍) 計算
+        full_w, full_h = width + pad * 2, height + pad * 2
+        xs = _segments(full_w, mini_w, core_x)
+        ys = _segments(full_h, mini_h, core_y)
+        self._pieces = [(QRectF(tx0, ty0, tx1 - tx0, ty1 - ty0), QRectF(sx0, sy0, sx1 - sx0, sy1 - sy0))
+                        for ty0, ty1, sy0, sy1 in ys for tx0, tx1, sx0, sx1 in xs]
+        self._bounds = QRectF(0, 0, full_w, full_h)
+        self.update()
+
+    def boundingRect(self) -> QRectF:
+        return self._bounds
+
+    def paint(self, painter: QPainter, option, widget=None):
+        if self._pixmap is None:
+            return
+        painter.save()
+        # 中段是把一像素寬的直邊拉伸，平滑取樣會混入相鄰的角落像素
+        painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform, False)
+        for target, source in self._pieces:
+            painter.drawPixmap(target, self._pixmap, source)
+        painter.restore()
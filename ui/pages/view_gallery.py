@@ -1,38 +1,60 @@
 import os
-from pathlib import Path
+import time
 
-from PIL import Image, ImageFilter
-from PIL.ImageQt import ImageQt
 from PyQt6 import uic
-from PyQt6.QtCore import Qt, QSize, QRectF, QTimer
-from PyQt6.QtGui import QPixmap, QPainter, QColor, QFont, QPainterPath, QBrush, QFontMetrics, QPen
-from PyQt6.QtWidgets import QWidget, QFileDialog, QListWidgetItem, QGraphicsDropShadowEffect, QGraphicsScene, \
+from PyQt6.QtCore import Qt, QEvent, QMargins, QPointF, QSize, QRectF, QThreadPool, QTimer
+from PyQt6.QtGui import QPixmap, QImage, QPainter, QColor, QFont, QPainterPath, QBrush, QPen, \
+    QTransform
+from PyQt6.QtWidgets import QWidget, QFileDialog, QListWidgetItem, QGraphicsScene, \
     QGraphicsView, QGraphicsPathItem, QGraphicsPixmapItem, QGraphicsSimpleTextItem
-from qfluentwidgets import MessageBox, Flyout
+from qfluentwidgets import MessageBox, Flyout, FluentIcon, InfoBar, InfoBarPosition
 
 from core.asset_manager import AssetManager
 from core.exif_reader import get_exif_data
-from core.export_worker import ExportManager
-from core.logo_mapping import get_logo_path
+from core.export_estimator import ExportEstimate, ExportEstimateTask, ExportTelemetry, output_size
+from core.export_worker import ExportManager, ExportThrottle, export_thread_count
+from core.lru_cache import ByteLRUCache
+from core.pil_renderer import FRAME_SHADOW_PADDING, render_with_pil
+from core.preview_proxy import DEFAULT_PREVIEW_CACHE_MB, PREVIEW_CACHE_SETTINGS_KEY, PREVIEW_PREFETCH_OFFSETS, \
+    BlurWorker, PreviewLoader, PreviewProxy, blur_bucket_size, mip_level, quantize_blur_radius, \
+    render_blur_approximation
+from core.qt_renderer import render_with_qt
+from core.render_cache import CACHE_SETTINGS_KEY, RenderCache
+from core.render_plan import RenderPlan
+from core.renderer_benchmark import BENCHMARK_SETTINGS_KEY, choose_renderer
 from core.settings_manager import SettingsManager
+from core.tiled_renderer import render_with_pil_tiled
 from core.translator import Translator
-from core.utils import resource_path_str, get_os_type
+from core.watermark_resources import WatermarkResources
+from core.zoom_renderer import ZOOM_REGION_MARGIN, ZoomWorker, expand_region, region_covers
+from core.utils import format_bytes, format_duration, resource_path_str
 from ui.customs.custom_icon import MyFluentIcon
 from ui.customs.export_message import ExportMessageBox
 from ui.customs.gallery_item_widget import GalleryItemWidget
 from ui.customs.gallery_tabs import GalleryTabs
+from ui.customs.shadow_item import ShadowItem
 
 
 class GalleryView(QWidget):
     FULL_REDRAW_KEYS = {
         'frame': [
             'enabled', 'padding_top', 'padding_sides', 'padding_bottom',
-            'style', 'frame_radius', 'photo_radius', 'blur_radius'
+            'style', 'frame_radius', 'photo_radius', 'blur_radius', 'frame_shadow'
         ],
         'watermark': [
             'layout', 'area', 'align', 'font_size'
         ]
     }
+    # 拖動滑桿期間照片的解析度比例 (相對於邏輯像素)
+    DRAG_RESOLUTION_SCALE = 0.5
+    # 陰影的模糊半徑與顏色 (與原本的 QGraphicsDropShadowEffect 相同)
+    PHOTO_SHADOW_BLUR = 40
+    PHOTO_SHADOW_COLOR = QColor(0, 0, 0, 100)
+    PHOTO_SHADOW_OFFSET = (5, 5)
+    FRAME_SHADOW_BLUR = 30
+    FRAME_SHADOW_COLOR = QColor(0, 0, 0, 80)
+    # 1:1 檢視平移停止多久後才渲染新的可見區域 (毫秒)
+    ZOOM_RENDER_DELAY_MS = 40
 
     def __init__(self, asset_manager: AssetManager, settings: SettingsManager, translator: Translator, parent=None):
         super().__init__(parent)
@@ -45,21 +67,57 @@ class GalleryView(QWidget):
         self.tr = self.translator.get
 
         self.image_items = {}
-        self.original_pil_img = None
         self.current_image_path = None
-        self.original_pixmap = None
+        # 目前預覽圖片的代理圖 (PreviewProxy)，原圖的完整像素只在匯出時解碼
+        self.preview_proxy = None
+        # 跨圖片共用的預覽快取：代理圖、模糊背景與縮放後的照片，以檔案識別為鍵，總量受設定的記憶體上限限制
+        self.preview_cache = ByteLRUCache(
+            self.settings_manager.get(PREVIEW_CACHE_SETTINGS_KEY, DEFAULT_PREVIEW_CACHE_MB) * 1024 ** 2)
+        # 在背景解碼代理圖，並預先載入列表中相鄰的圖片
+        self.preview_loader = PreviewLoader(self.preview_cache, self)
+        # 在背景計算模糊背景；目前相框需要的背景快取鍵 (計算完成時用來判斷是否仍需要)
+        self.blur_worker = BlurWorker(self)
+        self._current_blur_key = None
+        # 浮水印的 Logo、字體與 EXIF 文字快取，只調整浮水印時不必重新查找素材
+        self.watermark_resources = WatermarkResources(self.asset_manager)
+        # 使用者正在拖動滑桿：預覽以低解析度、快速縮放與近似模糊繪製，放開後再完整重繪
+        self._interactive = False
+        # 1:1 檢視：以匯出渲染器在輸出解析度下只渲染可見的區域
+        self.zoom_worker = ZoomWorker(self)
+        self._zoom_active = False
+        self._zoom_anchor = None  # 雙擊進入時要放大的位置 (檢視座標)
+        self._zoom_plan = None
+        self._zoom_plan_key = None
+        self._zoom_offset = 0  # 輸出影像中相框的位置 (相框陰影的預留空間)
+        self._zoom_frame_scale = 1.0  # 輸出像素 / 預覽相框座標
+        self._zoom_accept_from = 0  # 目前設定下第一個請求的編號，更早的結果不再顯示
+        self._zoom_region = None  # 畫面上已渲染完成的區域 (輸出座標)
+        self._zoom_requested = None  # 最後要求渲染的區域
         self._is_selecting_all = False
         # 新增：用於管理背景執行緒的屬性
         self.export_manager = None
+        # 導出前的試算任務與導出遙測
+        self.estimate_task = None
+        self._pending_export = None
+        self.export_telemetry = ExportTelemetry()
+        # 導出專用的執行緒池：背景導出會降低執行緒的優先權且無法調回，
+        # 因此執行緒在沒有工作時立即結束，下次導出重新建立
+        self.export_pool = QThreadPool(self)
+        self.export_pool.setExpiryTimeout(0)
+        self.export_throttle = ExportThrottle(self)
+        self._export_in_background = False
 
         # 新增一個用於防抖的計時器
         self.resize_timer = QTimer(self)
         self.resize_timer.setSingleShot(True)
         self.resize_timer.setInterval(100)  # 100毫秒延遲，可根據體驗調整
         self.resize_timer.timeout.connect(self._update_display)
+        self.zoom_timer = QTimer(self)
+        self.zoom_timer.setSingleShot(True)
+        self.zoom_timer.setInterval(self.ZOOM_RENDER_DELAY_MS)
+        self.zoom_timer.timeout.connect(self._render_zoom_region)
 
         # --- 新增：用於快取的屬性 ---
-        self.blur_cache = {}
         # 用於快取上次計算的佈局矩形，避免在局部更新時重新計算
         self.last_frame_rect = None
         self.last_photo_rect = None
@@ -78,7 +136,7 @@ class GalleryView(QWidget):
         self.image_preview_label.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
         self.image_preview_label.setTransformationAnchor(QGraphicsView.ViewportAnchor.AnchorUnderMouse)
         self.image_preview_label.setResizeAnchor(QGraphicsView.ViewportAnchor.AnchorViewCenter)
-        # 設定透明背景，讓 frame_shadow 生效
+        # 設定透明背景，相框外的陰影直接畫在介面背景上
         self.image_preview_label.setStyleSheet("background: transparent; border: none;")
         self.setStyleSheet("QWidget{background: transparent}")
 
@@ -90,9 +148,14 @@ class GalleryView(QWidget):
         self.logo_text_item = QGraphicsSimpleTextItem()
         self.watermark_text_item = QGraphicsSimpleTextItem()
         self.prompt_item = QGraphicsSimpleTextItem()  # 用於顯示提示文字
+        # 陰影以預先模糊的九宮格小圖繪製，平移與重繪時不必像 QGraphicsDropShadowEffect 一樣重新模糊
+        self.frame_shadow_item = ShadowItem(self.FRAME_SHADOW_BLUR, self.FRAME_SHADOW_COLOR)
+        self.photo_shadow_item = ShadowItem(self.PHOTO_SHADOW_BLUR, self.PHOTO_SHADOW_COLOR, self.PHOTO_SHADOW_OFFSET)
 
         # 使用 ZValue 控制圖層順序 (數字越大，越在上層)
+        self.frame_shadow_item.setZValue(-10)
         self.frame_item.setZValue(0)
+        self.photo_shadow_item.setZValue(5)
         self.photo_item.setZValue(10)
         self.logo_item.setZValue(20)
         self.logo_text_item.setZValue(20)
@@ -100,26 +163,27 @@ class GalleryView(QWidget):
         self.prompt_item.setZValue(30)
 
         # 將物件添加到場景中
+        self.scene.addItem(self.frame_shadow_item)
         self.scene.addItem(self.frame_item)
+        self.scene.addItem(self.photo_shadow_item)
         self.scene.addItem(self.photo_item)
         self.scene.addItem(self.logo_item)
         self.scene.addItem(self.logo_text_item)
         self.scene.addItem(self.watermark_text_item)
         self.scene.addItem(self.prompt_item)
 
-        # 照片陰影效果 (直接作用於照片物件)
-        self.photo_shadow_effect = QGraphicsDropShadowEffect(self)
-        self.photo_shadow_effect.setColor(QColor(0, 0, 0, 100))
-        self.photo_shadow_effect.setBlurRadius(40)
-        self.photo_shadow_effect.setOffset(5, 5)
-        self.photo_item.setGraphicsEffect(self.photo_shadow_effect)
-
-        # 相框外部陰影 (作用於整個 QGraphicsView 元件)
-        self.frame_shadow_effect = QGraphicsDropShadowEffect(self)
-        self.frame_shadow_effect.setBlurRadius(30)
-        self.frame_shadow_effect.setColor(QColor(0, 0, 0, 80))
-        self.frame_shadow_effect.setOffset(0, 0)
-        self.image_preview_label.setGraphicsEffect(self.frame_shadow_effect)
+        # 1:1 檢視的場景，以輸出像素為單位：底層是放大的預覽畫面，上層是渲染完成的可見區域
+        self.zoom_scene = QGraphicsScene(self)
+        self.zoom_placeholder_item = QGraphicsPixmapItem()
+        self.zoom_placeholder_item.setTransformationMode(Qt.TransformationMode.SmoothTransformation)
+        self.zoom_region_item = QGraphicsPixmapItem()
+        self.zoom_region_item.setZValue(10)
+        self.zoom_scene.addItem(self.zoom_placeholder_item)
+        self.zoom_scene.addItem(self.zoom_region_item)
+        self.zoom_button.setIcon(FluentIcon.ZOOM_IN)
+        # 雙擊預覽切換 1:1 檢視，Esc 離開
+        self.image_preview_label.installEventFilter(self)
+        self.image_preview_label.viewport().installEventFilter(self)
 
         # 設定拖拽事件
         self.setAcceptDrops(True)  # <--- 在主元件上啟用拖放
@@ -138,6 +202,8 @@ class GalleryView(QWidget):
         self.select_all_checkbox.setText(self.tr("gallery_select_all", "Select All"))
         self.clear_selected_button.setText(self.tr("gallery_clear_selected", "Clear Selected"))
         self.export_button.setText(self.tr("gallery_export_button", "Export Selected Images"))
+        self.zoom_button.setToolTip(self.tr("gallery_zoom_actual_size",
+                                            "View at 100% (double-click the preview, Esc to exit)"))
 
         self._clear_preview()  # 清除時會設定預設文字
         self._update_select_all_checkbox_state()  # 更新 UI 狀態
@@ -154,11 +220,20 @@ class GalleryView(QWidget):
         """連接所有元件的信號與槽函數。"""
         self.import_button.clicked.connect(self._open_image_dialog)
         self.image_list.currentItemChanged.connect(self._on_list_item_selected)
+        self.preview_loader.loaded.connect(self._on_preview_loaded)
+        self.preview_loader.failed.connect(self._on_preview_failed)
+        self.blur_worker.finished.connect(self._on_blur_finished)
+        self.tabs.interactionChanged.connect(self._on_interaction_changed)
+        self.zoom_button.toggled.connect(self._on_zoom_toggled)
+        self.zoom_worker.rendered.connect(self._on_zoom_rendered)
+        self.zoom_worker.failed.connect(self._on_zoom_failed)
+        self.image_preview_label.horizontalScrollBar().valueChanged.connect(self._schedule_zoom_render)
+        self.image_preview_label.verticalScrollBar().valueChanged.connect(self._schedule_zoom_render)
         # 將 splitterMoved 連接到計時器，而不是直接更新
         self.main_splitter.splitterMoved.connect(self.resize_timer.start)
 
         # 連接到優化後的信號和槽
-        self.tabs.settingsChanged.connect(self._handle_settings_change)
+        self.tabs.settingsChanged.connect(self._on_settings_changed)
 
         # 連接新的控制按鈕信號
         self.select_all_checkbox.stateChanged.connect(self._on_select_all_changed)
@@ -225,6 +300,7 @@ class GalleryView(QWidget):
             self.image_list.takeItem(row)
             # 從內部資料結構中移除
             del self.image_items[path]
+            self.watermark_resources.forget_image(path)
 
             # 如果被刪除的是當前正在預覽的圖片，需要更新預覽
             if path == self.current_image_path:
@@ -340,6 +416,7 @@ class GalleryView(QWidget):
                 # 從內部資料結構中移除
                 if path in self.image_items:
                     del self.image_items[path]
+                    self.watermark_resources.forget_image(path)
 
             # 5. 統一更新預覽和UI狀態
             if preview_needs_update:
@@ -353,8 +430,8 @@ class GalleryView(QWidget):
             self._update_select_all_checkbox_state()
 
     def _on_export_button_clicked(self):
-        # 檢查是否有任務正在進行
-        if self.export_manager:
+        # 檢查是否有任務 (或導出前的試算) 正在進行
+        if self.export_manager or self.estimate_task:
             return
 
         selected_paths = [
@@ -382,48 +459,137 @@ class GalleryView(QWidget):
             return
         self.settings_manager.set('last_export_dir', output_dir)
 
-        # 1. 判斷作業系統並選擇渲染函式
-        os_type = get_os_type()
-        render_function_to_use = None
+        # 設定在批次開始時編譯成不可變的渲染計畫，工作執行緒不再讀取 UI 狀態或重新解析資源
+        render_plan = self._compile_render_plan()
+        # 依這台電腦的渲染器基準測試結果選用較快的渲染器，沒有結果時依作業系統決定；
+        # 計畫用到 Qt 渲染器沒有的功能時一律使用 PIL
+        renderer = choose_renderer(self.settings_manager.get(BENCHMARK_SETTINGS_KEY), plan=render_plan)
+
+        # 禁用導出按鈕，防止重複點擊
+        self.export_button.setEnabled(False)
 
-        if os_type == 'windows':
-            print("檢測到 Windows 系統，使用 PIL 渲染器進行導出。")
+        # 先在背景執行試算 (只讀檔頭)，確認耗時、記憶體與磁碟空間後再開始導出
+        self._pending_export = (selected_paths, output_dir, render_plan, renderer)
+        self.estimate_task = ExportEstimateTask(selected_paths, render_plan, output_dir, renderer,
+                                                export_thread_count(), self.export_telemetry)
+        self.estimate_task.setAutoDelete(False)
+        self.estimate_task.signals.finished.connect(self._on_export_estimate_finished)
+        self.estimate_task.signals.error.connect(self._on_export_estimate_error)
+        QThreadPool.globalInstance().start(self.estimate_task)
+
+    def _compile_render_plan(self) -> RenderPlan:
+        """以目前的設定與預覽照片尺寸 (用於換算模糊半徑等與預覽相對的數值) 編譯渲染計畫。"""
+        all_settings = self.tabs._get_current_settings()
+        preview_photo_width = preview_photo_height = 0
+        if hasattr(self, 'last_preview_photo_size') and self.last_preview_photo_size.width() > 0:
+            preview_photo_width = self.last_preview_photo_size.width()
+            preview_photo_height = self.last_preview_photo_size.height()
+        return RenderPlan.compile(all_settings, self.asset_manager, preview_photo_width, preview_photo_height)
+
+    def _on_export_estimate_finished(self, estimate: ExportEstimate):
+        """顯示試算結果，由使用者決定是否開始導出。"""
+        self.estimate_task = None
+        body = self.tr(
+            "export_estimate_body",
+            "{count} images\nEstimated time: {time}\nPeak memory: about {memory}\n"
+            "Output size: about {output} (free space: {free})"
+        ).format(count=estimate.count, time=format_duration(estimate.seconds),
+                 memory=format_bytes(estimate.peak_bytes), output=format_bytes(estimate.output_bytes),
+                 free=format_bytes(estimate.free_bytes) if estimate.free_bytes is not None else '-')
+        if estimate.calibration == 'sample':
+            body += "\n" + self.tr("export_estimate_sampled",
+                                    "Based on sample renders; estimates improve after the first export.")
+        if not estimate.fits_disk:
+            body += "\n\n" + self.tr("export_estimate_disk_warning",
+                                       "Warning: the output may not fit in the free space of the target disk.")
+        if estimate.unreadable:
+            body += "\n" + self.tr("export_estimate_unreadable", "{count} images could not be read.").format(
+                count=len(estimate.unreadable))
+
+        self.msg_box_estimate = MessageBox(self.tr("export_estimate_title", "Export Estimate"), body, self.window())
+        self.msg_box_estimate.yesButton.setText(self.tr("export_estimate_start", "Start Export"))
+        self.msg_box_estimate.cancelButton.setText(self.tr("cancel", "Cancel"))
+        if self.msg_box_estimate.exec():
+            self._start_export(*self._pending_export)
+        else:
+            self.export_button.setEnabled(True)
+        self._pending_export = None
+
+    def _on_export_estimate_error(self, error_message: str):
+        """試算失敗不應阻擋導出，直接開始。"""
+        self.estimate_task = None
+        print(f"匯出試算失敗，直接開始導出: {error_message}")
+        self._start_export(*self._pending_export)
+        self._pending_export = None
+
+    def _start_export(self, selected_paths, output_dir, render_plan: RenderPlan, renderer: str):
+        # 1. 選擇渲染函式
+        if renderer == 'pil':
+            print("使用 PIL 渲染器進行導出。")
             render_function_to_use = self._render_image_with_pil_for_export
         else:
-            print(f"檢測到 {os_type} 系統，使用 Qt 渲染器進行導出。")
+            print("使用 Qt 渲染器進行導出。")
             render_function_to_use = self._render_image_for_export
 
         # --- UI 設定 ---
-        # 禁用導出按鈕，防止重複點擊
-        self.export_button.setEnabled(False)
-
         # 建立並顯示進度對話框
         self.export_dialog = ExportMessageBox(self.translator, self.window(), total=len(selected_paths))
         self.export_dialog.show()
 
         # --- 使用 ExportManager ---
-        all_settings = self.tabs._get_current_settings()
         self.export_manager = ExportManager(
             selected_paths,
             output_dir,
-            all_settings,
-            render_function_to_use
+            render_plan,
+            render_function_to_use,
+            tiled_render_function=self._render_image_tiled_for_export,
+            telemetry=self.export_telemetry,
+            telemetry_key=ExportTelemetry.key(renderer, render_plan, 'PNG'),
+            pool=self.export_pool,
+            render_cache=RenderCache.from_settings(self.settings_manager.get(CACHE_SETTINGS_KEY)),
+            renderer=renderer
         )
 
         # --- 連接信號 ---
         manager_signals = self.export_manager.signals
-        manager_signals.progress.connect(
-            lambda i, total, msg: self.export_dialog.setCurrentProgress(i, msg)
-        )
+        manager_signals.progress.connect(self._on_export_progress)
         manager_signals.error.connect(self._on_export_error)
         manager_signals.finished.connect(self._on_export_finished)
         self.export_dialog.cancelExport.connect(self.export_manager.cancel)
+        self.export_dialog.runInBackground.connect(self._on_export_to_background)
 
         # 啟動任務分發（此方法立即返回）
         self.export_manager.start()
 
+    def _on_export_progress(self, current: int, total: int, msg: str):
+        self.export_dialog.setCurrentProgress(current, msg)
+        if self._export_in_background:
+            self._show_background_progress(current, total)
+
+    def _show_background_progress(self, current: int, total: int):
+        """背景導出時，在導出按鈕上顯示進度。"""
+        text = self.tr("export_background_progress", "Exporting in background {current} / {total}")
+        self.export_button.setText(text.format(current=current, total=total))
+
+    def _on_export_to_background(self):
+        """
+        轉為背景導出：關閉進度對話框讓使用者繼續編輯，之後的圖片以低優先權渲染，
+        並在預覽更新卡頓時自動降低並行數、閒置時恢復。
+        """
+        if not self.export_manager:
+            return
+        self._export_in_background = True
+        self.export_manager.enter_background()
+        self.export_throttle.start(self.export_pool, export_thread_count())
+        self._show_background_progress(self.export_manager.progress_counter[0], len(self.export_manager.selected_paths))
+
     def _on_export_finished(self):
         """處理導出成功或被取消後的清理工作。"""
+        # 保存這次導出的實測數據，讓下次的試算更準確
+        self.export_telemetry.save()
+        if self._export_in_background and self.export_manager and not self.export_manager.is_cancelled():
+            InfoBar.success(self.tr('export_completed', 'Export Completed'), self.export_manager.output_dir,
+                            position=InfoBarPosition.TOP_RIGHT, duration=5000, parent=self.window())
         if self.export_manager and not self.export_manager.is_cancelled():
             self.export_dialog.setExportCompleted()
             QTimer.singleShot(1500, self.export_dialog.close)
@@ -443,6 +609,10 @@ class GalleryView(QWidget):
             print(full_msg)
             self.export_dialog.setExportError(full_msg)
             # 讓錯誤訊息停留久一點，但最終還是會在 finished 信號後被清理
+        elif self._export_in_background:
+            print(f"Error on {os.path.basename(file_path)}:\n{error_message}")
+            InfoBar.error(self.tr('export_error', 'Export Error'), f"{os.path.basename(file_path)}: {error_message}",
+                          position=InfoBarPosition.TOP_RIGHT, duration=-1, parent=self.window())
 
     def _cleanup_export(self):
         """清理 ExportManager 並重設UI狀態。"""
@@ -450,679 +620,49 @@ class GalleryView(QWidget):
             # ExportManager 在主執行緒中，不需要像 QThread 那樣複雜的清理
             # Python 的垃圾回收機制會處理它
             self.export_manager = None
+        self.export_throttle.stop()
+        self._export_in_background = False
 
         # 重新啟用導出按鈕
+        self.export_button.setText(self.tr("gallery_export_button", "Export Selected Images"))
         self.export_button.setEnabled(True)
         print("Export tasks finished and manager cleaned up.")
 
-    def _render_image_for_export(self, image_path: str, all_settings: dict) -> QPixmap:
+    def _render_image_for_export(self, image_path: str, render_plan: RenderPlan) -> QImage:
         """
-        為導出功能，離屏渲染單張圖片。
-        此方法創建一個臨時的 QGraphicsScene，並將所有效果繪製上去，
-        最後將 Scene 內容渲染成一個 QPixmap。
-        所有計算都基於原始圖片尺寸，以保證輸出品質。
+        為導出功能，使用 Qt 離屏渲染單張圖片。
+        實際的繪製邏輯位於 core.qt_renderer：直接以 QPainter 繪製到 QImage 上，
+        不使用 QPixmap 或 QGraphicsScene，因此可以在導出執行緒池中平行執行。
         """
-        # --- 1. 載入原始圖片和數據 ---
-        try:
-            with Image.open(image_path) as img:
-                pil_img = img.copy()
-        except Exception as e:
-            print(f"無法使用 Pillow 載入圖片 {image_path}: {e}")
-            return None
-
-        original_pixmap = QPixmap(image_path)
-        if original_pixmap.isNull():
-            return None
-
         exif_data = self.image_items.get(image_path, {}).get('exif', {})
-        f_settings = all_settings.get('frame', {})
-        w_settings = all_settings.get('watermark', {})
-
-        # --- 2. 基於原始圖片尺寸計算佈局 ---
-        img_w, img_h = original_pixmap.width(), original_pixmap.height()
-        base_padding = min(img_w, img_h) * 0.1
-        padding_top = int(base_padding * f_settings.get('padding_top', 10) / 100)
-        padding_sides = int(base_padding * f_settings.get('padding_sides', 10) / 100)
-        padding_bottom = int(base_padding * f_settings.get('padding_bottom', 10) / 100)
-
-        if not f_settings.get('enabled', True):
-            padding_top = padding_sides = padding_bottom = 0
-
-        frame_w = img_w + padding_sides * 2
-        frame_h = img_h + padding_top + padding_bottom
-        frame_rect = QRectF(0, 0, frame_w, frame_h)
-        photo_rect = QRectF(padding_sides, padding_top, img_w, img_h)
-
-        # --- 3. 創建臨時的 Scene 和圖形物件 ---
-        temp_scene = QGraphicsScene()
-        temp_scene.setSceneRect(frame_rect)
-
-        # 為了不影響 UI 上的物件，我們創建全新的臨時物件
-        frame_item = QGraphicsPathItem()
-        photo_item = QGraphicsPathItem()
-        logo_item = QGraphicsPixmapItem()
-        logo_text_item = QGraphicsSimpleTextItem()
-        watermark_text_item = QGraphicsSimpleTextItem()
-
-        # 設置 Z-Value (圖層順序)
-        frame_item.setZValue(0)
-        photo_item.setZValue(10)
-        logo_item.setZValue(20)
-        logo_text_item.setZValue(20)
-        watermark_text_item.setZValue(20)
-
-        temp_scene.addItem(frame_item)
-        temp_scene.addItem(photo_item)
-        temp_scene.addItem(logo_item)
-        temp_scene.addItem(logo_text_item)
-        temp_scene.addItem(watermark_text_item)
-
-        # --- 4. 配置和繪製每個圖形物件 ---
-
-        # (A) 繪製相框
-        if f_settings.get('enabled', True):
-            frame_radius = f_settings.get('frame_radius', 5) / 100.0 * min(frame_w, frame_h) / 2
-            path = QPainterPath()
-            path.addRoundedRect(frame_rect, frame_radius, frame_radius)
-            frame_item.setPath(path)
-            frame_item.setPen(QPen(Qt.PenStyle.NoPen))  # 無論何種樣式，都先取消邊框
-
-            frame_style = f_settings.get('style', 'solid_color')
-
-            # vvvvvvvvvvvvvv 重構後的畫刷設定邏輯 vvvvvvvvvvvvvv
-            if frame_style == 'solid_color':
-                frame_item.setBrush(QBrush(QColor(f_settings.get('color', '#FFFFFFFF'))))
-
-            elif frame_style == 'blur_extend' and pil_img:
-                # 1. 獲取使用者在UI上設定的基礎模糊半徑
-                base_blur_radius = f_settings.get('blur_radius', 20)
-
-                # 2. 獲取原始圖片尺寸
-                pil_w, pil_h = pil_img.size
-
-                # 3. 計算縮放比例並應用
-                export_blur_radius = base_blur_radius
-                if hasattr(self, 'last_preview_photo_size') and self.last_preview_photo_size.width() > 0:
-                    preview_w = self.last_preview_photo_size.width()
-                    scale_factor = pil_w / preview_w
-                    export_blur_radius = base_blur_radius * scale_factor
-                    print(f"[DEBUG] Preview Width: {preview_w}, Original Width: {pil_w}, Scale: {scale_factor:.2f}")
-                    print(f"[DEBUG] Base Radius: {base_blur_radius}, Scaled Export Radius: {export_blur_radius:.2f}")
-
-                # 後續計算
-                target_w, target_h = int(frame_w), int(frame_h)
-                scale = max(target_w / pil_w, target_h / pil_h)
-                resized = pil_img.resize((int(pil_w * scale), int(pil_h * scale)), Image.Resampling.LANCZOS)
-                left, top = (resized.width - target_w) / 2, (resized.height - target_h) / 2
-                cropped = resized.crop((left, top, left + target_w, top + target_h))
-
-                if cropped.mode != 'RGB':
-                    cropped = cropped.convert('RGB')
-
-                blurred = None
-                # 4. 使用計算後、適用於高解析度圖片的模糊半徑
-                if export_blur_radius > 0:
-                    blurred = cropped.filter(ImageFilter.GaussianBlur(radius=export_blur_radius))
-                else:
-                    blurred = cropped
-
-                # 關鍵：將 PIL Image 轉換為 QPixmap，並保留對 QImage 的引用以防被回收
-                blurred_qimage = ImageQt(blurred)
-                blurred_pixmap = QPixmap.fromImage(blurred_qimage)
-
-                # 增加建議的保險措施
-                if blurred_pixmap.isNull():
-                    print("警告：模糊相框未能正確轉換為 QPixmap，將使用灰色作為備用。")
-                    frame_item.setBrush(QBrush(QColor("#CCCCCC")))
-                else:
-                    # 1. 創建一個空的畫刷
-                    image_brush = QBrush()
-
-                    # 2. 使用 .setTexture() 將 QPixmap 明確設置為畫刷的紋理
-                    image_brush.setTexture(blurred_pixmap)
-
-                    # 3. 將配置好的畫刷應用到 item
-                    frame_item.setBrush(image_brush)
-
-            # (B) 繪製照片 (帶圓角和陰影)
-            photo_radius = f_settings.get('photo_radius', 3) / 100.0 * min(photo_rect.width(),
-                                                                           photo_rect.height()) / 2
-            # 將物件移動到照片應在的位置
-            photo_item.setPos(photo_rect.topLeft())
-
-            # 在物件的本地座標系中定義路徑 (從0,0開始)
-            photo_path = QPainterPath()
-            photo_path.addRoundedRect(0, 0, photo_rect.width(), photo_rect.height(), photo_radius, photo_radius)
-            photo_item.setPath(photo_path)
-
-            # 直接使用原始圖片作為畫刷，無需複雜的座標變換
-            photo_item.setBrush(QBrush(original_pixmap))
-            photo_item.setPen(QPen(Qt.PenStyle.NoPen))
-
-            if f_settings.get('enabled', True) and f_settings.get('photo_shadow', True):
-                shadow = QGraphicsDropShadowEffect()
-                shadow.setColor(QColor(0, 0, 0, 100))
-                shadow.setBlurRadius(60)
-                shadow.setOffset(10, 10)
-                photo_item.setGraphicsEffect(shadow)
-
-        # (C) 繪製浮水印 (此處為 _update_watermark 方法的邏輯複現)
-        # 為了在不大規模重構 _update_watermark 的情況下完成功能，我們在此處重新實現其核心邏輯
-        # 並將所有 self.xxx_item 的操作改為對應的臨時 item (例如 logo_item)
-        logo_enabled = w_settings.get('logo_enabled', False)
-        text_enabled = w_settings.get('text_enabled', True)
-        if logo_enabled or text_enabled:
-            # --- Start of watermark logic replication ---
-            logo_pixmap = None
-            logo_text = ""
-            if logo_enabled:
-                logo_source = w_settings.get('logo_source', 'auto_detect')
-                if logo_source == 'auto_detect':
-                    make = exif_data.get('Make', '')
-                    logo_path = get_logo_path(make, str(self.asset_manager.default_logos_dir))
-                    if logo_path: logo_pixmap = QPixmap(logo_path)
-                elif logo_source == 'select_from_library':
-                    logo_key = w_settings.get('logo_source_app', '')
-                    logo_path = next((p for p in self.asset_manager.get_default_logos() if Path(p).stem == logo_key),
-                                     None)
-                    if logo_path: logo_pixmap = QPixmap(logo_path)
-                elif logo_source == 'my_custom_logo':
-                    logo_key = w_settings.get('logo_source_my_custom', '')
-                    logo_path = next((p for p in self.asset_manager.get_user_logos() if
-                                      self.asset_manager._create_key_from_name(Path(p).stem) == logo_key), None)
-                    if logo_path: logo_pixmap = QPixmap(logo_path)
-                elif w_settings.get('logo_source') == 'custom_text':
-                    logo_text = w_settings.get('logo_text_custom', 'Logo')
-
-            watermark_text = ""
-            if text_enabled:
-                text_source = w_settings.get('text_source', 'exif')
-                if text_source == 'exif':
-                    parts = []
-                    exif_options = w_settings.get('exif_options', {})
-                    if exif_options.get('model') and exif_data.get('Model'): parts.append(exif_data['Model'])
-                    if exif_options.get('focal_length') and exif_data.get('FocalLength'): parts.append(
-                        f"{exif_data['FocalLength']}mm")
-                    if exif_options.get('aperture') and exif_data.get('FNumber'): parts.append(
-                        f"f/{exif_data['FNumber']}")
-                    if exif_options.get('shutter') and exif_data.get('ExposureTime'): parts.append(
-                        f"{exif_data['ExposureTime']}s")
-                    if exif_options.get('iso') and exif_data.get('ISO'): parts.append(f"ISO {exif_data['ISO']}")
-                    watermark_text = "  ".join(parts)
-                elif text_source == 'custom':
-                    watermark_text = w_settings.get('text_custom', '')
-
-            # 1. 直接使用導出畫布上的照片尺寸 (photo_rect) 來計算，這是最準確的方式。
-            #    photo_rect 此時代表的是原始圖片的尺寸。
-            export_photo_w = photo_rect.width()
-            export_photo_h = photo_rect.height()
-
-            # 從預覽區的圖片尺寸獲取基礎字體大小
-            preview_photo_w = self.last_preview_photo_size.width()
-            preview_photo_h = self.last_preview_photo_size.height()
-            base_preview_font_size = max(8, int(min(preview_photo_w, preview_photo_h) * 0.04))
-
-            # 計算縮放比例
-            scale_factor = (export_photo_w / preview_photo_w * 0.95) if preview_photo_w > 0 else 1.0
-
-            # 應用與 `_update_watermark` 中完全相同的公式
-            # 並乘上縮放比例，以確保匯出圖片的字體大小與預覽時的視覺大小一致
-            font_size_ratio = w_settings.get('font_size', 20) / 100.0
-            font_size = int(base_preview_font_size * font_size_ratio * scale_factor)
-
-            # 後續所有尺寸相關的計算（如 gap, padding, logo_h_scaled）都將基於這個
-            # 正確縮放後的 font_size，從而保證整體比例一致。
-            font_color = QColor(w_settings.get('font_color', '#FFFFFFFF'))
-
-            font_family_name = "Arial"
-            font_source = w_settings.get('font_family', 'system')
-            if font_source == 'system':
-                font_family_name = w_settings.get('font_system', 'Arial')
-            elif font_source == 'my_custom':
-                font_key = w_settings.get('font_my_custom', '')
-                user_fonts = self.asset_manager.get_user_fonts()
-                for path, families in user_fonts.items():
-                    if self.asset_manager._create_key_from_name(Path(path).stem) == font_key:
-                        font_family_name = families[0] if families else "Arial"
-                        break
-
-            watermark_font = QFont(font_family_name, font_size)
-            logo_font = QFont(font_family_name, int(font_size * 1.2))
-
-            fm = QFontMetrics(watermark_font)
-            text_rect = fm.boundingRect(watermark_text)
-            logo_fm = QFontMetrics(logo_font)
-            logo_text_rect = logo_fm.boundingRect(logo_text)
+        return render_with_qt(image_path, exif_data, render_plan)
 
-            if logo_pixmap and not logo_pixmap.isNull():
-                # 同樣，將 logo 高度的計算基準改為 photo_rect (原始照片尺寸) 的高度
-                base_logo_height = photo_rect.height() * 0.1  # 基礎大小為原始照片高度的 10%
-                logo_size_ratio = w_settings.get('logo_size', 30) / 50.0  # 獲取 UI 上的 logo 尺寸比例
-                logo_h_scaled = int(base_logo_height * logo_size_ratio)
-                logo_pixmap = logo_pixmap.scaledToHeight(logo_h_scaled, Qt.TransformationMode.SmoothTransformation)
-
-            gap = int(font_size * 0.3)
-            logo_w = logo_pixmap.width() if logo_pixmap and not logo_pixmap.isNull() else logo_text_rect.width()
-            logo_h = logo_pixmap.height() if logo_pixmap and not logo_pixmap.isNull() else logo_text_rect.height()
-            text_w = text_rect.width()
-            text_h = text_rect.height()
-
-            layout = w_settings.get('layout', 'logo_left')
-            total_w, total_h = 0, 0
-            if layout in ['logo_top', 'logo_bottom']:
-                total_w = max(logo_w, text_w)
-                total_h = (logo_h + text_h + gap) if (
-                        logo_enabled and text_enabled and logo_w > 0 and text_w > 0) else (
-                        logo_h or text_h)
-            else:  # logo_left or logo_right
-                total_w = (logo_w + text_w + gap) if (
-                        logo_enabled and text_enabled and logo_w > 0 and text_w > 0) else (
-                        logo_w or text_w)
-                total_h = max(logo_h, text_h)
-
-            # 5. 決定浮水印的錨點 (左上角)
-            area = w_settings.get('area', 'in_photo')
-            align = w_settings.get('align', 'bottom_center')
-            if not align:
-                align = 'bottom_center'
-            # 如果相框被禁用，則強制將區域設為 'in_photo'
-            f_settings = self.tabs._get_current_settings().get('frame', {})
-            if not f_settings.get('enabled', True):
-                area = 'in_photo'
-
-            target_rect = photo_rect if area == 'in_photo' else frame_rect
-            padding = int(font_size * 0.5)
-
-            x, y = 0, 0
-            # --- 水平定位 (X) ---
-            if 'left' in align:
-                x = target_rect.left() + padding
-            elif 'center' in align:
-                x = target_rect.center().x() - total_w / 2
-            elif 'right' in align:
-                x = target_rect.right() - total_w - padding
-
-            # --- 垂直定位 (Y) ---
-            if area == 'in_photo':
-                if 'top' in align:
-                    y = target_rect.top() + padding
-                elif 'middle' in align:  # QGraphicsScene 中沒有 middle，這裡假設是 center
-                    y = target_rect.center().y() - total_h / 2
-                elif 'bottom' in align:
-                    y = target_rect.bottom() - total_h - padding
-            elif area == 'in_frame':
-                if 'top' in align:
-                    # 垂直置中於上邊框的空白區域
-                    top_padding_space = photo_rect.top()
-                    y = (top_padding_space - total_h) / 2
-                elif 'bottom' in align:
-                    # 垂直置中於下邊框的空白區域
-                    bottom_padding_space = frame_rect.bottom() - photo_rect.bottom()
-                    y = photo_rect.bottom() + (bottom_padding_space - total_h) / 2
-                else:  # 對於 in_frame 模式，middle/center/left/right 的 Y 軸與 in_photo 相同
-                    y = target_rect.center().y() - total_h / 2
-
-            # 6. 計算內部相對位置並更新物件
-            logo_x_rel, logo_y_rel, text_x_rel, text_y_rel = 0, 0, 0, 0
-            if layout == 'logo_top':
-                # --- 修正點 ---
-                if 'left' in align:
-                    logo_x_rel = 0
-                    text_x_rel = 0
-                elif 'right' in align:
-                    logo_x_rel = total_w - logo_w
-                    text_x_rel = total_w - text_w
-                else:  # 預設或 'center' in align
-                    logo_x_rel = (total_w - logo_w) / 2
-                    text_x_rel = (total_w - text_w) / 2
-                # --- 修正結束 ---
-                logo_y_rel = 0
-                text_y_rel = logo_h + gap
-            elif layout == 'logo_bottom':
-                if 'left' in align:
-                    logo_x_rel = 0
-                    text_x_rel = 0
-                elif 'right' in align:
-                    logo_x_rel = total_w - logo_w
-                    text_x_rel = total_w - text_w
-                else:  # 預設或 'center' in align
-                    logo_x_rel = (total_w - logo_w) / 2
-                    text_x_rel = (total_w - text_w) / 2
-                text_y_rel = 0
-                logo_y_rel = text_h + gap
-            else:  # logo_left or logo_right
-                logo_y_rel = (total_h - logo_h) / 2
-                text_y_rel = (total_h - text_h) / 2
-                if layout == 'logo_right':
-                    text_x_rel = 0
-                    logo_x_rel = text_w + gap
-                else:  # logo_left
-                    logo_x_rel = 0
-                    text_x_rel = logo_w + gap
-
-            if logo_enabled:
-                if logo_pixmap and not logo_pixmap.isNull():
-                    logo_item.setPixmap(logo_pixmap)
-                    logo_item.setPos(x + logo_x_rel, y + logo_y_rel)
-                elif logo_text:
-                    logo_text_item.setText(logo_text)
-                    logo_text_item.setFont(logo_font)
-                    logo_text_item.setBrush(font_color)
-                    logo_text_item.setPos(x + logo_x_rel, y + logo_y_rel)
-
-            if text_enabled and watermark_text:
-                watermark_text_item.setText(watermark_text)
-                watermark_text_item.setFont(watermark_font)
-                watermark_text_item.setBrush(font_color)
-                watermark_text_item.setPos(x + text_x_rel, y + text_y_rel)
-            # --- End of watermark logic replication ---
-
-        # --- 5. 將 Scene 渲染到 QPixmap ---
-        output_pixmap = QPixmap(int(frame_w), int(frame_h))
-        output_pixmap.fill(Qt.GlobalColor.transparent)
-
-        painter = QPainter(output_pixmap)
-        painter.setRenderHint(QPainter.RenderHint.Antialiasing, True)
-        painter.setRenderHint(QPainter.RenderHint.TextAntialiasing, True)
-        painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform, True)
-
-        temp_scene.render(painter)
-        painter.end()
-
-        return output_pixmap
-
-    def _render_image_with_pil_for_export(self, image_path: str, all_settings: dict):
+    def _render_image_with_pil_for_export(self, image_path: str, render_plan: RenderPlan):
         """
-        (最終版) 為導出功能，使用 Pillow 函式庫離屏渲染單張圖片。
-        此版本包含優化過的相片陰影，並新增了相框陰影的繪製邏輯。
+        為導出功能，使用 Pillow 函式庫離屏渲染單張圖片。
+        實際的合成邏輯位於 core.pil_renderer，所有內容都繪製在一塊預先配置的輸出緩衝區上。
         """
-        try:
-            from PIL import Image, ImageDraw, ImageFont, ImageFilter
-            from pathlib import Path
-        except ImportError:
-            raise ImportError("Pillow 函式庫未安裝，無法使用 PIL 進行渲染。請執行 'pip install Pillow'")
-
-        # --- 0. 載入圖片與設定 ---
-        try:
-            with Image.open(image_path) as img:
-                pil_img = img.convert("RGBA").copy()
-        except Exception as e:
-            raise RuntimeError(f"無法使用 Pillow 載入圖片 {os.path.basename(image_path)}: {e}")
-
         exif_data = self.image_items.get(image_path, {}).get('exif', {})
-        f_settings = all_settings.get('frame', {})
-        w_settings = all_settings.get('watermark', {})
+        return render_with_pil(image_path, exif_data, render_plan)
 
-        # --- 1. 基於原始圖片尺寸計算內部佈局 ---
-        img_w, img_h = pil_img.size
-        base_padding = min(img_w, img_h) * 0.1
-        padding_top = int(base_padding * f_settings.get('padding_top', 10) / 100)
-        padding_sides = int(base_padding * f_settings.get('padding_sides', 10) / 100)
-        padding_bottom = int(base_padding * f_settings.get('padding_bottom', 10) / 100)
-
-        if not f_settings.get('enabled', True):
-            padding_top = padding_sides = padding_bottom = 0
-
-        frame_w = img_w + padding_sides * 2
-        frame_h = img_h + padding_top + padding_bottom
-        photo_pos = (padding_sides, padding_top)
-
-        # --- 2. 創建內部畫布 (inner_canvas)，用於繪製無外部陰影的所有內容 ---
-        inner_canvas = Image.new('RGBA', (frame_w, frame_h), (0, 0, 0, 0))
-        inner_draw = ImageDraw.Draw(inner_canvas)
-        frame_radius = f_settings.get('frame_radius', 5) / 100.0 * min(frame_w, frame_h) / 2
-
-        # (A) 繪製相框背景
-        frame_style = f_settings.get('style', 'solid_color')
-        if f_settings.get('enabled', True):
-            frame_bounds = [(0, 0), (frame_w, frame_h)]
-            if frame_style == 'solid_color':
-                color = f_settings.get('color', '#FFFFFFFF')
-                inner_draw.rounded_rectangle(frame_bounds, radius=frame_radius, fill=color)
-            elif frame_style == 'blur_extend':
-                scale = max(frame_w / img_w, frame_h / img_h)
-                resized = pil_img.resize((int(img_w * scale), int(img_h * scale)), Image.Resampling.LANCZOS)
-                left, top = (resized.width - frame_w) / 2, (resized.height - frame_h) / 2
-                cropped = resized.crop((left, top, left + frame_w, top + frame_h))
-                blur_radius = f_settings.get('blur_radius', 20)
-                if hasattr(self, 'last_preview_photo_size') and self.last_preview_photo_size.width() > 0:
-                    blur_radius *= (img_w / self.last_preview_photo_size.width())
-                blurred_bg = cropped.filter(
-                    ImageFilter.GaussianBlur(radius=blur_radius)) if blur_radius > 0 else cropped
-                # 為了防止因浮點數計算導致的 1 像素誤差，在貼上之前，
-                # 強制將模糊後的背景圖層重設為與畫框完全相同的尺寸。
-                # 這是解決 "images do not match" 錯誤的關鍵。
-                if blurred_bg.size != (frame_w, frame_h):
-                    blurred_bg = blurred_bg.resize((frame_w, frame_h), Image.Resampling.LANCZOS)
-
-                mask = Image.new('L', (frame_w, frame_h), 0)
-                ImageDraw.Draw(mask).rounded_rectangle(frame_bounds, radius=frame_radius, fill=255)
-                inner_canvas.paste(blurred_bg, (0, 0), mask)
-
-        # (B) 計算照片圓角半徑
-        photo_radius = f_settings.get('photo_radius', 3) / 100.0 * min(img_w, img_h) / 2
-
-        # (C) 繪製照片陰影 (優化版)
-        if f_settings.get('enabled', True) and f_settings.get('photo_shadow', True):
-            # 1. 調整參數以獲得更柔和、更收斂的陰影
-            shadow_blur_radius = 30  # 大幅減少模糊半徑，讓陰影更貼近物體
-            shadow_offset = (8, 8)  # 減少偏移，使陰影看起來更像接觸陰影
-            shadow_padding = int(shadow_blur_radius * 1.5)  # 根據新的模糊半徑調整擴展空間
-            shadow_color = (0, 0, 0, 50)  # **關鍵**：大幅降低 Alpha 值，讓陰影更通透、邊界更柔和
-
-            # 2. 創建一個比照片大的臨時畫布來繪製陰影
-            shadow_canvas_size = (img_w + shadow_padding * 2, img_h + shadow_padding * 2)
-            shadow_canvas = Image.new('RGBA', shadow_canvas_size, (0, 0, 0, 0))
-
-            # 3. 在這個大畫布的中心繪製帶有圓角、未模糊的陰影形狀
-            shadow_draw = ImageDraw.Draw(shadow_canvas)
-            shadow_shape_bounds = [(shadow_padding, shadow_padding), (img_w + shadow_padding, img_h + shadow_padding)]
-            shadow_draw.rounded_rectangle(shadow_shape_bounds, radius=photo_radius, fill=shadow_color)
-
-            # 4. 對整個陰影畫布應用高斯模糊
-            blurred_shadow = shadow_canvas.filter(ImageFilter.GaussianBlur(radius=shadow_blur_radius))
-
-            # 5. 計算粘貼位置
-            paste_pos = (
-                photo_pos[0] + shadow_offset[0] - shadow_padding,
-                photo_pos[1] + shadow_offset[1] - shadow_padding
-            )
-
-            # 6. 將模糊後的陰影粘貼到內部畫布上
-            inner_canvas.paste(blurred_shadow, paste_pos, blurred_shadow)
-
-        # (D) 繪製照片本身
-        photo_mask = Image.new('L', (img_w, img_h), 0)
-        ImageDraw.Draw(photo_mask).rounded_rectangle([(0, 0), (img_w, img_h)], radius=photo_radius, fill=255)
-        inner_canvas.paste(pil_img, photo_pos, photo_mask)
-
-        # --- 3. 繪製浮水印 (邏輯無變化) ---
-        # ... (此處省略與上一版完全相同的浮水印繪製程式碼) ...
-        # ... (從 logo_enabled = ... 開始到 ... fill=font_color) 結束)
-        logo_enabled = w_settings.get('logo_enabled', False)
-        text_enabled = w_settings.get('text_enabled', True)
-        if logo_enabled or text_enabled:
-            # (A) 準備 Logo 資源
-            logo_img, logo_text = None, ""
-            if logo_enabled:
-                logo_source = w_settings.get('logo_source', 'auto_detect')
-                logo_path = None
-                if logo_source == 'auto_detect':
-                    logo_path = get_logo_path(exif_data.get('Make', ''), str(self.asset_manager.default_logos_dir))
-                elif logo_source == 'select_from_library':
-                    logo_key = w_settings.get('logo_source_app', '')
-                    logo_path = next((p for p in self.asset_manager.get_default_logos() if Path(p).stem == logo_key),
-                                     None)
-                elif logo_source == 'my_custom_logo':
-                    logo_key = w_settings.get('logo_source_my_custom', '')
-                    logo_path = next((p for p in self.asset_manager.get_user_logos() if
-                                      self.asset_manager._create_key_from_name(Path(p).stem) == logo_key), None)
-                elif logo_source == 'custom_text':
-                    logo_text = w_settings.get('logo_text_custom', 'Logo')
-                if logo_path and os.path.exists(logo_path): logo_img = Image.open(logo_path).convert("RGBA")
-            # (B) 準備文字資源
-            watermark_text = ""
-            if text_enabled:
-                text_source = w_settings.get('text_source', 'exif')
-                if text_source == 'exif':
-                    formatted_parts = []
-                    if w_settings.get('exif_options', {}).get('model'): formatted_parts.append(
-                        exif_data.get('Model', ''))
-                    if w_settings.get('exif_options', {}).get('focal_length'): formatted_parts.append(
-                        f"{exif_data.get('FocalLength', '')}mm")
-                    if w_settings.get('exif_options', {}).get('aperture'): formatted_parts.append(
-                        f"f/{exif_data.get('FNumber', '')}")
-                    if w_settings.get('exif_options', {}).get('shutter'): formatted_parts.append(
-                        f"{exif_data.get('ExposureTime', '')}s")
-                    if w_settings.get('exif_options', {}).get('iso'): formatted_parts.append(
-                        f"ISO {exif_data.get('ISO', '')}")
-                    watermark_text = "  ".join(filter(None, formatted_parts))
-                elif text_source == 'custom':
-                    watermark_text = w_settings.get('text_custom', '')
-            # (C) 準備字體
-            font_size_ratio = w_settings.get('font_size', 20) / 100.0
-            base_font_size = max(12, int(min(img_w, img_h) * 0.04))
-            font_size = int(base_font_size * font_size_ratio)
-            font_color = w_settings.get('font_color', '#FFFFFFFF')
-            font_path = None
-            font_source = w_settings.get('font_family', 'system')
-            if font_source == 'my_custom':
-                font_key = w_settings.get('font_my_custom', '')
-                for path, families in self.asset_manager.get_user_fonts().items():
-                    if self.asset_manager._create_key_from_name(Path(path).stem) == font_key:
-                        font_path = path;
-                        break
-            try:
-                watermark_font = ImageFont.truetype(font_path, font_size) if font_path else ImageFont.load_default(
-                    font_size)
-                logo_font = ImageFont.truetype(font_path,
-                                               int(font_size * 1.2)) if font_path else ImageFont.load_default(
-                    int(font_size * 1.2))
-            except IOError:
-                watermark_font = ImageFont.load_default(font_size)
-                logo_font = ImageFont.load_default(int(font_size * 1.2))
-            # (D) 計算元素尺寸
-            draw_temp = ImageDraw.Draw(Image.new('RGBA', (1, 1)))
-            text_bbox = draw_temp.textbbox((0, 0), watermark_text, font=watermark_font)
-            text_w, text_h = (text_bbox[2] - text_bbox[0], text_bbox[3] - text_bbox[1]) if watermark_text else (0, 0)
-            logo_w, logo_h = 0, 0
-            if logo_img:
-                logo_h_scaled = int((img_h * 0.1) * (w_settings.get('logo_size', 30) / 50.0))
-                if logo_h_scaled > 0:
-                    logo_img = logo_img.resize((int(logo_img.width * (logo_h_scaled / logo_img.height)), logo_h_scaled),
-                                               Image.Resampling.LANCZOS)
-                    logo_w, logo_h = logo_img.size
-            elif logo_text:
-                logo_bbox = draw_temp.textbbox((0, 0), logo_text, font=logo_font)
-                logo_w, logo_h = logo_bbox[2] - logo_bbox[0], logo_bbox[3] - logo_bbox[1]
-            gap = int(font_size * 0.3)
-            # (E) 計算整體佈局與位置
-            layout = w_settings.get('layout', 'logo_left')
-            total_w, total_h = 0, 0
-            has_both = (logo_w > 0 and logo_h > 0) and (text_w > 0 and text_h > 0)
-            if layout in ['logo_top', 'logo_bottom']:
-                total_w = max(logo_w, text_w)
-                total_h = (logo_h + text_h + gap) if has_both else (logo_h or text_h)
-            else:
-                total_w = (logo_w + text_w + gap) if has_both else (logo_w or text_w)
-                total_h = max(logo_h, text_h)
-            area = w_settings.get('area', 'in_photo')
-            if not f_settings.get('enabled', True): area = 'in_photo'
-            target_rect = (photo_pos[0], photo_pos[1], img_w, img_h) if area == 'in_photo' else (0, 0, frame_w, frame_h)
-            padding = int(font_size * 0.5)
-            align = w_settings.get('align', 'bottom_center')
-            x, y = 0, 0
-            if 'left' in align:
-                x = target_rect[0] + padding
-            elif 'center' in align:
-                x = target_rect[0] + (target_rect[2] - total_w) / 2
-            elif 'right' in align:
-                x = target_rect[0] + target_rect[2] - total_w - padding
-            if area == 'in_photo':
-                if 'top' in align:
-                    y = target_rect[1] + padding
-                elif 'middle' in align:
-                    y = target_rect[1] + (target_rect[3] - total_h) / 2
-                elif 'bottom' in align:
-                    y = target_rect[1] + target_rect[3] - total_h - padding
-            else:
-                if 'top' in align:
-                    y = (padding_top - total_h) / 2
-                elif 'bottom' in align:
-                    y = photo_pos[1] + img_h + (padding_bottom - total_h) / 2
-                else:
-                    y = target_rect[1] + (target_rect[3] - total_h) / 2
-            # (F) 計算內部相對位置並繪製
-            logo_x_rel, logo_y_rel, text_x_rel, text_y_rel = 0, 0, 0, 0
-            if layout in ['logo_top', 'logo_bottom']:
-                if 'left' in align:
-                    logo_x_rel, text_x_rel = 0, 0
-                elif 'right' in align:
-                    logo_x_rel, text_x_rel = total_w - logo_w, total_w - text_w
-                else:
-                    logo_x_rel, text_x_rel = (total_w - logo_w) / 2, (total_w - text_w) / 2
-                if layout == 'logo_top':
-                    logo_y_rel, text_y_rel = 0, logo_h + gap
-                else:
-                    text_y_rel, logo_y_rel = 0, text_h + gap
-            else:
-                logo_y_rel, text_y_rel = (total_h - logo_h) / 2, (total_h - text_h) / 2
-                if layout == 'logo_right':
-                    text_x_rel, logo_x_rel = 0, text_w + gap
-                else:
-                    logo_x_rel, text_x_rel = 0, logo_w + gap
-            final_logo_pos = (int(x + logo_x_rel), int(y + logo_y_rel))
-            final_text_pos = (int(x + text_x_rel), int(y + text_y_rel))
-            if logo_enabled:
-                if logo_img:
-                    inner_canvas.paste(logo_img, final_logo_pos, logo_img)
-                elif logo_text:
-                    inner_draw.text(final_logo_pos, logo_text, font=logo_font, fill=font_color)
-            if text_enabled and watermark_text:
-                inner_draw.text(final_text_pos, watermark_text, font=watermark_font, fill=font_color)
-
-        # --- 4. 新增：繪製相框外部陰影 ---
-        if f_settings.get('enabled', True) and f_settings.get('frame_shadow', False):
-            # 1. 定義外部陰影參數
-            frame_shadow_blur = 20
-            frame_shadow_padding = int(frame_shadow_blur * 1.5)
-            frame_shadow_color = (0, 0, 0, 80)
-
-            # 2. 創建最終畫布，尺寸要比內部畫布大，以容納陰影
-            final_canvas_size = (frame_w + frame_shadow_padding * 2, frame_h + frame_shadow_padding * 2)
-            final_canvas = Image.new("RGBA", final_canvas_size, (0, 0, 0, 0))
-
-            # 3. 創建一個臨時圖層，繪製未模糊的相框形狀
-            shadow_layer = Image.new("RGBA", final_canvas_size, (0, 0, 0, 0))
-            shadow_draw = ImageDraw.Draw(shadow_layer)
-            shadow_shape_bounds = [
-                (frame_shadow_padding, frame_shadow_padding),
-                (frame_w + frame_shadow_padding, frame_h + frame_shadow_padding)
-            ]
-            shadow_draw.rounded_rectangle(shadow_shape_bounds, radius=frame_radius, fill=frame_shadow_color)
-
-            # 4. 模糊這個圖層
-            blurred_frame_shadow = shadow_layer.filter(ImageFilter.GaussianBlur(radius=frame_shadow_blur))
-
-            # 5. 將模糊後的陰影貼到最終畫布上
-            final_canvas.paste(blurred_frame_shadow, (0, 0), blurred_frame_shadow)
-
-            # 6. 將我們之前完成的所有內容 (inner_canvas) 貼到陰影之上
-            inner_canvas_pos = (frame_shadow_padding, frame_shadow_padding)
-            final_canvas.paste(inner_canvas, inner_canvas_pos, inner_canvas)
-
-            # 7. 返回帶有外部陰影的最終畫布
-            return final_canvas
-        else:
-            # 如果不啟用相框陰影，直接返回內部畫布
-            return inner_canvas
+    def _render_image_tiled_for_export(self, image_path: str, render_plan: RenderPlan, output_path: str,
+                                       exif_bytes: bytes = None) -> str:
+        """
+        為導出功能分帶渲染超大圖片 (全景拼接、高解析掃描)，並直接寫出 PNG。
+        無論使用哪個渲染器，超過門檻的圖片都會改走這條路徑，峰值記憶體不隨圖片尺寸增長。
+        """
+        exif_data = self.image_items.get(image_path, {}).get('exif', {})
+        return render_with_pil_tiled(image_path, output_path, exif_data, render_plan, exif_bytes)
 
     def _clear_preview(self):
         """清空預覽，隱藏所有物件並顯示提示文字"""
+        self._leave_zoom()
         self.current_image_path = None
-        self.original_pixmap = None
+        self.preview_proxy = None
         # 隱藏所有主要物件
+        self.frame_shadow_item.hide()
         self.frame_item.hide()
+        self.photo_shadow_item.hide()
         self.photo_item.hide()
         self.logo_item.hide()
         self.logo_text_item.hide()
@@ -1167,45 +707,71 @@ class GalleryView(QWidget):
 
         path = current_item.data(Qt.ItemDataRole.UserRole)
         if path != self.current_image_path:
+            self._leave_zoom()
             self.current_image_path = path
-            self.original_pixmap = QPixmap(path)
-
-            # 處理圖片載入失敗的情況
-            if self.original_pixmap.isNull():
-                # 這裡可以加入一個錯誤提示的對話框
-                self._on_delete_item_requested(path)  # 假設壞圖就直接刪除
-                return
-
-                # 新增：預先載入 PIL Image 並處理潛在錯誤
-            try:
-                # 使用 with 陳述式確保檔案被正確關閉
-                with Image.open(path) as img:
-                    self.original_pil_img = img
-                    # 強制載入圖像資料，將其讀入記憶體
-                    self.original_pil_img.load()
-            except Exception as e:
-                print(f"無法使用 Pillow 載入圖片 {path}: {e}")
-                self.original_pil_img = None
-                # 可以選擇彈出錯誤訊息或直接移除該項目
-                self._on_delete_item_requested(path)
-                return
+            self._request_previews()
 
-            self.blur_cache.clear()  # 換了新圖，清除模糊快取
-            self._update_display()
+    def _request_previews(self):
+        """
+        在背景載入目前選取圖片的代理圖，並預先載入列表中前後各兩張。
+        代理圖已經載入時立即顯示；否則保留上一張的畫面，直到背景解碼完成。
+        """
+        row = self.image_list.currentRow()
+        rows = [row] + [row + offset for offset in PREVIEW_PREFETCH_OFFSETS]
+        paths = [self.image_list.item(r).data(Qt.ItemDataRole.UserRole) for r in rows
+                 if 0 <= r < self.image_list.count()]
+        width, height = self._preview_device_size()
+        self.preview_loader.set_window(paths)
+
+        proxy = self.preview_loader.get(self.current_image_path, width, height)
+        if proxy is not None:
+            self._show_preview(proxy)
+        # 越前面的優先權越高：目前的圖片最先解碼，接著是下一張與上一張
+        for index, path in enumerate(paths):
+            self.preview_loader.request(path, width, height, priority=-index)
+
+    def _on_preview_loaded(self, path: str, proxy: PreviewProxy):
+        if path != self.current_image_path:
+            return  # 預先載入的相鄰圖片，留待切換時使用
+        if not self._preview_is_current() or proxy.image.width > self.preview_proxy.image.width:
+            self._show_preview(proxy)
+
+    def _on_preview_failed(self, path: str, error_message: str):
+        if path == self.current_image_path:
+            # 這裡可以加入一個錯誤提示的對話框
+            self._on_delete_item_requested(path)  # 假設壞圖就直接刪除
+
+    def _show_preview(self, proxy: PreviewProxy):
+        if proxy.pixmap is None:
+            # QPixmap 只能在主執行緒中建立；轉換後不再需要 QImage
+            proxy.pixmap = QPixmap.fromImage(proxy.qimage)
+            proxy.qimage = None
+        self.preview_proxy = proxy
+        self._update_display()
+
+    def set_preview_cache_budget(self, megabytes: int):
+        """調整預覽快取的記憶體上限 (設定頁面變更時呼叫)。"""
+        self.preview_cache.set_max_bytes(megabytes * 1024 ** 2)
+
+    def _preview_is_current(self) -> bool:
+        """畫面上的代理圖是否屬於目前選取的圖片 (新圖片可能還在背景解碼)。"""
+        return self.preview_proxy is not None and self.preview_proxy.path == self.current_image_path
+
+    def _preview_device_size(self) -> tuple[int, int]:
+        """預覽區域的裝置像素尺寸 (已考慮高解析度螢幕的 devicePixelRatio)。"""
+        view_size = self.image_preview_label.viewport().size()
+        dpr = self.image_preview_label.devicePixelRatioF()
+        return int(view_size.width() * dpr), int(view_size.height() * dpr)
 
     # vvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvv
     # --- 核心繪圖與更新 ---
     # vvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvv
 
-    def _update_frame_shadow(self, enabled: bool):
-        """僅更新相框陰影的啟用狀態"""
-        self.frame_shadow_effect.setEnabled(enabled)
-
     def _update_photo_shadow(self, enabled: bool):
         """僅更新照片陰影的啟用狀態"""
         f_settings = self.tabs._get_current_settings().get('frame', {})
         # 照片陰影也依賴於相框是否啟用
-        self.photo_shadow_effect.setEnabled(enabled and f_settings.get('enabled', True))
+        self.photo_shadow_item.setVisible(enabled and f_settings.get('enabled', True))
 
     def _update_frame_color(self, color_hex: str):
         """僅更新相框顏色（僅在純色模式下有效）"""
@@ -1218,7 +784,9 @@ class GalleryView(QWidget):
         僅重繪浮水印，而不重新計算整個場景佈局。
         它會使用快取的 `last_frame_rect` 和 `last_photo_rect`。
         """
-        if not self.last_frame_rect or not self.last_photo_rect or not self.current_image_path:
+        if not self._preview_is_current():
+            return  # 新圖片載入完成時會完整重繪
+        if not self.last_frame_rect or not self.last_photo_rect:
             # 如果沒有快取數據，執行一次完整更新來生成它
             self._update_display()
             return
@@ -1228,6 +796,21 @@ class GalleryView(QWidget):
         exif_data = self.image_items.get(self.current_image_path, {}).get('exif', {})
         self._update_watermark(self.last_frame_rect, self.last_photo_rect, w_settings, exif_data)
 
+    def _on_settings_changed(self, changes: dict):
+        """更新預覽，並把耗時回報給背景導出的調節器，讓導出在介面卡頓時讓出 CPU。"""
+        start = time.perf_counter()
+        self._handle_settings_change(changes)
+        if self._zoom_active:
+            self._refresh_zoom()
+        self.export_throttle.report_frame((time.perf_counter() - start) * 1000)
+
+    def _on_interaction_changed(self, active: bool):
+        """進入或離開拖動模式；離開時以完整品質重繪一次。"""
+        self._interactive = active
+        self.image_preview_label.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform, not active)
+        if not active:
+            self._update_display()
+
     def _handle_settings_change(self, changes: dict):
         """
         處理設定變更的智慧型插槽。
@@ -1250,9 +833,6 @@ class GalleryView(QWidget):
         needs_watermark_redraw = False
 
         # --- 處理相框的局部變更 ---
-        if 'frame_shadow' in frame_changes:
-            self._update_frame_shadow(frame_changes['frame_shadow'])
-
         if 'photo_shadow' in frame_changes:
             self._update_photo_shadow(frame_changes['photo_shadow'])
 
@@ -1271,7 +851,7 @@ class GalleryView(QWidget):
         """
         核心更新函數。它計算佈局，然後調用各自的輔助函數來更新圖形物件。
         """
-        if not self.current_image_path or not self.original_pixmap or self.original_pixmap.isNull():
+        if not self.current_image_path:
             # 如果沒有圖片，確保場景是空的但提示文字可見
             self._clear_preview()
 
@@ -1294,6 +874,10 @@ class GalleryView(QWidget):
             self.prompt_item.show()
             return
 
+        if not self._preview_is_current():
+            # 新選取圖片的代理圖還在背景解碼：保留上一張的畫面，載入完成後再更新
+            return
+
         # 有圖片，隱藏提示文字
         self.prompt_item.hide()
 
@@ -1302,13 +886,22 @@ class GalleryView(QWidget):
         w_settings = all_settings.get('watermark', {})
         exif_data = self.image_items.get(self.current_image_path, {}).get('exif', {})
 
-        # 1. 計算佈局尺寸
-        view_size = self.image_preview_label.viewport().size()
+        # 1. 計算佈局尺寸；相框陰影畫在場景中，四周保留陰影的寬度
+        shadow_margin = self.FRAME_SHADOW_BLUR if f_settings.get('frame_shadow', False) else 0
+        view_size = self.image_preview_label.viewport().size().shrunkBy(
+            QMargins(shadow_margin, shadow_margin, shadow_margin, shadow_margin))
         if view_size.width() <= 20 or view_size.height() <= 20:
             return
 
+        # 預覽區域變大 (例如放大視窗) 而代理圖的解析度不足時，才在背景以新的尺寸重新解碼，
+        # 完成前先放大顯示目前的代理圖
+        dpr = self.image_preview_label.devicePixelRatioF()
+        device_size = self._preview_device_size()
+        if not self.preview_proxy.covers(*device_size):
+            self.preview_loader.request(self.current_image_path, *device_size)
+
         # 步驟 A: 獲取原始圖片尺寸，並計算其在 view_size 中按比例縮放後的大小
-        img_size = self.original_pixmap.size()
+        img_size = QSize(*self.preview_proxy.full_size)
         image_fitted_in_view = img_size.scaled(view_size, Qt.AspectRatioMode.KeepAspectRatio)
 
         # 步驟 B: 以圖片實際佔據的區域大小為基準來計算 base_padding，確保比例正確
@@ -1326,20 +919,36 @@ class GalleryView(QWidget):
         if image_area_w <= 0 or image_area_h <= 0:
             return
 
-        scaled_photo = self.original_pixmap.scaled(
-            QSize(int(image_area_w), int(image_area_h)),
-            Qt.AspectRatioMode.KeepAspectRatio,
-            Qt.TransformationMode.SmoothTransformation
-        )
+        # 以裝置像素縮放，高解析度螢幕上照片依然清晰；版面仍以邏輯像素計算。
+        # 快取鍵是照片實際的縮放尺寸，只改變另一個方向的留白或圓角時照片尺寸不變，直接沿用
+        proxy = self.preview_proxy
+        target_size = QSize(*proxy.image.size).scaled(
+            QSize(int(image_area_w * dpr), int(image_area_h * dpr)), Qt.AspectRatioMode.KeepAspectRatio)
+        scaled_key = ('scaled', proxy.identity, proxy.image.size, target_size.width(), target_size.height(), dpr)
+        scaled_photo = self.preview_cache.get(scaled_key)
+        if scaled_photo is None and self._interactive:
+            # 拖動滑桿時：以較低的解析度快速縮放 (不放入快取)，放開後再以完整品質重繪
+            scale = self.DRAG_RESOLUTION_SCALE
+            drag_size = QSize(max(1, int(target_size.width() * scale / dpr)),
+                              max(1, int(target_size.height() * scale / dpr)))
+            scaled_photo = self._mip_pixmap(proxy, drag_size).scaled(
+                drag_size, Qt.AspectRatioMode.IgnoreAspectRatio, Qt.TransformationMode.FastTransformation)
+            scaled_photo.setDevicePixelRatio(scale)
+        elif scaled_photo is None:
+            scaled_photo = self._mip_pixmap(proxy, target_size).scaled(
+                target_size, Qt.AspectRatioMode.IgnoreAspectRatio, Qt.TransformationMode.SmoothTransformation)
+            scaled_photo.setDevicePixelRatio(dpr)
+            self.preview_cache.put(scaled_key, scaled_photo, scaled_photo.width() * scaled_photo.height() * 4)
+        photo_size = scaled_photo.deviceIndependentSize().toSize()
 
         # 記錄下當前預覽照片的尺寸，以便導出時計算縮放比例
-        self.last_preview_photo_size = scaled_photo.size()
+        self.last_preview_photo_size = photo_size
 
-        frame_w = scaled_photo.width() + padding_sides * 2
-        frame_h = scaled_photo.height() + padding_top + padding_bottom
+        frame_w = photo_size.width() + padding_sides * 2
+        frame_h = photo_size.height() + padding_top + padding_bottom
 
         frame_rect = QRectF(0, 0, frame_w, frame_h)
-        photo_rect = QRectF(padding_sides, padding_top, scaled_photo.width(), scaled_photo.height())
+        photo_rect = QRectF(padding_sides, padding_top, photo_size.width(), photo_size.height())
 
         self.last_frame_rect = frame_rect
         self.last_photo_rect = photo_rect
@@ -1350,20 +959,192 @@ class GalleryView(QWidget):
         self._update_watermark(frame_rect, photo_rect, w_settings, exif_data)
 
         # 3. 更新場景並讓 View 適應內容
-        self.scene.setSceneRect(frame_rect)
-        self.image_preview_label.fitInView(frame_rect, Qt.AspectRatioMode.KeepAspectRatio)
+        scene_rect = frame_rect.adjusted(-shadow_margin, -shadow_margin, shadow_margin, shadow_margin)
+        self.scene.setSceneRect(scene_rect)
+        if self._zoom_active:
+            # 1:1 檢視中：預覽場景仍照常更新 (作為尚未渲染區域的底圖)，畫面則重新渲染可見區域
+            self._refresh_zoom()
+        else:
+            self.image_preview_label.fitInView(scene_rect, Qt.AspectRatioMode.KeepAspectRatio)
+
+    # --- 1:1 檢視 ---
+
+    def eventFilter(self, obj, event):
+        if obj is self.image_preview_label.viewport() and event.type() == QEvent.Type.MouseButtonDblClick \
+                and event.button() == Qt.MouseButton.LeftButton:
+            if self._zoom_active:
+                self.zoom_button.setChecked(False)
+            else:
+                self._zoom_anchor = event.position()
+                self.zoom_button.setChecked(True)
+            return True
+        if obj is self.image_preview_label and event.type() == QEvent.Type.KeyPress \
+                and event.key() == Qt.Key.Key_Escape and self._zoom_active:
+            self.zoom_button.setChecked(False)
+            return True
+        return super().eventFilter(obj, event)
+
+    def _on_zoom_toggled(self, checked: bool):
+        if checked:
+            anchor, self._zoom_anchor = self._zoom_anchor, None
+            self._enter_zoom(anchor)
+        else:
+            self._exit_zoom()
+
+    def _enter_zoom(self, anchor: QPointF = None):
+        """以輸出解析度顯示；anchor 為預覽中要放大的位置 (檢視座標)，未指定時為畫面中心。"""
+        if not self._preview_is_current() or not self.last_frame_rect:
+            self.zoom_button.blockSignals(True)
+            self.zoom_button.setChecked(False)
+            self.zoom_button.blockSignals(False)
+            return
+        view = self.image_preview_label
+        anchor_in_frame = view.mapToScene((anchor or QPointF(view.viewport().rect().center())).toPoint())
+
+        self._zoom_active = True
+        self._zoom_plan_key = None
+        self._refresh_zoom()
+        view.setScene(self.zoom_scene)
+        view.resetTransform()
+        # 一個輸出像素對應一個裝置像素
+        dpr = view.devicePixelRatioF()
+        view.scale(1 / dpr, 1 / dpr)
+        view.centerOn(self._zoom_offset + anchor_in_frame.x() * self._zoom_frame_scale,
+                      self._zoom_offset + anchor_in_frame.y() * self._zoom_frame_scale)
+        view.setFocus()
+        self._schedule_zoom_render()
+
+    def _exit_zoom(self, redraw: bool = True):
+        self._zoom_active = False
+        self.zoom_timer.stop()
+        self.zoom_worker.close()
+        self._zoom_plan = self._zoom_plan_key = None
+        self._zoom_region = self._zoom_requested = None
+        self.zoom_region_item.setPixmap(QPixmap())
+        self.zoom_placeholder_item.setPixmap(QPixmap())
+        self.image_preview_label.setScene(self.scene)
+        self.image_preview_label.resetTransform()
+        if redraw:
+            self._update_display()
+
+    def _leave_zoom(self):
+        """切換或清除圖片時離開 1:1 檢視 (由呼叫端負責之後的重繪)。"""
+        if not self._zoom_active:
+            return
+        self.zoom_button.blockSignals(True)
+        self.zoom_button.setChecked(False)
+        self.zoom_button.blockSignals(False)
+        self._exit_zoom(redraw=False)
+
+    def _refresh_zoom(self):
+        """
+        設定或版面改變時重新編譯渲染計畫。計畫不變時只檢查可見區域；
+        改變時更新輸出尺寸與底圖 (由目前的預覽畫面放大而來)，並重新渲染可見區域。
+        """
+        if not self._preview_is_current() or not self.last_frame_rect:
+            return
+        plan = self._compile_render_plan()
+        plan_key = (plan.fingerprint(), self.last_frame_rect.width(), self.last_frame_rect.height())
+        if plan_key == self._zoom_plan_key:
+            self._schedule_zoom_render()
+            return
+        self._zoom_plan, self._zoom_plan_key = plan, plan_key
+
+        out_w, out_h = output_size(plan, *self.preview_proxy.full_size)
+        offset = FRAME_SHADOW_PADDING if plan.frame_shadow else 0
+        frame_w = out_w - offset * 2
+        self._zoom_offset = offset
+        self._zoom_frame_scale = frame_w / self.last_frame_rect.width()
+        if self.zoom_scene.sceneRect() != QRectF(0, 0, out_w, out_h):
+            # 輸出尺寸改變時，舊的區域位置已不正確
+            self.zoom_region_item.setPixmap(QPixmap())
+            self.zoom_scene.setSceneRect(0, 0, out_w, out_h)
+
+        dpr = self.image_preview_label.devicePixelRatioF()
+        frame_rect = self.last_frame_rect
+        placeholder = QPixmap(max(1, int(frame_rect.width() * dpr)), max(1, int(frame_rect.height() * dpr)))
+        placeholder.fill(Qt.GlobalColor.transparent)
+        painter = QPainter(placeholder)
+        painter.setRenderHints(QPainter.RenderHint.Antialiasing | QPainter.RenderHint.SmoothPixmapTransform)
+        self.scene.render(painter, QRectF(placeholder.rect()), frame_rect)
+        painter.end()
+        self.zoom_placeholder_item.setPixmap(placeholder)
+        self.zoom_placeholder_item.setScale(frame_w / placeholder.width())
+        self.zoom_placeholder_item.setPos(offset, offset)
+
+        # 舊計畫渲染的區域仍先留在畫面上，直到新的區域完成
+        self._zoom_region = self._zoom_requested = None
+        self._zoom_accept_from = self.zoom_worker.latest_request + 1
+        self._schedule_zoom_render()
+
+    def _schedule_zoom_render(self):
+        if self._zoom_active:
+            self.zoom_timer.start()
+
+    def _render_zoom_region(self):
+        """可見區域尚未渲染時，要求背景渲染它 (四周多留一些，小幅平移時不必重新渲染)。"""
+        if not self._zoom_active or self._zoom_plan is None:
+            return
+        view = self.image_preview_label
+        scene_rect = self.zoom_scene.sceneRect()
+        visible = view.mapToScene(view.viewport().rect()).boundingRect().intersected(scene_rect)
+        if visible.isEmpty():
+            return
+        box = (visible.left(), visible.top(), visible.right(), visible.bottom())
+        if region_covers(self._zoom_region, box) or region_covers(self._zoom_requested, box):
+            return
+        region = expand_region(box, ZOOM_REGION_MARGIN, int(scene_rect.width()), int(scene_rect.height()))
+        self._zoom_requested = region
+        exif_data = self.image_items.get(self.current_image_path, {}).get('exif', {})
+        self.zoom_worker.request(self.current_image_path, self._zoom_plan, exif_data, region)
+
+    def _on_zoom_rendered(self, request_id: int, box, image: QImage):
+        if not self._zoom_active or request_id < self._zoom_accept_from:
+            return
+        self.zoom_region_item.setPixmap(QPixmap.fromImage(image))
+        self.zoom_region_item.setPos(box[0], box[1])
+        self._zoom_region = box
+
+    def _on_zoom_failed(self, request_id: int, error_message: str):
+        if request_id == self.zoom_worker.latest_request:
+            self._zoom_requested = None  # 下次平移時重試
+
+    def _mip_pixmap(self, proxy: PreviewProxy, target_size: QSize) -> QPixmap:
+        """
+        返回 mip 鏈中最適合縮放到 target_size 的一層。各層依序由上一層減半產生並放入預覽快取，
+        視窗大小改變時只需要從相近的一層縮放，而不是每次都從代理圖的完整解析度縮放。
+        """
+        level = mip_level(proxy.pixmap.width(), proxy.pixmap.height(), target_size.width(), target_size.height())
+        pixmap = proxy.pixmap
+        for n in range(1, level + 1):
+            key = ('mip', proxy.identity, proxy.image.size, n)
+            cached = self.preview_cache.get(key)
+            if cached is None:
+                cached = pixmap.scaled(pixmap.width() // 2, pixmap.height() // 2,
+                                       Qt.AspectRatioMode.IgnoreAspectRatio, Qt.TransformationMode.SmoothTransformation)
+                self.preview_cache.put(key, cached, cached.width() * cached.height() * 4)
+            pixmap = cached
+        return pixmap
 
     def _update_frame(self, frame_rect: QRectF, photo_rect: QRectF, f_settings: dict):
-        """更新相框物件"""
-        self.frame_shadow_effect.setEnabled(f_settings.get('frame_shadow', False))
+        """更新相框物件與相框外的陰影"""
+        self._current_blur_key = None
+        frame_enabled = f_settings.get('enabled', True)
+        frame_radius = f_settings.get('frame_radius', 5) / 100.0 * min(frame_rect.width(), frame_rect.height()) / 2
 
-        if not f_settings.get('enabled', True):
+        # 相框停用時，陰影落在照片 (相框與照片同大小) 的圓角外
+        self.frame_shadow_item.setVisible(f_settings.get('frame_shadow', False))
+        if f_settings.get('frame_shadow', False):
+            shadow_radius = frame_radius if frame_enabled else \
+                f_settings.get('photo_radius', 3) / 100.0 * min(photo_rect.width(), photo_rect.height()) / 2
+            self.frame_shadow_item.set_rect(frame_rect, shadow_radius)
+
+        if not frame_enabled:
             self.frame_item.hide()
             return
 
         self.frame_item.show()
         frame_style = f_settings.get('style', 'solid_color')
-        frame_radius = f_settings.get('frame_radius', 5) / 100.0 * min(frame_rect.width(), frame_rect.height()) / 2
 
         path = QPainterPath()
         path.addRoundedRect(frame_rect, frame_radius, frame_radius)
@@ -1376,53 +1157,43 @@ class GalleryView(QWidget):
             self.frame_item.setPen(QPen(Qt.PenStyle.NoPen))
         elif frame_style == 'blur_extend':
             blur_radius = f_settings.get('blur_radius', 20)
-            # 使用我們在 _on_list_item_selected 中預載入的 PIL Image
-            if not self.original_pil_img:
+            # 使用預覽代理圖產生模糊背景，不需要原圖的完整像素
+            if not self.preview_proxy:
                 self.frame_item.setBrush(QBrush(QColor("transparent")))  # 如果圖像載入失敗則設為透明
                 return
-            cache_key = (self.current_image_path, blur_radius, int(frame_rect.width()), int(frame_rect.height()))
-
-            if cache_key in self.blur_cache:
-                blurred_pixmap = self.blur_cache[cache_key]
-            else:
-                # --- 開始修正邏輯 ---
-                pil_img = self.original_pil_img
-                target_w, target_h = int(frame_rect.width()), int(frame_rect.height())
-                img_w, img_h = pil_img.size
-
-                if target_w == 0 or target_h == 0 or img_w == 0 or img_h == 0:
-                    return  # 避免除以零錯誤
-
-                # 1. 計算統一的縮放比例，以「覆蓋」目標區域
-                scale = max(target_w / img_w, target_h / img_h)
-
-                # 2. 等比例縮放
-                new_w, new_h = int(img_w * scale), int(img_h * scale)
-                resized_pil = pil_img.resize((new_w, new_h), Image.Resampling.LANCZOS)
-
-                # 3. 從中心裁切到目標尺寸
-                left = (new_w - target_w) / 2
-                top = (new_h - target_h) / 2
-                right = (new_w + target_w) / 2
-                bottom = (new_h + target_h) / 2
-                cropped_pil = resized_pil.crop((left, top, right, bottom))
-
-                # 4. 僅在 blur_radius > 0 時應用模糊
-                if blur_radius > 0:
-                    blurred_pil = cropped_pil.filter(ImageFilter.GaussianBlur(radius=blur_radius))
-                else:
-                    blurred_pil = cropped_pil  # 半徑為0時，使用清晰的裁切後圖像
-                # --- 結束修正邏輯 ---
+            frame_w, frame_h = int(frame_rect.width()), int(frame_rect.height())
+            if frame_w <= 0 or frame_h <= 0:
+                return  # 避免除以零錯誤
+            # 尺寸與半徑都量化後才作為快取鍵：連續縮放視窗或拖動滑桿時大多能沿用已算好的背景；
+            # 鍵值包含代理圖的解析度，較小的代理圖算出的背景不會在較大的代理圖載入後繼續沿用
+            bucket_w, bucket_h = blur_bucket_size(frame_w, frame_h)
+            radius = quantize_blur_radius(blur_radius)
+            cache_key = ('blur', self.preview_proxy.identity, self.preview_proxy.image.size, radius, bucket_w, bucket_h)
+
+            self._current_blur_key = cache_key
+            blurred_image = self.preview_cache.get(cache_key)
+            if blurred_image is None and self._interactive:
+                # 拖動滑桿時只顯示近似背景，放開後的完整重繪才計算完整的背景
+                blurred_image = render_blur_approximation(self.preview_proxy.image, bucket_w, bucket_h, radius)
+            elif blurred_image is None:
+                # 完整的背景在背景執行緒中計算，先顯示放大的低解析度近似背景，完成後再替換
+                self.blur_worker.request(cache_key, self.preview_proxy.image, bucket_w, bucket_h, radius)
+                blurred_image = render_blur_approximation(self.preview_proxy.image, bucket_w, bucket_h, radius)
+            self._set_blur_brush(blurred_image, frame_rect)
+            self.frame_item.setPen(QPen(Qt.PenStyle.NoPen))
 
-                blurred_qimage = ImageQt(blurred_pil)
-                blurred_pixmap = QPixmap.fromImage(blurred_qimage)
-                # 將 pixmap 存入快取，但也要將 qimage 物件一起存入，防止其被回收
-                self.blur_cache[cache_key] = (blurred_pixmap, blurred_qimage)
+    def _set_blur_brush(self, blurred_image: QImage, frame_rect: QRectF):
+        """背景可能按級距算得稍大或是低解析度的近似背景，以畫刷變換縮放到剛好覆蓋相框。"""
+        brush = QBrush(blurred_image)
+        brush.setTransform(QTransform.fromScale(frame_rect.width() / blurred_image.width(),
+                                                frame_rect.height() / blurred_image.height()))
+        self.frame_item.setBrush(brush)
 
-                # 從快取中獲取 pixmap
-                pixmap_to_use, _ = self.blur_cache[cache_key]
-                self.frame_item.setBrush(QBrush(pixmap_to_use))
-                self.frame_item.setPen(QPen(Qt.PenStyle.NoPen))
+    def _on_blur_finished(self, cache_key, blurred_image: QImage):
+        self.preview_cache.put(cache_key, blurred_image, blurred_image.sizeInBytes())
+        # 設定已經改變 (例如半徑又被拖動) 的結果只留在快取中，不替換畫面
+        if cache_key == self._current_blur_key and self.last_frame_rect is not None:
+            self._set_blur_brush(blurred_image, self.last_frame_rect)
 
     def _update_photo(self, photo_rect: QRectF, scaled_photo: QPixmap, f_settings: dict):
         """
@@ -1446,8 +1217,11 @@ class GalleryView(QWidget):
         # 3. 確保沒有邊框被繪製
         self.photo_item.setPen(QPen(Qt.PenStyle.NoPen))
 
-        # 4. 啟用或禁用陰影效果
-        self.photo_shadow_effect.setEnabled(f_settings.get('photo_shadow', True) and f_settings.get('enabled', True))
+        # 4. 照片陰影 (只在尺寸或圓角改變時重新產生)
+        photo_shadow = f_settings.get('photo_shadow', True) and f_settings.get('enabled', True)
+        self.photo_shadow_item.setVisible(photo_shadow)
+        if photo_shadow:
+            self.photo_shadow_item.set_rect(photo_rect, photo_radius)
 
     def _update_watermark(self, frame_rect: QRectF, photo_rect: QRectF, w_settings: dict, exif_data: dict):
         """完整實現：更新浮水印文字和 Logo 物件"""
@@ -1463,41 +1237,21 @@ class GalleryView(QWidget):
             return
 
         # 1. 準備 Logo
-        logo_pixmap = None
+        logo_path = None
         logo_text = ""
         if logo_enabled:
-            logo_source = w_settings.get('logo_source', 'auto_detect')
-            if logo_source == 'auto_detect':
-                make = exif_data.get('Make', '')
-                logo_path = get_logo_path(make, str(self.asset_manager.default_logos_dir))
-                if logo_path: logo_pixmap = QPixmap(logo_path)
-            elif logo_source == 'select_from_library':
-                logo_key = w_settings.get('logo_source_app', '')
-                logo_path = next((p for p in self.asset_manager.get_default_logos() if Path(p).stem == logo_key), None)
-                if logo_path: logo_pixmap = QPixmap(logo_path)
-            elif logo_source == 'my_custom_logo':
-                logo_key = w_settings.get('logo_source_my_custom', '')
-                logo_path = next((p for p in self.asset_manager.get_user_logos() if
-                                  self.asset_manager._create_key_from_name(Path(p).stem) == logo_key), None)
-                if logo_path: logo_pixmap = QPixmap(logo_path)
-            elif w_settings.get('logo_source') == 'custom_text':
+            if w_settings.get('logo_source') == 'custom_text':
                 logo_text = w_settings.get('logo_text_custom', 'Logo')
+            else:
+                logo_path = self.watermark_resources.logo_path(w_settings, exif_data)
 
         # 2. 準備文字
         watermark_text = ""
         if text_enabled:
             text_source = w_settings.get('text_source', 'exif')
             if text_source == 'exif':
-                parts = []
-                exif_options = w_settings.get('exif_options', {})
-                if exif_options.get('model') and exif_data.get('Model'): parts.append(exif_data['Model'])
-                if exif_options.get('focal_length') and exif_data.get('FocalLength'): parts.append(
-                    f"{exif_data['FocalLength']}mm")
-                if exif_options.get('aperture') and exif_data.get('FNumber'): parts.append(f"f/{exif_data['FNumber']}")
-                if exif_options.get('shutter') and exif_data.get('ExposureTime'): parts.append(
-                    f"{exif_data['ExposureTime']}s")
-                if exif_options.get('iso') and exif_data.get('ISO'): parts.append(f"ISO {exif_data['ISO']}")
-                watermark_text = "  ".join(parts)
+                watermark_text = self.watermark_resources.exif_text(
+                    self.current_image_path, exif_data, w_settings.get('exif_options', {}))
             elif text_source == 'custom':
                 watermark_text = w_settings.get('text_custom', '')
 
@@ -1507,33 +1261,20 @@ class GalleryView(QWidget):
         font_size = int(base_font_size * font_size_ratio)
         font_color = QColor(w_settings.get('font_color', '#FFFFFFFF'))
 
-        font_family_name = "Arial"
-        font_source = w_settings.get('font_family', 'system')
-        if font_source == 'system':
-            font_family_name = w_settings.get('font_system', 'Arial')
-        elif font_source == 'my_custom':
-            font_key = w_settings.get('font_my_custom', '')
-            user_fonts = self.asset_manager.get_user_fonts()
-            for path, families in user_fonts.items():
-                if self.asset_manager._create_key_from_name(Path(path).stem) == font_key:
-                    font_family_name = families[0] if families else "Arial"
-                    break
-
-        watermark_font = QFont(font_family_name, font_size)
-        logo_font = QFont(font_family_name, int(font_size * 1.2))
+        font_family_name = self.watermark_resources.font_family(w_settings)
+        watermark_font, fm = self.watermark_resources.font(font_family_name, font_size)
+        logo_font, logo_fm = self.watermark_resources.font(font_family_name, int(font_size * 1.2))
 
         # 4. 計算尺寸和位置
-        fm = QFontMetrics(watermark_font)
         text_rect = fm.boundingRect(watermark_text)
-        logo_fm = QFontMetrics(logo_font)
         logo_text_rect = logo_fm.boundingRect(logo_text)
 
-        if logo_pixmap and not logo_pixmap.isNull():
+        logo_pixmap = None
+        if logo_path:
             # 將 logo 高度的計算基準改為 photo_rect 的高度，並與 logo_size 設定關聯
             base_logo_height = photo_rect.height() * 0.1  # 例如，基礎大小為照片高度的 10%
             logo_size_ratio = w_settings.get('logo_size', 30) / 50.0  # 獲取 UI 上的 logo 尺寸比例
-            logo_h_scaled = int(base_logo_height * logo_size_ratio)
-            logo_pixmap = logo_pixmap.scaledToHeight(logo_h_scaled, Qt.TransformationMode.SmoothTransformation)
+            logo_pixmap = self.watermark_resources.logo_pixmap(logo_path, int(base_logo_height * logo_size_ratio))
 
         gap = int(font_size * 0.3)
         logo_w = logo_pixmap.width() if logo_pixmap and not logo_pixmap.isNull() else logo_text_rect.width()
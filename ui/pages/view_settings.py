@@ -1,16 +1,23 @@
 # ui/pages/view_settings.py
 from PyQt6 import uic
+from PyQt6.QtCore import QThreadPool, pyqtSignal
 from PyQt6.QtWidgets import QWidget
 from qfluentwidgets import setTheme, SystemThemeListener, MessageBox
 
 # 匯入設定檔
 from core.config import LANGUAGES, THEMES
+from core.preview_proxy import DEFAULT_PREVIEW_CACHE_MB, PREVIEW_CACHE_SETTINGS_KEY
+from core.render_cache import CACHE_SETTINGS_KEY, CacheSizeTask, DEFAULT_MAX_MB
+from core.renderer_benchmark import BENCHMARK_CASES, BENCHMARK_SETTINGS_KEY, RendererBenchmarkTask, choose_renderer, \
+    default_renderer, is_result_current
 from core.settings_manager import SettingsManager
 from core.translator import Translator
-from core.utils import resource_path_str
+from core.utils import format_bytes, resource_path_str
 
 
 class SettingsView(QWidget):
+    # 預覽快取的記憶體上限 (MB) 改變時發出，讓圖庫頁面立即套用
+    previewCacheChanged = pyqtSignal(int)
 
     def __init__(self, translator: Translator, settings: SettingsManager, theme_listener: SystemThemeListener,
                  parent=None):
@@ -26,10 +33,19 @@ class SettingsView(QWidget):
         # --- 新增 ---
         # 建立一個空的字典，用於儲存翻譯後的主題名稱與原始英文鍵的對應關係
         self.reverse_theme_map = {}
+        # 正在執行的渲染器基準測試 (同一時間只執行一個)
+        self.benchmark_task = None
+        # 渲染快取的佔用空間在背景計算；None 代表尚未算出
+        self.cache_size_task = None
+        self.render_cache_bytes = None
 
         self._init_ui()
         self._connect_signals()
 
+        # 這台電腦還沒有 (或只有過期的) 基準測試結果時，在背景自動測試一次
+        if not is_result_current(self.settings.get(BENCHMARK_SETTINGS_KEY)):
+            self._run_benchmark()
+
     def _init_ui(self):
         """初始化此頁面的 UI 狀態"""
         self.languageComboBox.addItems(LANGUAGES.keys())
@@ -42,11 +58,19 @@ class SettingsView(QWidget):
         theme_name = self.settings.get("theme", "System")
         self.themeComboBox.setCurrentText(theme_name)
 
+        self.renderCacheSwitch.setChecked(bool((self.settings.get(CACHE_SETTINGS_KEY) or {}).get('enabled')))
+        self.previewCacheSpinBox.setValue(self.settings.get(PREVIEW_CACHE_SETTINGS_KEY, DEFAULT_PREVIEW_CACHE_MB))
+
         self._update_ui_texts()
+        self._refresh_cache_size()
 
     def _connect_signals(self):
         self.languageComboBox.currentTextChanged.connect(self._on_language_changed)
         self.themeComboBox.currentTextChanged.connect(self._on_theme_changed)
+        self.benchmarkButton.clicked.connect(self._run_benchmark)
+        self.renderCacheSwitch.checkedChanged.connect(self._on_render_cache_toggled)
+        self.clearCacheButton.clicked.connect(self._on_clear_cache)
+        self.previewCacheSpinBox.valueChanged.connect(self._on_preview_cache_changed)
 
     def _on_language_changed(self, lang_name: str):
         """語言改變時，僅儲存設定並發射信號"""
@@ -79,6 +103,114 @@ class SettingsView(QWidget):
         self.settings.set("theme", original_theme_key)
         print(f"Theme setting automatically saved: {original_theme_key}")
 
+    def _run_benchmark(self):
+        """在執行緒池中比較兩個匯出渲染器，完成後把結果寫入設定。"""
+        if self.benchmark_task:
+            return
+        self.benchmark_task = RendererBenchmarkTask()
+        self.benchmark_task.setAutoDelete(False)
+        self.benchmark_task.signals.progress.connect(self._on_benchmark_progress)
+        self.benchmark_task.signals.finished.connect(self._on_benchmark_finished)
+        self.benchmark_task.signals.error.connect(self._on_benchmark_error)
+        self.benchmarkButton.setEnabled(False)
+        self._on_benchmark_progress(0, len(BENCHMARK_CASES), "")
+        QThreadPool.globalInstance().start(self.benchmark_task)
+
+    def _on_benchmark_progress(self, current: int, total: int, case_name: str):
+        self.rendererDetailLabel.setText(self.translator.get(
+            "renderer_benchmark_running", "Benchmarking renderers... ({current}/{total})"
+        ).format(current=current + 1, total=total))
+
+    def _on_benchmark_finished(self, result: dict):
+        self.settings.set(BENCHMARK_SETTINGS_KEY, result)
+        self.benchmark_task = None
+        self.benchmarkButton.setEnabled(True)
+        self._update_benchmark_texts()
+
+    def _on_benchmark_error(self, error_message: str):
+        self.benchmark_task = None
+        self.benchmarkButton.setEnabled(True)
+        self._update_benchmark_texts()
+        self.rendererDetailLabel.setText(
+            self.translator.get("renderer_benchmark_failed", "Benchmark failed: {error}").format(error=error_message))
+
+    def _update_benchmark_texts(self):
+        """顯示目前選用的匯出渲染器與基準測試結果。"""
+        tr = self.translator.get
+        renderer_names = {'pil': 'PIL', 'qt': 'Qt'}
+        result = self.settings.get(BENCHMARK_SETTINGS_KEY)
+        renderer = renderer_names[choose_renderer(result)]
+
+        if not is_result_current(result):
+            self.rendererResultLabel.setText(tr(
+                "renderer_benchmark_none", "Not benchmarked on this machine yet. Using the default: {renderer}."
+            ).format(renderer=renderer_names[default_renderer()]))
+            self.rendererDetailLabel.setText("")
+            return
+
+        if result.get('consistent'):
+            summary = tr("renderer_benchmark_result",
+                         "Using {renderer} (the faster renderer on this machine).").format(renderer=renderer)
+        else:
+            summary = tr("renderer_benchmark_inconsistent",
+                         "The two renderers differ beyond tolerance (mean difference {diff}). "
+                         "Using the default: {renderer}.").format(diff=result.get('max_mean_diff'), renderer=renderer)
+        self.rendererResultLabel.setText(summary)
+        self.rendererDetailLabel.setText(tr(
+            "renderer_benchmark_detail",
+            "PIL {pil_ms} ms, Qt {qt_ms} ms, mean pixel difference {diff}. Measured at {timestamp}."
+        ).format(pil_ms=result.get('pil_ms'), qt_ms=result.get('qt_ms'), diff=result.get('max_mean_diff'),
+                 timestamp=result.get('timestamp')))
+
+    def _on_render_cache_toggled(self, enabled: bool):
+        cache_settings = dict(self.settings.get(CACHE_SETTINGS_KEY) or {})
+        cache_settings.setdefault('max_mb', DEFAULT_MAX_MB)
+        cache_settings['enabled'] = enabled
+        self.settings.set(CACHE_SETTINGS_KEY, cache_settings)
+        print(f"Render cache setting saved: {enabled}")
+
+    def _on_preview_cache_changed(self, megabytes: int):
+        self.settings.set(PREVIEW_CACHE_SETTINGS_KEY, megabytes)
+        self.previewCacheChanged.emit(megabytes)
+
+    def _on_clear_cache(self):
+        self._refresh_cache_size(clear=True)
+
+    def _refresh_cache_size(self, clear: bool = False):
+        """在執行緒池中重新計算 (或先清除再計算) 渲染快取的佔用空間，完成後更新說明文字。"""
+        if self.cache_size_task:
+            return
+        self.cache_size_task = CacheSizeTask(clear)
+        self.cache_size_task.setAutoDelete(False)
+        self.cache_size_task.signals.finished.connect(self._on_cache_size_finished)
+        self.cache_size_task.signals.error.connect(lambda message: self._on_cache_size_finished(None))
+        self.render_cache_bytes = None
+        # 計算 (或清除) 完成前不接受再次清除
+        self.clearCacheButton.setEnabled(False)
+        self._update_cache_texts()
+        QThreadPool.globalInstance().start(self.cache_size_task)
+
+    def _on_cache_size_finished(self, size):
+        self.cache_size_task = None
+        self.render_cache_bytes = size
+        self.clearCacheButton.setEnabled(True)
+        self._update_cache_texts()
+
+    def _update_cache_texts(self):
+        """顯示渲染快取目前的佔用空間 (背景計算中時顯示提示) 與容量上限。"""
+        tr = self.translator.get
+        max_mb = (self.settings.get(CACHE_SETTINGS_KEY) or {}).get('max_mb', DEFAULT_MAX_MB)
+        if self.render_cache_bytes is not None:
+            used = format_bytes(self.render_cache_bytes)
+        elif self.cache_size_task is not None:
+            used = tr("render_cache_size_pending", "(calculating...)")
+        else:
+            used = "-"
+        self.renderCacheDetailLabel.setText(tr(
+            "render_cache_detail",
+            "Reuses earlier exports of the same image and settings. Using {used} of {limit}."
+        ).format(used=used, limit=format_bytes(max_mb * 1024 ** 2)))
+
     def _show_restart_dialog(self):
         """顯示一個提示框，告知使用者需要重啟"""
         tr = self.translator.get
@@ -99,6 +231,18 @@ class SettingsView(QWidget):
         self.titleLabel.setText(tr("settings", "Settings"))
         self.languageLabel.setText(tr("language", "Language"))
         self.themeLabel.setText(tr("theme", "Theme"))
+        self.rendererLabel.setText(tr("export_renderer", "Export Renderer"))
+        self.benchmarkButton.setText(tr("renderer_benchmark_run", "Run Benchmark"))
+        self._update_benchmark_texts()
+        self.renderCacheLabel.setText(tr("render_cache", "Render Cache"))
+        self.renderCacheSwitch.setOnText(tr("render_cache_on", "Enabled"))
+        self.renderCacheSwitch.setOffText(tr("render_cache_off", "Disabled"))
+        self.clearCacheButton.setText(tr("render_cache_clear", "Clear Cache"))
+        self._update_cache_texts()
+        self.previewCacheLabel.setText(tr("preview_cache", "Preview Memory"))
+        self.previewCacheDetailLabel.setText(tr(
+            "preview_cache_detail",
+            "Memory for recently viewed previews, so switching back to a photo is instant."))
 
         # --- 邏輯強化 ---
         self.themeComboBox.blockSignals(True)  # 更新UI時，暫時阻擋信號避免觸發 _on_theme_changed